@@ -2,7 +2,10 @@
 Buzzer 蜂鳴器模組
 '''
 from machine import Pin, PWM # type: ignore
-from typing import Optional
+try:
+    from typing import Optional
+except ImportError:
+    pass
 import asyncio
 
 class Buzzer:
@@ -2,7 +2,10 @@
 LED RGB 觸發器模組
 '''
 from machine import Pin, PWM # type: ignore
-from typing import Tuple
+try:
+    from typing import Tuple
+except ImportError:
+    pass
 import asyncio
 
 class RGBLed:
@@ -2,6 +2,7 @@
 # 請將本檔案複製為 config.py 並填入實際的設備設定與憑證
 
 # ------------ pins ------------
+# 沒接的感測器把腳位設為 None，開機時就不會匯入與初始化該模組
 DHT11_PIN = 13          # 例：GPIO13
 TURBIDITY_PIN = 34      # ADC1 channel
 TDS_PIN = 35            # ADC1 channel
@@ -24,9 +25,54 @@ TURBIDITY_MAX = 2500
 TDS_MAX = 700
 WATER_LEVEL_MIN = 1000
 
+# 水泵閉迴路控制：水位低於 WATER_LEVEL_MIN 開始補水，高於 WATER_LEVEL_MIN + PUMP_HYSTERESIS 停止
+PUMP_HYSTERESIS = 200
+PUMP_POLL_INTERVAL_MS = 100   # 水泵運轉時的水位輪詢間隔（毫秒）
+PUMP_MAX_RUNTIME = 30         # 單次最長運轉時間（秒），避免水源斷水時空轉
+PUMP_MIN_OFF_TIME = 60        # 兩次運轉之間的最短停機時間（秒）
+
+# 感測器故障/異常偵測（被標記的讀值不列入上傳平均，計數會附在上傳資料的 health 欄位）
+FAULT_STUCK_SAMPLES = 30   # ADC 類感測器連續幾筆完全相同視為卡住
+FAULT_EWMA_ALPHA = 0.05    # EWMA 平滑係數
+FAULT_Z_MAX = 6.0          # 與 EWMA 平均相差幾個標準差視為離群
+FAULT_WARMUP = 20          # 累積幾筆後才開始離群判斷
+FAULT_REBASELINE = 5       # 連續幾筆離群視為水準真的變了（例如補水），以新值重設基準；0 表示不重設
+
+# 原始讀值紀錄（trace），可拿到主機用 `python -m sim.replay` 快轉重播
+TRACE_ENABLED = False
+TRACE_FILE = "trace.bin"
+TRACE_MAX_BYTES = 512 * 1024  # 紀錄檔大小上限，超過就停止記錄（每筆 10 bytes）
+
+# 板上歷史紀錄：每回合一筆加上 1 分 / 1 小時 / 1 天彙總，各層級是固定大小的環形檔（每筆 27 bytes）
+# 可從狀態端點 /history 查詢，斷線後也可用 `python -m server.backfill` 補回主機資料庫
+HISTORY_ENABLED = True
+HISTORY_DIR = "history"
+HISTORY_CAPACITY = {"cycle": 720, "1m": 4320, "1h": 1440, "1d": 730}  # 約 1 小時 / 3 天 / 60 天 / 2 年，共約 195 KB
+
 # 系統更新頻率（秒）
 LOOP_INTERVAL = 5
 DATA_UPLOAD_INTERVALS = 12  # 例：每 12 次迴圈上傳一次（若 LOOP_INTERVAL=5 秒，約每分鐘一次）
+VERBOSE_SENSOR_LOG = False  # True 時每回合記錄每個感測器的讀值（會多配置字串，除錯時再開）
+UPLOAD_DEFER_LIMIT = 10  # 開機後 NTP 校時前產生的摘要最多暫存幾份，校時後補上正確時間再上傳
+
+# 板上狀態端點（區網內 http://<板子 IP>:<port>/status 查看最新讀值與警示，/metrics 查看執行指標）
+STATUS_SERVER_ENABLED = True
+STATUS_SERVER_PORT = 80
+STATUS_SERVER_MAX_CLIENTS = 2  # 同時連線上限，超過回 503，避免拖慢控制迴圈
+
+# I/O 工作執行緒：NTP 校時、DNS 查詢、寫 trace 紀錄檔與 log 檔改在獨立執行緒進行，不卡住控制迴圈
+IO_WORKER_ENABLED = True
+IO_WORKER_QUEUE = 8  # 佇列上限，滿了的工作改回同步執行或回報失敗
+
+# log 檔：log 先放進記憶體緩衝，每回合結束（或緩衝滿）時整批交給 I/O 工作執行緒寫入
+LOG_FILE = "farm_controller.txt"
+LOG_FILE_MAX_BYTES = 1024  # 超過就改名為 .1 再開新檔
+
+# 事件迴圈卡頓偵測與硬體看門狗
+LOOP_MONITOR_INTERVAL_MS = 100  # 量測迴圈延遲的間隔
+LOOP_STALL_MS = 500             # 延遲超過此值記為一次卡頓（並且這次不餵看門狗）
+WDT_TIMEOUT_MS = 0              # 硬體看門狗逾時，0 為不啟用；啟用後無法關閉，用 REPL 除錯時請保持 0
+LOOP_HEARTBEAT_TIMEOUT = 120    # 控制迴圈超過幾秒沒有完成一回合就停止餵狗，讓板子重開
 
 # WiFi 設定（請填真實值後再同步到設備，勿提交）
 WIFI_SSID = "YOUR_WIFI_SSID"
@@ -34,4 +80,43 @@ WIFI_PASSWORD = "YOUR_WIFI_PASSWORD"
 
 # Webhook URLs（請改成你的測試/正式環境）
 MAKE_WEBHOOK_URL = "https://example.com/make-webhook"
-WEBHOOK_URL = "http://localhost:1567/data/webhook"
+WEBHOOK_URL = "http://localhost:1567/data/webhook"  # 用 server/stream.py 接收時可加 ?device=<名稱> 區分設備
+
+# 上傳目的地：每個目的地各自排隊、逾時與重試，互不影響；url 為空的項目會被略過
+# timeout 單次請求逾時（秒）、queue 佇列上限（滿了丟最舊）、retries 同一筆最多重試次數
+# backoff / backoff_max 重試等待（秒，每次加倍直到上限）、logs 是否附帶板子的 log（見 LOG_SHIP_*）
+# batch 是否接收合併的摘要 {"timestamp": ..., "readings": [...]}（見 UPLOAD_SCHEDULER_*），沒設的目的地逐份收到原本的格式
+WEBHOOK_DESTINATIONS = [
+    {"name": "server", "url": WEBHOOK_URL, "timeout": 5, "queue": 20, "retries": 5, "backoff": 2, "backoff_max": 60,
+     "logs": True, "batch": True},
+    {"name": "make", "url": MAKE_WEBHOOK_URL, "timeout": 10, "queue": 10, "retries": 3, "backoff": 5, "backoff_max": 120},
+]
+
+# 依連線品質排程上傳（只在 GATEWAY_MODE = "off" 時使用）：訊號差或最近上傳慢/常失敗時先暫存，
+# 連線恢復後把累積的摘要合併成一個請求送出 {"timestamp": ..., "readings": [摘要, ...]}（只送往設了 batch 的目的地）
+UPLOAD_SCHEDULER_ENABLED = True
+UPLOAD_RSSI_MIN = -75         # RSSI 低於此值（dBm）視為訊號不佳
+UPLOAD_LATENCY_MAX = 3000     # 平均上傳延遲超過此值（毫秒）視為連線不佳
+UPLOAD_SUCCESS_MIN = 0.7      # 上傳成功率低於此值視為連線不佳
+UPLOAD_MAX_AGE = 600          # 資料最多在板上等幾秒，到了不論連線品質都送出
+UPLOAD_BATCH_MAX = 10         # 最多累積幾份摘要就合併送出
+UPLOAD_PROBE_INTERVAL = 120   # 因延遲或失敗暫停時，每隔幾秒試送一次
+
+# log 回傳：最近的錯誤、警告與一般訊息壓縮後附在上傳摘要裡（只送往 "logs": True 的目的地）
+LOG_SHIP_ENABLED = True
+LOG_SHIP_LEVEL = "INFO"      # 最低保存等級
+LOG_SHIP_QUEUE = 24          # 錯誤 / 警告 / 一般訊息各保存幾筆，滿了丟最舊
+LOG_SHIP_BUDGET = 768        # 每次上傳附帶的 log 上限（編碼後 bytes），避免拖慢主要資料
+LOG_SHIP_IDLE_INTERVAL = 60  # 有錯誤或警告時，上傳佇列空閒就每隔幾秒單獨送一批；0 為只跟著摘要送
+
+# 閘道模式（多片板子共用一個上傳出口）
+# "off"：各自直接上傳；"gateway"：本機收集附近節點的 UDP 封包，成批送到 WEBHOOK_DESTINATIONS；
+# "node"：把摘要送給 GATEWAY_HOST，閘道沒有回應時自動改回直接上傳
+GATEWAY_MODE = "off"
+NODE_ID = 1                   # 同一個閘道下每片板子要不同（0~65535）
+GATEWAY_HOST = "192.168.1.10"  # 節點模式：閘道板子的 IP
+GATEWAY_PORT = 5684
+GATEWAY_BATCH_SIZE = 20       # 閘道累積幾筆送出一批
+GATEWAY_BATCH_INTERVAL = 30   # 閘道最久等幾秒就送出
+GATEWAY_ACK_TIMEOUT = 1.0     # 節點等待確認的秒數，沒收到會重送
+GATEWAY_RETRY_INTERVAL = 300  # 節點判定閘道離線後，隔幾秒再試
@@ -0,0 +1,68 @@
+'''
+MicroPython / CPython 相容層
+板子上直接使用 time.ticks_*，主機端（模擬、工具）以 time.monotonic 模擬相同介面
+
+型別註記：各模組以 try: from typing import ... / except ImportError: pass 匯入，
+MicroPython 沒有 typing 模組，註記只在主機端檢查時使用
+'''
+import gc
+import time
+
+try:
+    ticks_ms = time.ticks_ms  # type: ignore
+    ticks_diff = time.ticks_diff  # type: ignore
+    ticks_add = time.ticks_add  # type: ignore
+    IS_MICROPYTHON = True
+except AttributeError:
+    IS_MICROPYTHON = False
+    _clock = time.monotonic
+
+    def set_clock(clock):
+        """替換主機端的時間來源（模擬時改用虛擬時鐘）
+
+        Args:
+            clock: 回傳秒數（float）的函式，傳入 None 恢復 time.monotonic
+        """
+        global _clock
+        _clock = clock if clock is not None else time.monotonic
+
+    def ticks_ms() -> int:
+        '''毫秒計數器（主機端不會溢位）'''
+        return int(_clock() * 1000)
+
+    def ticks_diff(a: int, b: int) -> int:
+        '''計算 a - b（毫秒）'''
+        return a - b
+
+    def ticks_add(a: int, delta: int) -> int:
+        '''計算 a + delta（毫秒）'''
+        return a + delta
+
+# 板子的 time.time() 可能以 2000 年起算，需要跨裝置比對的時間一律換成 Unix 秒
+EPOCH_OFFSET = 946684800 if time.gmtime(0)[0] == 2000 else 0
+
+
+MIN_VALID_TIME = 1704067200  # 2024-01-01，早於此表示開機後尚未校時
+
+
+def unix_time() -> int:
+    '''目前的 Unix 秒'''
+    return int(time.time()) + EPOCH_OFFSET
+
+
+def time_valid() -> bool:
+    '''系統時間是否已校正（斷電重開後 RTC 會從 2000 年起算，NTP 校時後才可信）'''
+    return unix_time() >= MIN_VALID_TIME
+
+
+try:
+    mem_alloc = gc.mem_alloc  # type: ignore
+    mem_free = gc.mem_free  # type: ignore
+except AttributeError:
+    def mem_alloc():
+        '''主機端沒有 MicroPython 堆積統計，固定回傳 None'''
+        return None
+
+    def mem_free():
+        '''主機端沒有 MicroPython 堆積統計，固定回傳 None'''
+        return None
@@ -2,68 +2,77 @@
 設備控制器模組，負責協調各種感測器與執行器的操作。
 '''
 import time
-from config import *
+import gc
+from array import array
 
-from sensors.dht11_sensor import DHT11Sensor
-from sensors.turbidity_sensor import TurbiditySensor
-from sensors.tds_sensor import TDSSensor
-from sensors.water_sensor import WaterLevelSensor
+from core.settings import settings
 
+# 感測器模組在 FarmController.__init__ 中依 pins 設定延遲匯入，未接的感測器不佔用開機時間與記憶體
 from actuators.rgb_led import RGBLed
 from actuators.buzzer import Buzzer
 from actuators.relay import Relay
 
 from core.wifi_manager import WiFiManager
+from core.pump_controller import PumpController
+from core.fault_detector import FaultDetector
+from core.uploader import FanoutUploader
+from core.metrics import startup, runtime
+from core.loop_monitor import monitor
+from core.reading import Reading
+from core.compat import ticks_ms, ticks_diff, time_valid
 
-from typing import Optional, List
+try:
+    from typing import Optional, List
+except ImportError:
+    pass
 from lib.esplog.core import Logger
 
 import asyncio
-# from lib import urequests as requests
-import requests
 
-class FarmHistoryData:
+_NAN = float("nan")
+
+class HistoryWindow:
     '''
-    農業數據結構
+    一個上傳視窗的讀值（預先配置的固定長度 array）
+    generation 在視窗被重新拿來寫入時 +1，讀取者可據此確認彙總途中內容沒有被換掉
     '''
-    def __init__(self, temperature: Optional[List[Optional[float]]] = None, 
-                    humidity: Optional[List[Optional[float]]] = None, 
-                    turbidity_percent: Optional[List[Optional[float]]] = None, 
-                    tds_value: Optional[List[Optional[float]]] = None, 
-                    water_level_raw: Optional[List[Optional[float]]] = None, 
-                    water_level_low: Optional[List[Optional[bool]]] = None):
-        self.temperature = temperature if temperature is not None else []
-        self.humidity = humidity if humidity is not None else []
-        self.turbidity_percent = turbidity_percent if turbidity_percent is not None else []
-        self.tds_value = tds_value if tds_value is not None else []
-        self.water_level_raw = water_level_raw if water_level_raw is not None else []
-        self.water_level_low = water_level_low if water_level_low is not None else []
-    
-    def write_data(self, data: dict):
-        '''寫入一筆數據'''
-        self.temperature.append(data.get("temperature"))
-        self.humidity.append(data.get("humidity"))
-        self.turbidity_percent.append(data.get("turbidity_percent"))
-        self.tds_value.append(data.get("tds_value"))
-        self.water_level_raw.append(data.get("water_level_raw"))
-        self.water_level_low.append(data.get("water_level_low"))
-    
-    def _clear(self):
-        '''清空歷史數據'''
-        self.temperature.clear()
-        self.humidity.clear()
-        self.turbidity_percent.clear()
-        self.tds_value.clear()
-        self.water_level_raw.clear()
-        self.water_level_low.clear()
-    
-    def summarize_and_clear(self) -> dict:
-        '''彙總數據並返回平均值，且清空歷史數據'''
-        def average(lst: List[Optional[float]]) -> Optional[float]:
-            filtered = [x for x in lst if x is not None]
-            return sum(filtered) / len(filtered) if filtered else None
-        def true_actual(lst: List[Optional[bool]]) -> bool:
-            return any(x for x in lst if x)
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.temperature = array("f", [_NAN] * capacity)
+        self.humidity = array("f", [_NAN] * capacity)
+        self.turbidity_percent = array("f", [_NAN] * capacity)
+        self.tds_value = array("f", [_NAN] * capacity)
+        self.water_level_raw = array("f", [_NAN] * capacity)
+        self.water_level_low = array("b", [0] * capacity)
+        self.count = 0
+        self.index = 0
+        self.generation = 0
+        self.closed_at: Optional[float] = None  # 凍結的時間（time.time()），寫入中為 None
+
+    def reset(self):
+        '''清空並開始接受寫入（只重設索引，陣列沿用）'''
+        self.generation += 1
+        self.count = 0
+        self.index = 0
+        self.closed_at = None
+
+    def summarize(self) -> dict:
+        '''彙總視窗內的數據並返回平均值（唯讀，不複製陣列）'''
+        n = self.count
+        def average(arr) -> Optional[float]:
+            total = 0.0
+            valid = 0
+            for i in range(n):
+                x = arr[i]
+                if x == x:  # 跳過 NaN
+                    total += x
+                    valid += 1
+            return total / valid if valid else None
+        def true_actual(arr) -> bool:
+            for i in range(n):
+                if arr[i]:
+                    return True
+            return False
         
         result = {
             "avg_temperature": average(self.temperature),
@@ -72,163 +81,431 @@ class FarmHistoryData:
             "avg_tds_value": average(self.tds_value),
             "avg_water_level_raw": average(self.water_level_raw),
             "water_level_low": true_actual(self.water_level_low),
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.closed_at))
         }
-        # 清空歷史數據
-        self._clear()
-        
         return result
 
+
+class FarmHistoryData:
+    '''
+    農業數據結構（雙緩衝）
+    控制迴圈只寫入進行中的視窗；上傳時以 swap() 交換兩個視窗（只交換參照，O(1)），
+    凍結的視窗在下一次交換前都不會再被寫入，上傳、trace、狀態端點等多個讀取者可以直接彙總，
+    不必複製陣列，也不會擋住寫入
+    '''
+    def __init__(self, capacity: Optional[int] = None):
+        """農業數據結構的初始化
+
+        Args:
+            capacity (Optional[int]): 每個視窗可保存的回合數，超過時覆寫最舊的一筆；None 表示 DATA_UPLOAD_INTERVALS
+        """
+        if capacity is None:
+            capacity = settings.DATA_UPLOAD_INTERVALS
+        self.capacity = capacity
+        self.active = HistoryWindow(capacity)
+        self.frozen = HistoryWindow(capacity)
+        self.frozen.closed_at = time.time()
+        self.swaps = 0
+    
+    @property
+    def count(self) -> int:
+        '''進行中視窗的回合數'''
+        return self.active.count
+    
+    def write_data(self, record: Reading):
+        '''寫入一筆數據到進行中的視窗（None 以 NaN 表示）'''
+        w = self.active
+        i = w.index
+        w.temperature[i] = _NAN if record.temperature is None else record.temperature
+        w.humidity[i] = _NAN if record.humidity is None else record.humidity
+        w.turbidity_percent[i] = _NAN if record.turbidity_percent is None else record.turbidity_percent
+        w.tds_value[i] = _NAN if record.tds_value is None else record.tds_value
+        w.water_level_raw[i] = _NAN if record.water_level_raw is None else record.water_level_raw
+        w.water_level_low[i] = 1 if record.water_level_low else 0
+        w.index = i + 1 if i + 1 < self.capacity else 0
+        if w.count < self.capacity:
+            w.count += 1
+    
+    def swap(self) -> HistoryWindow:
+        """凍結進行中的視窗並換另一個視窗接受寫入
+
+        Returns:
+            HistoryWindow: 剛凍結的視窗，在下一次 swap() 前內容不變
+        """
+        frozen = self.active
+        frozen.closed_at = time.time()
+        self.active = self.frozen
+        self.active.reset()
+        self.frozen = frozen
+        self.swaps += 1
+        return frozen
+    
+    def summarize(self) -> dict:
+        '''彙總進行中視窗的數據並返回平均值（不清空，可用來查看進行中的視窗）'''
+        return self.active.summarize()
+    
+    def summarize_frozen(self) -> dict:
+        '''彙總最近一次凍結的視窗；讀之前已被 swap() 拿去寫入、或彙總途中被換掉（其他執行緒）就重讀'''
+        while True:
+            w = self.frozen
+            generation = w.generation
+            if w.closed_at is None:
+                continue  # 取得參照後視窗已被 swap() 重新拿去寫入，不讀寫入中的內容
+            result = w.summarize()
+            if w.generation == generation and w.closed_at is not None:
+                return result
+    
+    def summarize_and_clear(self) -> dict:
+        '''凍結進行中的視窗並返回其平均值，寫入改到另一個視窗'''
+        return self.swap().summarize()
+
 class FarmController:
-    def __init__(self, pins, logger: Optional[Logger] = None):
+    def __init__(self, pins, logger: Optional[Logger] = None, log_file: Optional[str] = None):
         if logger:
             self.logger = logger
         else:
             self.logger = Logger(
                     level="DEBUG",
                     log_to_console=True,
-                    log_to_file=True,
-                    file_name="farm_controller.txt",
-                    max_file_size=1024,
+                    log_to_file=False,  # 寫檔由 FileLog 批次進行
                     use_colors=True,
                     log_format="text"
             )
-        # 初始化感測器
-        self.dht11 = DHT11Sensor(pin_number=pins['dht11'])
-        self.turbidity_sensor = TurbiditySensor(pin_number=pins['turbidity'])
-        self.tds_sensor = TDSSensor(pin_number=pins['tds'])
-        self.water_level_sensor = WaterLevelSensor(pin_number=pins['water_level'], threshold=WATER_LEVEL_MIN)
+            log_file = log_file or settings.LOG_FILE
+        # log 寫檔：先放進緩衝區，整批交給 I/O 工作執行緒寫入（工作執行緒在下面建立後才接上）
+        self.file_log = None
+        if log_file:
+            from core.log_file import FileLog
+            self.file_log = FileLog(log_file, max_bytes=settings.LOG_FILE_MAX_BYTES)
+            self.logger = self.file_log.wrap(self.logger)
+        # 最近的 log 留在記憶體，隨上傳摘要送回（包裝 logger，之後建立的元件都會經過它）
+        self.log_shipper = None
+        if settings.LOG_SHIP_ENABLED:
+            from core.log_shipper import LogShipper
+            self.log_shipper = LogShipper(queue_size=settings.LOG_SHIP_QUEUE, min_level=settings.LOG_SHIP_LEVEL,
+                                          budget=settings.LOG_SHIP_BUDGET)
+            self.logger = self.log_shipper.wrap(self.logger)
+        self._logs_sent_at = ticks_ms()
+        # 初始化感測器（pins 中沒有設定或設為 None 的感測器不匯入也不建立）
+        self.dht11 = None
+        self.turbidity_sensor = None
+        self.tds_sensor = None
+        self.water_level_sensor = None
+        if pins.get('dht11') is not None:
+            from sensors.dht11_sensor import DHT11Sensor
+            self.dht11 = DHT11Sensor(pin_number=pins['dht11'])
+        if pins.get('turbidity') is not None:
+            from sensors.turbidity_sensor import TurbiditySensor
+            self.turbidity_sensor = TurbiditySensor(pin_number=pins['turbidity'])
+        if pins.get('tds') is not None:
+            from sensors.tds_sensor import TDSSensor
+            self.tds_sensor = TDSSensor(pin_number=pins['tds'])
+        if pins.get('water_level') is not None:
+            from sensors.water_sensor import WaterLevelSensor
+            self.water_level_sensor = WaterLevelSensor(pin_number=pins['water_level'], threshold=settings.WATER_LEVEL_MIN)
         self.logger.debug("感測器初始化完成")
         # 初始化執行器
         self.rgb_led = RGBLed(pins=(pins['rgb_r'], pins['rgb_g'], pins['rgb_b']), common_anode=False)
         self.buzzer = Buzzer(pin_number=pins['buzzer'])
         self.relay_pump = Relay(pin_number=pins['relay_pump'], active_low=True)
+        self.pump: Optional[PumpController] = None
+        if self.water_level_sensor is not None:
+            self.pump = PumpController(
+                relay=self.relay_pump,
+                level_sensor=self.water_level_sensor,
+                logger=self.logger,
+                level_on=settings.WATER_LEVEL_MIN,
+                hysteresis=settings.PUMP_HYSTERESIS,
+                poll_ms=settings.PUMP_POLL_INTERVAL_MS,
+                max_runtime=settings.PUMP_MAX_RUNTIME,
+                min_off_time=settings.PUMP_MIN_OFF_TIME
+            )
+        self._pump_task: Optional[asyncio.Task] = None
+        
+        # 會阻塞的網路與 flash 操作交給 I/O 工作執行緒（run() 時啟動）
+        self.io_worker = None
+        if settings.IO_WORKER_ENABLED:
+            from core.io_worker import IOWorker
+            self.io_worker = IOWorker(logger=self.logger, capacity=settings.IO_WORKER_QUEUE)
+            if self.file_log is not None:
+                self.file_log.worker = self.io_worker
         
         self.wifi = WiFiManager(
-            ssid=WIFI_SSID, 
-            password=WIFI_PASSWORD, 
-            logger=self.logger
+            ssid=settings.WIFI_SSID, 
+            password=settings.WIFI_PASSWORD, 
+            logger=self.logger,
+            io_worker=self.io_worker
         )
         self._wifi_task: Optional[asyncio.Task] = None
+        self._deferred = []  # 校時前產生的摘要 (ticks, summary)，校時後補上時間再上傳
+        # 每個上傳目的地有自己的背景任務，控制迴圈只負責把摘要放進佇列
+        self.uploader = FanoutUploader(settings.WEBHOOK_DESTINATIONS, logger=self.logger, io_worker=self.io_worker)
+        # 依連線品質決定何時送出，訊號差時累積起來等連線好再合併上傳（閘道模式由閘道自己成批）
+        self.link_scheduler = None
+        if settings.UPLOAD_SCHEDULER_ENABLED and settings.GATEWAY_MODE == "off":
+            from core.link_scheduler import LinkScheduler
+            self.link_scheduler = LinkScheduler(
+                wlan=self.wifi.wlan,
+                uploader=self.uploader,
+                rssi_min=settings.UPLOAD_RSSI_MIN,
+                latency_max=settings.UPLOAD_LATENCY_MAX,
+                success_min=settings.UPLOAD_SUCCESS_MIN,
+                max_age=settings.UPLOAD_MAX_AGE,
+                max_batch=settings.UPLOAD_BATCH_MAX,
+                probe_interval=settings.UPLOAD_PROBE_INTERVAL
+            )
+        # 閘道模式：收集附近節點的摘要成批上傳，或把自己的摘要交給閘道
+        self.gateway = None
+        self.gateway_client = None
+        if settings.GATEWAY_MODE == "gateway":
+            from core.gateway import GatewayServer
+            self.gateway = GatewayServer(
+                uploader=self.uploader,
+                logger=self.logger,
+                node_id=settings.NODE_ID,
+                port=settings.GATEWAY_PORT,
+                batch_size=settings.GATEWAY_BATCH_SIZE,
+                batch_interval=settings.GATEWAY_BATCH_INTERVAL
+            )
+        elif settings.GATEWAY_MODE == "node":
+            from core.gateway import GatewayClient
+            self.gateway_client = GatewayClient(
+                host=settings.GATEWAY_HOST,
+                port=settings.GATEWAY_PORT,
+                node_id=settings.NODE_ID,
+                logger=self.logger,
+                fallback=self.uploader.submit,
+                ack_timeout=settings.GATEWAY_ACK_TIMEOUT,
+                retry_interval=settings.GATEWAY_RETRY_INTERVAL
+            )
+        
+        self.status_server = None
+        if settings.STATUS_SERVER_ENABLED:
+            from core.status_server import StatusServer
+            self.status_server = StatusServer(
+                controller=self,
+                logger=self.logger,
+                port=settings.STATUS_SERVER_PORT,
+                max_clients=settings.STATUS_SERVER_MAX_CLIENTS
+            )
         
         self.logger.debug("執行器初始化完成")
+        self.reading = Reading()  # 每回合重複使用，不另外配置
+        self.alerts = {
+            "temp_high": False,
+            "humid_low": False,
+            "turbidity_high": False,
+            "tds_high": False,
+            "water_low": False
+        }
+        self.history = FarmHistoryData()
+        self.fault_detector = FaultDetector(
+            logger=self.logger,
+            stuck_samples=settings.FAULT_STUCK_SAMPLES,
+            alpha=settings.FAULT_EWMA_ALPHA,
+            z_max=settings.FAULT_Z_MAX,
+            warmup=settings.FAULT_WARMUP,
+            rebaseline=settings.FAULT_REBASELINE
+        )
+        self.state_version = 0  # 每完成一回合 +1，狀態端點據此判斷快取是否過期
+        self._verbose = settings.VERBOSE_SENSOR_LOG
+        
+        self.recorder = None
+        if settings.TRACE_ENABLED:
+            from core.trace import TraceRecorder
+            self.recorder = TraceRecorder.open(settings.TRACE_FILE, max_bytes=settings.TRACE_MAX_BYTES,
+                                               buffers=1 if self.io_worker is None else 4)
+            self.recorder.worker = self.io_worker
+            self.recorder.attach(self)
+            self.logger.info(f"記錄原始讀值與執行器指令到 {settings.TRACE_FILE}")
+        
+        self.history_store = None
+        if settings.HISTORY_ENABLED:
+            from core.history_store import HistoryStore
+            try:
+                self.history_store = HistoryStore(root=settings.HISTORY_DIR, capacity=settings.HISTORY_CAPACITY)
+                self.history_store.worker = self.io_worker
+            except OSError as e:
+                self.logger.error(f"無法開啟歷史紀錄 {settings.HISTORY_DIR}: {e}")
+        
         self.logger.info("FarmController 初始化完成")
+        startup.mark("controller_ready")
     
     async def init_network(self):
         '''初始化網路連線'''
         ok = await self.wifi.connect(timeout=15)
         if not ok:
             self.logger.warning("啟動時 WiFi 連線失敗，將持續背景重試")
+
+    async def _network(self):
+        '''背景網路任務：第一次連線與校時，之後持續保持連線（控制迴圈不等它）'''
+        await self.init_network()
+        await self.wifi.keep_connected()
     
-    def _dht11_read(self) -> tuple[Optional[float], Optional[float]]:
+    def _dht11_read(self, rec: Reading):
         '''讀取 DHT11 感測器數據'''
-        env = self.dht11.read()
-        if env.get("ok"):
-            self.logger.debug(f"DHT11 讀取成功: 溫度={env['temp']}°C, 濕度={env['humi']}%")
+        if self.dht11 is None:
+            rec.temperature = None
+            rec.humidity = None
+            return
+        if self.dht11.read_into(rec):
+            if self._verbose:
+                self.logger.debug(f"DHT11 讀取成功: 溫度={rec.temperature}°C, 濕度={rec.humidity}%")
         else:
             self.logger.error("DHT11 讀取失敗")
-        return env["temp"], env["humi"]
     
-    def _turbidity_read(self) -> Optional[float]:
+    def _turbidity_read(self, rec: Reading):
         '''讀取濁度感測器數據'''
-        turb_percent = self.turbidity_sensor.read_percent()
-        if turb_percent is not None:
-            self.logger.debug(f"濁度讀取成功: {turb_percent}%")
+        if self.turbidity_sensor is None:
+            rec.turbidity_percent = None
+            return
+        rec.turbidity_percent = self.turbidity_sensor.read_percent()
+        if rec.turbidity_percent is not None:
+            if self._verbose:
+                self.logger.debug(f"濁度讀取成功: {rec.turbidity_percent}%")
         else:
             self.logger.error("濁度讀取失敗")
-        return turb_percent
     
-    def _tds_read(self, temp: float) -> Optional[float]:
-        '''讀取 TDS 感測器數據'''
-        tds_value = self.tds_sensor.read_tds(temp)
-        if tds_value is not None:
-            self.logger.debug(f"TDS 讀取成功: {tds_value} ppm")
+    def _tds_read(self, rec: Reading):
+        '''讀取 TDS 感測器數據（以同回合溫度做補償，讀不到溫度時以 25°C 計）'''
+        if self.tds_sensor is None:
+            rec.tds_value = None
+            return
+        temp = rec.temperature if rec.temperature is not None else 25.0
+        rec.tds_value = self.tds_sensor.read_tds(temp)
+        if rec.tds_value is not None:
+            if self._verbose:
+                self.logger.debug(f"TDS 讀取成功: {rec.tds_value} ppm")
         else:
             self.logger.error("TDS 讀取失敗")
-        return tds_value
     
-    def _water_sensor_read(self) -> tuple[Optional[int], Optional[bool]]:
+    def _water_sensor_read(self, rec: Reading):
         '''讀取水位感測器數據'''
-        water_raw = self.water_level_sensor.read_raw()
-        water_low = self.water_level_sensor.is_low()
-        if water_raw is not None:
-            self.logger.debug(f"水位原始值讀取成功: {water_raw}")
+        if self.water_level_sensor is None:
+            rec.water_level_raw = None
+            rec.water_level_low = None
+            return
+        rec.water_level_raw = self.water_level_sensor.read_raw()
+        rec.water_level_low = self.water_level_sensor.is_low(rec.water_level_raw)
+        if rec.water_level_raw >= 0:
+            if self._verbose:
+                self.logger.debug(f"水位原始值讀取成功: {rec.water_level_raw}")
         else:
             self.logger.error("水位原始值讀取失敗")
         
-        if water_low is not None:
-            self.logger.debug(f"水位狀態判斷成功: 水位過低={water_low}")
+        if rec.water_level_low is not None:
+            if self._verbose:
+                self.logger.debug(f"水位狀態判斷成功: 水位過低={rec.water_level_low}")
         else:
             self.logger.error("水位狀態判斷失敗")
-        
-        return water_raw, water_low
     
     async def _one_cycle(self):
         '''執行一次監測與控制'''
-        # 讀取感測器數據
+        # 讀取感測器數據，全部寫進同一筆重複使用的 Reading
+        rec = self.reading
         # DHT11 讀取溫濕度
-        temp, humid = self._dht11_read()
+        monitor.mark("dht11")
+        self._dht11_read(rec)
         # turbidity 讀取濁度百分比
-        turb_percent = self._turbidity_read()
+        monitor.mark("turbidity")
+        self._turbidity_read(rec)
         # TDS 讀取 TDS 值
-        tds_value = self._tds_read(temp) if temp is not None else self._tds_read(25.0)
+        monitor.mark("tds")
+        self._tds_read(rec)
         # 水位感測器讀取原始值與狀態
-        water_raw, water_low = self._water_sensor_read()
+        monitor.mark("water_level")
+        self._water_sensor_read(rec)
+        monitor.mark()
+        temp = rec.temperature
+        humid = rec.humidity
+        turb_percent = rec.turbidity_percent
+        tds_value = rec.tds_value
+        water_low = rec.water_level_low
+        startup.mark("first_reading")
 
         # 根據數據進行控制邏輯
+        # 異常狀況判斷（寫回同一個 dict，狀態端點直接讀取）
+        alerts = self.alerts
+        alerts["temp_high"] = temp is not None and temp > settings.TEMP_HIGH
+        alerts["humid_low"] = humid is not None and humid < settings.HUMID_LOW
+        alerts["turbidity_high"] = turb_percent is not None and turb_percent > settings.TURBIDITY_MAX
+        alerts["tds_high"] = tds_value is not None and tds_value > settings.TDS_MAX
+        alerts["water_low"] = bool(water_low)
+
         # 異常狀況提示
         alert = False
-        if temp is not None and temp > TEMP_HIGH:
+        if alerts["temp_high"]:
             alert = True
             self.logger.warning("溫度過高警告! 建議：開啟冷氣或通風")
             await self.rgb_led.shine_red(duration=0.3, times=3)
             self.rgb_led.warning
 
-        if humid is not None and humid < HUMID_LOW:
+        if alerts["humid_low"]:
             alert = True
             self.logger.warning("濕度過低警告! 建議：使用加濕器或增加環境濕度")
             await self.rgb_led.shine_red(duration=0.3, times=3)
             self.rgb_led.warning
 
-        if turb_percent is not None and turb_percent > TURBIDITY_MAX:
+        if alerts["turbidity_high"]:
             alert = True
             self.logger.warning("水質濁度過高警告! 建議：檢查水源或更換過濾裝置")
             await self.rgb_led.shine_yellow(duration=0.3, times=3)
             self.rgb_led.warning
 
-        if tds_value is not None and tds_value > TDS_MAX:
+        if alerts["tds_high"]:
             alert = True
             self.logger.warning("水質TDS過高警告! 建議：檢查水源或更換過濾裝置")
             await self.rgb_led.shine_yellow(duration=0.3, times=3)
             self.rgb_led.warning
 
-        if water_low:
+        if alerts["water_low"]:
             alert = True
             self.logger.warning("水位過低警告! 建議：檢查水源或補充水分")
             await self.rgb_led.shine_blue(duration=0.3, times=3)
             self.rgb_led.warning
-            await self.relay_pump.pulse(duration=5.0)  # 啟動水泵5秒
-            self.logger.info("水位過低，已啟動水泵進行補水")
+            if self.pump is not None:
+                self.pump.request()  # 交給水泵控制任務依水位回授補水
+            self.logger.info("水位過低，已通知水泵控制任務進行補水")
             
         if not alert:
             self.rgb_led.ok
             self.buzzer.off()
-            self.relay_pump.off()  # 關閉水泵
+            if self.pump is None or not self.pump.is_running:
+                self.relay_pump.off()  # 關閉水泵（補水中則由水泵控制任務負責停止）
             self.logger.info("系統狀態正常，所有指標在安全範圍內，等待下一次監測")
+        startup.mark("first_actuation")
 
-        data = {
-            "temperature": temp,
-            "humidity": humid,
-            "turbidity_percent": turb_percent,
-            "tds_value": tds_value,
-            "water_level_raw": water_raw,
-            "water_level_low": water_low
-        }
-        return data
+        return rec
         
     async def shutdown(self):
         '''關閉控制器並釋放資源'''
         self.logger.info("關閉 FarmController 中...")
+        if self.recorder is not None:
+            try:
+                await self.recorder.close()
+            except Exception as e:
+                self.logger.error(f"關閉 trace 紀錄檔時發生錯誤: {e}")
+        if self.file_log is not None:
+            self.file_log.flush()
+        # 歷史紀錄的寫入在工作執行緒上，等執行緒結束、補做完佇列中的寫入才關檔
+        worker_stopped = self.io_worker is None or self.io_worker.stop()
+        if self.history_store is not None and worker_stopped:
+            self.history_store.close()
+        if self.status_server is not None:
+            await self.status_server.stop()
+        if self.gateway is not None:
+            await self.gateway.stop()
+        if self.gateway_client is not None:
+            await self.gateway_client.stop()
+        await self.uploader.stop()
+        await monitor.stop()
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+        
         try:
             self.rgb_led.off()
         except Exception as e:
@@ -263,41 +540,154 @@ class FarmController:
                 self.logger.info("WiFi 連接保持任務已取消")
         self.logger.info("FarmController 已關閉")
         
-    async def upload_data(self, data: dict, webhook_url: str = MAKE_WEBHOOK_URL):
-        '''上傳數據到伺服器'''
-        # 這裡可以實作上傳邏輯，例如使用 HTTP POST 請求將數據傳送到遠端伺服器
-        self.logger.info(f"上傳數據...")
-        try:
-            response = requests.post(webhook_url, json=data)
-            if response.status_code == 200:
-                self.logger.info("數據上傳成功")
-            else:
-                self.logger.warning(f"數據上傳失敗，狀態碼: {response.status_code}")
-        except Exception as e:
-            self.logger.error(f"數據上傳時發生錯誤: {e}")
+    async def upload_data(self, data: dict, timestamp: Optional[int] = None):
+        """上傳數據到所有目的地（只放進各目的地的佇列，不等待網路）
+
+        Args:
+            data (dict): 上傳摘要
+            timestamp (Optional[int]): 摘要的時間（time.time() 秒），None 表示現在；補傳校時前的摘要時使用
+        """
+        if self.gateway_client is not None:
+            self.logger.info("上傳數據到閘道...")
+            self.gateway_client.submit(data, timestamp=timestamp)
+            return
+        if self.gateway is not None:
+            self.gateway.add_local(data)
+            return
+        self.logger.info(f"上傳數據到 {len(self.uploader.destinations)} 個目的地...")
+        logs = self._take_logs()
+        self.uploader.submit(data, logs=logs, on_logs=self.log_shipper.settle if logs is not None else None)
+
+    def _take_logs(self) -> Optional[dict]:
+        '''取出一批要附在摘要上的 log（沒有接收 log 的目的地時返回 None）'''
+        if self.log_shipper is None or not self.uploader.accepts_logs:
+            return None
+        self._logs_sent_at = ticks_ms()
+        return self.log_shipper.take()
+
+    def defer_upload(self, data: dict):
+        '''尚未校時，先暫存摘要（記下當時的 ticks，校時後換算成正確時間）'''
+        if len(self._deferred) >= settings.UPLOAD_DEFER_LIMIT:
+            self._deferred.pop(0)
+            self.logger.warning("尚未校時，暫存的摘要已滿，丟棄最舊的一份")
+        self._deferred.append((ticks_ms(), data))
+        self.logger.info(f"尚未校時，摘要暫存待上傳（{len(self._deferred)} 份）")
+
+    async def flush_deferred(self):
+        '''校時後以「現在 - 經過時間」補上暫存摘要的時間並依序上傳'''
+        now, now_ticks = int(time.time()), ticks_ms()
+        deferred, self._deferred = self._deferred, []
+        self.logger.info(f"已校時，補傳 {len(deferred)} 份暫存的摘要")
+        for ticks, data in deferred:
+            ts = now - ticks_diff(now_ticks, ticks) // 1000
+            data["timestamp"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+            await self.upload_data(data, timestamp=ts)
+
+    async def flush_scheduled(self):
+        '''排程器判斷可以送出時，上傳累積的摘要（多份時合併成一個請求，只送往設了 batch 的目的地，其他目的地逐份送出）'''
+        batch = self.link_scheduler.take()
+        if batch is None:
+            return
+        if len(batch) == 1:
+            await self.upload_data(batch[0])
+            return
+        self.logger.info(f"合併 {len(batch)} 份摘要上傳（連線品質: {self.link_scheduler.quality}）")
+        logs = self._take_logs()
+        self.uploader.submit_batch({
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+            "readings": batch
+        }, logs=logs, on_logs=self.log_shipper.settle if logs is not None else None)
+
+    def ship_logs(self):
+        '''上傳佇列空閒且有錯誤或警告時，單獨送出一批 log（低優先，不與摘要搶頻寬）'''
+        if self.log_shipper is None or settings.LOG_SHIP_IDLE_INTERVAL <= 0 or not self.log_shipper.urgent:
+            return
+        if ticks_diff(ticks_ms(), self._logs_sent_at) < settings.LOG_SHIP_IDLE_INTERVAL * 1000 or not self.uploader.idle():
+            return
+        self._logs_sent_at = ticks_ms()
+        self.uploader.submit_logs(self.log_shipper.take(), on_logs=self.log_shipper.settle)
     
     async def run(self):
         '''持續運行控制器 + 網路初始化'''
         self.logger.info("FarmController 開始運行")
+        monitor.start(
+            logger=self.logger,
+            interval_ms=settings.LOOP_MONITOR_INTERVAL_MS,
+            stall_ms=settings.LOOP_STALL_MS,
+            wdt_timeout_ms=settings.WDT_TIMEOUT_MS,
+            heartbeat_timeout_ms=settings.LOOP_HEARTBEAT_TIMEOUT * 1000
+        )
+        if self.io_worker is not None:
+            self.io_worker.start()
         if self._wifi_task is None:
-            await self.init_network()
-            self._wifi_task = asyncio.create_task(self.wifi.keep_connected())  # 背景持續嘗試連線 WiFi
+            # 連線與校時在背景進行，感測與控制立即開始；校時前的摘要與歷史紀錄之後再補上時間
+            self._wifi_task = asyncio.create_task(self._network())
+        if self._pump_task is None and self.pump is not None:
+            self._pump_task = asyncio.create_task(self.pump.run())  # 水泵閉迴路控制
+        self.uploader.start()
+        if self.gateway is not None:
+            self.gateway.start()
+        if self.gateway_client is not None:
+            self.gateway_client.start()
+        if self.status_server is not None:
+            await self.status_server.start()
         try:
             times = 0
-            data_container = FarmHistoryData()
+            data_container = self.history
             while True:
-                data: dict = await self._one_cycle()
-                data_container.write_data(data)
+                runtime.begin_cycle()
+                reading = await self._one_cycle()
+                if self.recorder is not None:
+                    self.recorder.cycle(self.alerts)
+                self.fault_detector.screen(reading)  # 異常讀值改為 None，不列入平均
+                data_container.write_data(reading)
+                if self.history_store is not None:
+                    self.history_store.append(reading)
+                self.state_version += 1
+                monitor.heartbeat()
                 times += 1
+                if not startup.reported:
+                    startup.reported = True
+                    self.logger.info(f"啟動指標: {startup.summary()}")
 
-                if times >= DATA_UPLOAD_INTERVALS:
+                if self._deferred and time_valid():
+                    await self.flush_deferred()
+                if times >= settings.DATA_UPLOAD_INTERVALS:
                     self.logger.info("開始上傳數據...")
                     times = 0
-                    await self.upload_data(data_container.summarize_and_clear())
+                    summary = data_container.summarize_and_clear()
+                    summary["health"] = self.fault_detector.take_window()
+                    if self.recorder is not None:
+                        self.recorder.summary(summary)
+                        self.recorder.flush()
+                    if not time_valid():
+                        self.defer_upload(summary)
+                    elif self.link_scheduler is not None:
+                        self.link_scheduler.add(summary)
+                    else:
+                        await self.upload_data(summary)
+                    self.logger.info(f"記憶體指標: {runtime.summary()}")
+                    self.logger.info(f"迴圈指標: {monitor.summary()}")
                 else:
                     self.logger.info("完成一次監測與控制週期")
+                    self.ship_logs()
+                if self.link_scheduler is not None and self.link_scheduler.pending:
+                    await self.flush_scheduled()
 
-                await asyncio.sleep(LOOP_INTERVAL)
+                # 在閒置時主動回收，避免 GC 暫停落在水泵運轉或感測讀取途中；
+                # 補水中（或剛提出需求）就跳過，留到水泵停下後的回合
+                if self.file_log is not None:
+                    self.file_log.flush()
+                runtime.end_cycle()
+                if self.pump is not None and self.pump.busy:
+                    runtime.gc_skipped += 1
+                else:
+                    monitor.mark("gc")
+                    gc_start = ticks_ms()
+                    gc.collect()
+                    runtime.record_gc(ticks_diff(ticks_ms(), gc_start))
+                    monitor.mark()
+                await asyncio.sleep(settings.LOOP_INTERVAL)
         except KeyboardInterrupt:
             self.logger.info("接收到中斷信號，停止運行FarmController")
         finally:
@@ -315,11 +705,18 @@ class FarmController:
             del self.relay_pump
             if self._wifi_task is not None:
                 self._wifi_task.cancel()
+            if self._pump_task is not None:
+                self._pump_task.cancel()
         except Exception as e:
             self.logger.error(f"釋放資源時發生錯誤: {e}")
         self.logger.info("FarmController 資源已釋放")
 
 if __name__ == "__main__":
+    from config import (
+        DHT11_PIN, TURBIDITY_PIN, TDS_PIN, WATER_LEVEL_PIN,
+        RGB_R_PIN, RGB_G_PIN, RGB_B_PIN, BUZZER_PIN, RELAY_PUMP_PIN
+    )
+
     async def main():
         fc = FarmController(pins={
             'dht11': DHT11_PIN,
@@ -0,0 +1,199 @@
+'''
+感測器故障與異常偵測模組
+位於感測器與 FarmHistoryData 之間，逐筆檢查讀值；每個檢查都是 O(1)、記憶體固定：
+    - missing  讀取失敗（None）
+    - range    超出硬體量程或為錯誤哨兵值（例如 ADC 失敗的 -1）
+    - stuck    連續多筆完全相同（ADC 斷線或卡住）；量程端點（例如乾的水位感測器讀到 0）不算
+    - outlier  與 EWMA 平均相差超過 z_max 個標準差；連續多筆離群視為真的換了水準（例如補水），以新值重設基準。
+               標準差不低於感測器的解析度：量化的讀值（DHT11 每 1°C 一階）長時間不變時變異數趨近 0，
+               否則下一次正常地跳一階就會被當成離群
+被標記的讀值會改成 None，不列入上傳平均，並累計成健康計數
+'''
+try:
+    from typing import Optional
+except ImportError:
+    pass
+from lib.esplog.core import Logger
+
+OK = 0
+MISSING = 1
+RANGE = 2
+STUCK = 3
+OUTLIER = 4
+FLAG_NAMES = ("ok", "missing", "range", "stuck", "outlier")
+
+
+class ChannelMonitor:
+    '''
+    單一感測通道的串流檢查器
+    '''
+    def __init__(self, name: str, low: float, high: float,
+                 sentinels: tuple = (), stuck_samples: int = 0, rails: tuple = (), resolution: float = 0.0,
+                 alpha: float = 0.05, z_max: float = 6.0, warmup: int = 20, rebaseline: int = 5):
+        """通道檢查器的初始化
+
+        Args:
+            name (str): 通道名稱（對應 Reading 欄位）
+            low (float): 合理下限
+            high (float): 合理上限
+            sentinels (tuple): 代表讀取失敗的哨兵值
+            stuck_samples (int): 連續相同幾筆視為卡住，0 表示不檢查（例如解析度只有 1°C 的 DHT11）
+            rails (tuple): 長時間停在這些值是正常的（ADC 量程端點），不做卡值判斷
+            resolution (float): 讀值的最小變化量（DHT11 為 1，ADC 類為數個刻度換算的值），作為標準差的下限
+            alpha (float): EWMA 平滑係數
+            z_max (float): 超過幾個標準差視為離群
+            warmup (int): 累積幾筆後才開始離群判斷
+            rebaseline (int): 連續幾筆離群就以新值重設 EWMA 平均，0 表示不重設
+        """
+        self.name = name
+        self.low = low
+        self.high = high
+        self.sentinels = sentinels
+        self.stuck_samples = stuck_samples
+        self.rails = rails
+        self.var_min = resolution * resolution
+        self.alpha = alpha
+        self.z2_max = z_max * z_max
+        self.warmup = warmup
+        self.rebaseline = rebaseline
+
+        self._last = None
+        self._run = 0
+        self._mean = 0.0
+        self._var = 0.0
+        self._n = 0
+        self._outliers = 0  # 連續離群筆數
+        self.rebaselines = 0
+        self.state = OK
+
+        self.totals = [0, 0, 0, 0, 0]  # 依 FLAG_NAMES 順序累計
+        self.window = [0, 0, 0, 0, 0]  # 本次上傳視窗
+
+    def check(self, value) -> int:
+        """檢查一筆讀值
+
+        Args:
+            value: 讀值（None 表示讀取失敗）
+
+        Returns:
+            int: OK / MISSING / RANGE / STUCK / OUTLIER
+        """
+        flag = self._classify(value)
+        self.totals[flag] += 1
+        self.window[flag] += 1
+        return flag
+
+    def _classify(self, value) -> int:
+        if value is None:
+            return MISSING
+        if value in self.sentinels or value != value or value < self.low or value > self.high:
+            return RANGE
+
+        # 卡值：連續完全相同
+        if value == self._last:
+            self._run += 1
+        else:
+            self._run = 1
+            self._last = value
+        if self.stuck_samples and self._run >= self.stuck_samples and value not in self.rails:
+            return STUCK
+
+        # EWMA 平均與變異數；只用正常值更新，避免單一尖峰拉偏基準
+        if self._n == 0:
+            self._mean = value
+            self._n = 1
+            return OK
+        delta = value - self._mean
+        var = self._var if self._var > self.var_min else self.var_min
+        if self._n >= self.warmup and var > 0 and delta * delta > self.z2_max * var:
+            self._outliers += 1
+            if not self.rebaseline or self._outliers < self.rebaseline:
+                return OUTLIER
+            # 連續離群：水準真的變了，以新值為平均，變異數（雜訊大小）沿用
+            self._mean = value
+            self._outliers = 0
+            self.rebaselines += 1
+            return OK
+        self._outliers = 0
+        self._mean += self.alpha * delta
+        self._var = (1 - self.alpha) * (self._var + self.alpha * delta * delta)
+        if self._n < self.warmup:
+            self._n += 1
+        return OK
+
+
+class FaultDetector:
+    '''
+    對整筆 Reading 套用各通道檢查，被標記的欄位改為 None
+    '''
+    def __init__(self, logger: Logger, stuck_samples: int = 30,
+                 alpha: float = 0.05, z_max: float = 6.0, warmup: int = 20, rebaseline: int = 5):
+        """故障偵測器的初始化
+
+        Args:
+            logger (Logger): 日誌記錄器
+            stuck_samples (int): ADC 類通道連續相同幾筆視為卡住
+            alpha (float): EWMA 平滑係數
+            z_max (float): 離群門檻（標準差倍數）
+            warmup (int): 離群判斷前需累積的筆數
+            rebaseline (int): 連續幾筆離群就重設基準
+        """
+        self.logger = logger
+        common = {"alpha": alpha, "z_max": z_max, "warmup": warmup, "rebaseline": rebaseline}
+        self.channels = (
+            ChannelMonitor("temperature", 0, 50, resolution=1.0, **common),  # DHT11 量程 0-50°C，解析度 1°C
+            ChannelMonitor("humidity", 5, 95, resolution=1.0, **common),     # DHT11 量程 20-90%RH，留一點餘裕
+            # ADC 讀到 0 或 4095 是量程端點（清水、乾的水位感測器、泡在水裡），長時間不變是正常的；
+            # 解析度取約 4 個 ADC 刻度（ESP32 ADC 的雜訊）換算成各通道的單位
+            ChannelMonitor("turbidity_percent", 0, 100, stuck_samples=stuck_samples, rails=(0.0, 100.0),
+                           resolution=0.1, **common),
+            ChannelMonitor("tds_value", 0, 2000, stuck_samples=stuck_samples, rails=(0.0,), resolution=2.0, **common),
+            ChannelMonitor("water_level_raw", 0, 4095, sentinels=(-1,), stuck_samples=stuck_samples,
+                           rails=(0, 4095), resolution=4.0, **common),
+        )
+
+    def screen(self, record):
+        """檢查並清洗一筆 Reading（就地修改）
+
+        Args:
+            record (Reading): 本回合讀值
+        """
+        for ch in self.channels:
+            rebaselines = ch.rebaselines
+            flag = ch.check(getattr(record, ch.name))
+            if ch.rebaselines != rebaselines:
+                self.logger.info(f"{ch.name} 連續 {ch.rebaseline} 筆離群，改以新的水準為基準")
+            if flag != ch.state:
+                if flag in (RANGE, STUCK, OUTLIER):
+                    self.logger.warning(f"{ch.name} 讀值異常（{FLAG_NAMES[flag]}），不列入平均")
+                elif ch.state in (RANGE, STUCK, OUTLIER) and flag == OK:
+                    self.logger.info(f"{ch.name} 讀值恢復正常")
+                ch.state = flag
+            if flag != OK:
+                setattr(record, ch.name, None)
+                if ch.name == "water_level_raw":
+                    record.water_level_low = None
+
+    def take_window(self) -> dict:
+        """取出本次上傳視窗的健康計數並歸零（只記錄有異常的通道）
+
+        Returns:
+            dict: {通道: {'missing': n, 'range': n, ...}}
+        """
+        result = {}
+        for ch in self.channels:
+            counts = ch.window
+            if counts[OK] != sum(counts):
+                result[ch.name] = {FLAG_NAMES[i]: counts[i] for i in range(1, len(FLAG_NAMES)) if counts[i]}
+            for i in range(len(counts)):
+                counts[i] = 0
+        return result
+
+    def report(self) -> dict:
+        '''累計健康計數（給狀態端點）'''
+        result = {}
+        for ch in self.channels:
+            counts = {FLAG_NAMES[i]: ch.totals[i] for i in range(len(FLAG_NAMES))}
+            counts["rebaselines"] = ch.rebaselines
+            result[ch.name] = counts
+        return result
@@ -0,0 +1,415 @@
+'''
+閘道（gateway）模式模組
+同一個溫室有很多片板子時，不必每片都各自連 Webhook：節點把每次的上傳摘要編成精簡的 UDP 封包送給閘道，
+閘道去除重複、累積成批，再透過自己的上傳佇列一次送出；閘道沒有回應時節點自動改回直接上傳
+
+封包格式（little endian）：
+    資料 37 bytes：b"FG"、版本 u8、種類 u8（1=資料）、節點 u16、開機識別 u16、序號 u32、時間 u32（節點的 epoch 秒）、
+                   5 個平均值 f32（缺值為 NaN，順序同 SUMMARY_FIELDS）、低水位 u8（0/1，2 表示未知）
+    確認 12 bytes：b"FG"、版本 u8、種類 u8（2=確認）、節點 u16、開機識別 u16、序號 u32
+'''
+import asyncio
+import random
+import socket
+import struct
+import time
+try:
+    from typing import Optional, List
+except ImportError:
+    pass
+from lib.esplog.core import Logger
+
+from core.compat import ticks_ms, ticks_diff
+from core.metrics import startup
+
+MAGIC = b"FG"
+VERSION = 1
+DATA = 1
+ACK = 2
+DATAGRAM = "<2sBBHHII5fB"
+ACK_FORMAT = "<2sBBHHI"
+DATAGRAM_SIZE = struct.calcsize(DATAGRAM)
+ACK_SIZE = struct.calcsize(ACK_FORMAT)
+
+AVERAGE_FIELDS = ("avg_temperature", "avg_humidity", "avg_turbidity_percent",
+                  "avg_tds_value", "avg_water_level_raw")
+WINDOW = 30  # 每個節點記住最近幾個序號，用來判斷重送（30 位元遮罩在板子上仍是小整數，不會配置記憶體）
+_WINDOW_MASK = (1 << WINDOW) - 1
+
+_NAN = float("nan")
+
+
+def encode(node: int, boot: int, seq: int, summary: dict, timestamp: int) -> bytes:
+    '''把上傳摘要編成資料封包'''
+    values = [_NAN if summary.get(k) is None else float(summary[k]) for k in AVERAGE_FIELDS]
+    low = summary.get("water_level_low")
+    return struct.pack(DATAGRAM, MAGIC, VERSION, DATA, node, boot, seq & 0xFFFFFFFF,
+                       timestamp & 0xFFFFFFFF, *values, 2 if low is None else int(bool(low)))
+
+
+def decode(data: bytes) -> Optional[tuple]:
+    """解析資料封包
+
+    Returns:
+        Optional[tuple]: (節點, 開機識別, 序號, 摘要 dict)，格式不符時返回 None
+    """
+    if len(data) != DATAGRAM_SIZE:
+        return None
+    fields = struct.unpack(DATAGRAM, data)
+    if fields[0] != MAGIC or fields[1] != VERSION or fields[2] != DATA:
+        return None
+    node, boot, seq, timestamp = fields[3], fields[4], fields[5], fields[6]
+    summary = {"node": node, "seq": seq}
+    for key, value in zip(AVERAGE_FIELDS, fields[7:12]):
+        summary[key] = None if value != value else value
+    summary["water_level_low"] = None if fields[12] == 2 else bool(fields[12])
+    summary["timestamp"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+    return node, boot, seq, summary
+
+
+def _recv(sock, size: int):
+    '''非阻塞接收，沒有資料時返回 (None, None)'''
+    try:
+        return sock.recvfrom(size)
+    except OSError:
+        return None, None
+
+
+class GatewayServer:
+    '''
+    閘道端：接收節點封包、回覆確認、以 (節點, 開機識別, 序號) 去除重複並累積成批上傳
+    '''
+    def __init__(self, uploader, logger: Logger, node_id: int = 0, host: str = "0.0.0.0",
+                 port: int = 5684, batch_size: int = 20, batch_interval: float = 30.0, poll_ms: int = 20):
+        """閘道的初始化
+
+        Args:
+            uploader (FanoutUploader): 負責往上游送出的上傳器
+            logger (Logger): 日誌記錄器
+            node_id (int): 閘道自己的節點編號
+            host (str): 綁定位址
+            port (int): UDP 連接埠
+            batch_size (int): 累積幾筆就送出一批
+            batch_interval (float): 最早的一筆等待超過幾秒就送出
+            poll_ms (int): 沒有封包時的輪詢間隔（毫秒）
+        """
+        self.uploader = uploader
+        self.logger = logger
+        self.node_id = node_id
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.batch_interval_ms = int(batch_interval * 1000)
+        self.poll_ms = poll_ms
+
+        self._sock = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[dict] = []
+        self._batch_start = 0
+        self._seen = {}  # 節點 -> [開機識別, 最高序號, 最近 WINDOW 個序號的位元遮罩]
+        self._ack = bytearray(ACK_SIZE)
+
+        self.received = 0
+        self.accepted = 0
+        self.duplicates = 0
+        self.malformed = 0
+        self.batches = 0
+        self.node_counts = {}
+
+    def start(self):
+        if self._task is not None:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(socket.getaddrinfo(self.host, self.port)[0][-1])
+        sock.setblocking(False)
+        self._sock = sock
+        self._task = asyncio.create_task(self.run())
+        self.logger.info(f"閘道模式已啟動，UDP 連接埠 {self.port}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self.flush()
+
+    def add_local(self, summary: dict):
+        '''閘道自己的上傳摘要也併進同一批'''
+        summary["node"] = self.node_id
+        self._append(summary)
+
+    async def run(self):
+        '''接收封包並定期送出批次'''
+        while True:
+            received = self.poll()
+            if self._batch and ticks_diff(ticks_ms(), self._batch_start) >= self.batch_interval_ms:
+                self.flush()
+            await asyncio.sleep(0 if received else self.poll_ms / 1000)
+
+    def poll(self, limit: int = 64) -> int:
+        '''處理目前已到達的封包（最多 limit 個），返回處理數量'''
+        count = 0
+        while count < limit:
+            data, addr = _recv(self._sock, DATAGRAM_SIZE + 1)
+            if data is None:
+                break
+            count += 1
+            self._handle(data, addr)
+        return count
+
+    def _handle(self, data: bytes, addr):
+        self.received += 1
+        packet = decode(data)
+        if packet is None:
+            self.malformed += 1
+            return
+        node, boot, seq, summary = packet
+        # 重送的封包也要回覆確認，節點可能只是沒收到上一次的確認
+        struct.pack_into(ACK_FORMAT, self._ack, 0, MAGIC, VERSION, ACK, node, boot, seq)
+        try:
+            self._sock.sendto(self._ack, addr)
+        except OSError:
+            pass
+        if not self._accept(node, boot, seq):
+            self.duplicates += 1
+            return
+        self.accepted += 1
+        self.node_counts[node] = self.node_counts.get(node, 0) + 1
+        self._append(summary)
+
+    def _accept(self, node: int, boot: int, seq: int) -> bool:
+        '''滑動視窗去除重複；節點重新開機（開機識別改變）時重設視窗'''
+        state = self._seen.get(node)
+        if state is None or state[0] != boot:
+            self._seen[node] = [boot, seq, 1]
+            return True
+        highest, mask = state[1], state[2]
+        if seq > highest:
+            shift = seq - highest
+            state[1] = seq
+            state[2] = ((mask << shift) | 1) & _WINDOW_MASK if shift < WINDOW else 1
+            return True
+        offset = highest - seq
+        if offset >= WINDOW:
+            return False  # 太舊，視為重送
+        bit = 1 << offset
+        if mask & bit:
+            return False
+        state[2] = mask | bit
+        return True
+
+    def _append(self, summary: dict):
+        if not self._batch:
+            self._batch_start = ticks_ms()
+        self._batch.append(summary)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        '''把目前累積的批次交給上傳器（設了 batch 的目的地收到整批，其他目的地每筆各一個請求）'''
+        if not self._batch:
+            return
+        batch = self._batch
+        self._batch = []
+        self.batches += 1
+        self.uploader.submit_batch({
+            "gateway": self.node_id,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+            "readings": batch
+        })
+        self.logger.info(f"閘道送出一批 {len(batch)} 筆")
+
+    def report(self) -> dict:
+        '''整理成字典'''
+        return {
+            "mode": "gateway",
+            "received": self.received,
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "malformed": self.malformed,
+            "batches": self.batches,
+            "pending": len(self._batch),
+            "nodes": len(self.node_counts)
+        }
+
+
+class GatewayClient:
+    '''
+    節點端：把上傳摘要送給閘道並等待確認；閘道連續沒有回應就改用 fallback 直接上傳，
+    過一段時間再試著回到閘道
+    '''
+    def __init__(self, host: str, port: int, node_id: int, logger: Logger, fallback,
+                 ack_timeout: float = 1.0, retries: int = 2, retry_interval: float = 300.0,
+                 down_after: int = 3, queue_size: int = 10, poll_ms: int = 20):
+        """節點端的初始化
+
+        Args:
+            host (str): 閘道 IP
+            port (int): 閘道 UDP 連接埠
+            node_id (int): 本節點編號（同一個閘道下不可重複）
+            logger (Logger): 日誌記錄器
+            fallback: 閘道不可用時呼叫 fallback(summary) 直接上傳
+            ack_timeout (float): 每次送出後等待確認的秒數
+            retries (int): 沒收到確認時重送次數
+            retry_interval (float): 判定閘道離線後，隔多久再試一次（秒）
+            down_after (int): 連續幾筆送不到就判定閘道離線
+            queue_size (int): 佇列上限，滿了直接改用 fallback
+            poll_ms (int): 等待確認時的輪詢間隔（毫秒）
+        """
+        self.host = host
+        self.port = port
+        self.node_id = node_id
+        self.logger = logger
+        self.fallback = fallback
+        self.ack_timeout_ms = int(ack_timeout * 1000)
+        self.retries = retries
+        self.retry_interval_ms = int(retry_interval * 1000)
+        self.down_after = down_after
+        self.queue_size = queue_size
+        self.poll_ms = poll_ms
+
+        self.boot = random.getrandbits(16)  # 每次開機不同，閘道據此重設去重視窗
+        self.seq = 0
+        self._queue = []  # [(封包, 摘要)]
+        self._event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._sock = None
+        self._addr = None
+        self._down_since = None
+        self._failures = 0
+
+        self.sent = 0
+        self.acked = 0
+        self.resent = 0
+        self.fallbacks = 0
+        self.last_rtt_ms: Optional[int] = None
+
+    @property
+    def gateway_up(self) -> bool:
+        return self._down_since is None
+
+    def submit(self, summary: dict, timestamp: Optional[int] = None):
+        """加入佇列（不阻塞）；序號在這裡決定，重送時沿用同一個封包
+
+        Args:
+            summary (dict): 上傳摘要
+            timestamp (Optional[int]): 摘要的時間（time.time() 秒），None 表示現在
+        """
+        if len(self._queue) >= self.queue_size:
+            self.fallbacks += 1
+            self.fallback(summary)
+            return
+        self.seq += 1
+        packet = encode(self.node_id, self.boot, self.seq, summary,
+                        int(time.time()) if timestamp is None else timestamp)
+        self._queue.append((packet, summary))
+        self._event.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    async def run(self):
+        while True:
+            if not self._queue:
+                self._event.clear()
+                await self._event.wait()
+                continue
+            packet, summary = self._queue.pop(0)
+            if not self._should_try():
+                self.fallbacks += 1
+                self.fallback(summary)
+                continue
+            if await self._send(packet):
+                self._failures = 0
+                if self._down_since is not None:
+                    self._down_since = None
+                    self.logger.info("閘道恢復回應，改回經由閘道上傳")
+                continue
+            self._failures += 1
+            self.fallbacks += 1
+            self.fallback(summary)
+            if self._failures >= self.down_after and self._down_since is None:
+                self._down_since = ticks_ms()
+                self.logger.warning("閘道沒有回應，改為直接上傳")
+            elif self._down_since is not None:
+                self._down_since = ticks_ms()  # 重試仍失敗，重新計時
+
+    def _should_try(self) -> bool:
+        '''閘道離線時只在每隔 retry_interval 試一次'''
+        if self._down_since is None:
+            return True
+        return ticks_diff(ticks_ms(), self._down_since) >= self.retry_interval_ms
+
+    def _socket(self):
+        if self._sock is None:
+            self._addr = socket.getaddrinfo(self.host, self.port)[0][-1]
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            self._sock = sock
+        return self._sock
+
+    async def _send(self, packet: bytes) -> bool:
+        '''送出並等待確認，沒收到就重送'''
+        seq = struct.unpack_from("<I", packet, 8)[0]
+        try:
+            sock = self._socket()
+        except OSError as e:
+            self.logger.error(f"建立閘道連線失敗: {e}")
+            return False
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.resent += 1
+            start = ticks_ms()
+            try:
+                sock.sendto(packet, self._addr)
+            except OSError:
+                await asyncio.sleep(self.ack_timeout_ms / 1000)
+                continue
+            self.sent += 1
+            while ticks_diff(ticks_ms(), start) < self.ack_timeout_ms:
+                data, _ = _recv(sock, ACK_SIZE)
+                if data is None:
+                    await asyncio.sleep(self.poll_ms / 1000)
+                    continue
+                if len(data) != ACK_SIZE:
+                    continue
+                magic, version, kind, node, boot, acked = struct.unpack(ACK_FORMAT, data)
+                if magic == MAGIC and kind == ACK and node == self.node_id and boot == self.boot and acked == seq:
+                    self.acked += 1
+                    self.last_rtt_ms = ticks_diff(ticks_ms(), start)
+                    startup.mark("first_upload")
+                    return True
+        return False
+
+    def report(self) -> dict:
+        '''整理成字典'''
+        return {
+            "mode": "node",
+            "gateway_up": self.gateway_up,
+            "backlog": len(self._queue),
+            "sent": self.sent,
+            "acked": self.acked,
+            "resent": self.resent,
+            "fallbacks": self.fallbacks,
+            "last_rtt_ms": self.last_rtt_ms
+        }
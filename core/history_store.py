@@ -0,0 +1,352 @@
+'''
+裝置端多解析度歷史紀錄模組
+每回合的讀值與 1 分 / 1 小時 / 1 天彙總各寫進一個固定大小的環形檔案：
+    - 檔案在第一次開機時就預先配置好全部紀錄，之後只會覆寫最舊的一筆，flash 用量固定
+    - 每個層級依時間順序寫入，寫入位置在開機時以二分搜尋時間戳找回，不必每次改寫檔頭
+    - 範圍讀取以二分搜尋定位起點再循序讀出，供狀態端點查看與斷線後補傳
+
+檔案格式（little endian）：
+    檔頭 12 bytes：b"FHST"、版本 u8、保留 u8、紀錄大小 u16、容量 u32
+    紀錄 27 bytes：時間 u32（Unix 秒，彙總為桶起點）、5 個平均值 f32（缺值為 NaN）、
+                   樣本數 u16、低水位 u8（0/1，2 表示未知）
+'''
+import _thread
+import os
+import struct
+import time
+from array import array
+try:
+    from typing import Optional, List, Dict
+except ImportError:
+    pass
+
+from core.reading import Reading
+from core.compat import EPOCH_OFFSET, MIN_VALID_TIME, unix_time, time_valid, ticks_ms, ticks_diff
+
+MAGIC = b"FHST"
+VERSION = 1
+HEADER = "<4sBBHI"
+RECORD = "<I5fHB"
+HEADER_SIZE = struct.calcsize(HEADER)
+RECORD_SIZE = struct.calcsize(RECORD)
+
+# 層級名稱 -> 桶寬（秒），0 表示每回合一筆
+LEVELS = (("cycle", 0), ("1m", 60), ("1h", 3600), ("1d", 86400))
+DEFAULT_CAPACITY = {"cycle": 720, "1m": 4320, "1h": 1440, "1d": 730}
+FIELDS = ("avg_temperature", "avg_humidity", "avg_turbidity_percent", "avg_tds_value", "avg_water_level_raw")
+
+
+_NAN = float("nan")
+
+
+def format_time(ts: int) -> str:
+    '''Unix 秒轉成與上傳摘要相同的 "YYYY-mm-dd HH:MM:SS"（UTC）'''
+    t = time.gmtime(ts - EPOCH_OFFSET)
+    return "%04d-%02d-%02d %02d:%02d:%02d" % (t[0], t[1], t[2], t[3], t[4], t[5])
+
+
+class _RingFile:
+    '''
+    固定容量的環形紀錄檔
+    '''
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self.head = 0     # 下一筆要寫的位置
+        self.count = 0
+        self.last_ts = 0
+        self._ts = bytearray(4)
+        self._lock = _thread.allocate_lock()
+        if not self._open_existing():
+            self._create()
+
+    def _open_existing(self) -> bool:
+        try:
+            f = open(self.path, "r+b")
+        except OSError:
+            return False
+        header = f.read(HEADER_SIZE)
+        if len(header) == HEADER_SIZE:
+            magic, version, _, size, capacity = struct.unpack(HEADER, header)
+            if magic == MAGIC and version == VERSION and size == RECORD_SIZE and capacity == self.capacity:
+                self._f = f
+                self._recover()
+                return True
+        f.close()
+        return False
+
+    def _create(self):
+        '''建立新檔並預先配置全部紀錄（時間為 0 表示空白）'''
+        f = open(self.path, "wb")
+        f.write(struct.pack(HEADER, MAGIC, VERSION, 0, RECORD_SIZE, self.capacity))
+        chunk = bytes(RECORD_SIZE * 16)
+        remaining = self.capacity
+        while remaining > 0:
+            n = min(16, remaining)
+            f.write(chunk if n == 16 else chunk[:RECORD_SIZE * n])
+            remaining -= n
+        f.close()
+        self._f = open(self.path, "r+b")
+
+    def _read_ts(self, index: int) -> int:
+        self._f.seek(HEADER_SIZE + index * RECORD_SIZE)
+        self._f.readinto(self._ts)
+        return struct.unpack("<I", self._ts)[0]
+
+    def _recover(self):
+        '''以二分搜尋找出下一筆的寫入位置：較新的紀錄都不早於位置 0，較舊或空白的都早於它'''
+        first = self._read_ts(0)
+        if first == 0:
+            return
+        lo, hi = 1, self.capacity
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._read_ts(mid) < first:
+                hi = mid
+            else:
+                lo = mid + 1
+        self.head = lo % self.capacity
+        wrapped = lo == self.capacity or self._read_ts(self.capacity - 1) != 0
+        self.count = self.capacity if wrapped else lo
+        self.last_ts = self._read_ts((self.head - 1) % self.capacity)
+
+    def reserve(self, ts: int) -> int:
+        '''取得下一筆的位置並更新索引（實際寫入可以稍後在工作執行緒進行）'''
+        index = self.head
+        self.head = (index + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+        self.last_ts = ts
+        return index
+
+    def write_at(self, index: int, data):
+        with self._lock:
+            self._f.seek(HEADER_SIZE + index * RECORD_SIZE)
+            self._f.write(data)
+            self._f.flush()
+
+    def _physical(self, logical: int) -> int:
+        return (self.head - self.count + logical) % self.capacity
+
+    def find(self, ts: int) -> int:
+        '''第一筆時間 >= ts 的邏輯位置（0 為最舊）'''
+        lo, hi = 0, self.count
+        with self._lock:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._read_ts(self._physical(mid)) < ts:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        return lo
+
+    def read(self, lo: int, hi: int, end: Optional[int]):
+        """循序讀出邏輯位置 [lo, hi) 中時間 < end 的紀錄（產生器，每次讀 16 筆）
+
+        開始時就固定實體位置，讀取中途有新紀錄寫入也不會重複或跳過；
+        鎖只在讀每一段時持有，呼叫端可以在兩段之間 await
+        """
+        buf = bytearray(RECORD_SIZE * 16)
+        with self._lock:
+            first = self._physical(lo)
+        done = 0
+        last = -1
+        while done < hi - lo:
+            start = (first + done) % self.capacity
+            n = min(16, hi - lo - done, self.capacity - start)  # 不跨越檔尾
+            with self._lock:
+                self._f.seek(HEADER_SIZE + start * RECORD_SIZE)
+                self._f.readinto(memoryview(buf)[:RECORD_SIZE * n])
+            for k in range(n):
+                record = struct.unpack_from(RECORD, buf, k * RECORD_SIZE)
+                # 時間倒退代表還沒讀到的位置已被新紀錄覆寫（環形檔繞回），到此為止
+                if (end is not None and record[0] >= end) or record[0] < last:
+                    return
+                last = record[0]
+                yield record
+            done += n
+
+    def close(self):
+        self._f.close()
+
+
+class _Rollup:
+    '''一個彙總層級進行中的桶（預先配置，累加時不配置記憶體）'''
+
+    def __init__(self, bucket: int):
+        self.bucket = bucket
+        self.start = -1
+        self.sums = array("f", [0.0] * len(FIELDS))
+        self.counts = array("i", [0] * len(FIELDS))
+        self.samples = 0
+        self.low = 2
+
+    def reset(self, start: int):
+        self.start = start
+        for i in range(len(FIELDS)):
+            self.sums[i] = 0.0
+            self.counts[i] = 0
+        self.samples = 0
+        self.low = 2
+
+    def add(self, values, low: int):
+        for i in range(len(FIELDS)):
+            x = values[i]
+            if x == x:
+                self.sums[i] += x
+                self.counts[i] += 1
+        self.samples += 1
+        if low == 1 or (low == 0 and self.low == 2):
+            self.low = low
+
+
+class HistoryStore:
+    '''
+    裝置端多解析度歷史：每回合一筆（約最近一小時）加上 1 分 / 1 小時 / 1 天彙總（數週到數年）
+    '''
+    def __init__(self, root: str = "history", capacity: Optional[Dict[str, int]] = None, pending_limit: int = 120):
+        """歷史紀錄的初始化（第一次執行時會建立並預先配置檔案）
+
+        Args:
+            root (str): 存放檔案的目錄
+            capacity (Optional[Dict[str, int]]): 各層級可保存的筆數，未指定的使用 DEFAULT_CAPACITY
+            pending_limit (int): 校時前最多暫存幾回合，校時後補上時間再寫入
+        """
+        try:
+            os.mkdir(root)
+        except OSError:
+            pass  # 目錄已存在
+        sizes = dict(DEFAULT_CAPACITY)
+        sizes.update(capacity or {})
+        self.rings = {}
+        self._rollups = []
+        for name, bucket in LEVELS:
+            self.rings[name] = _RingFile(f"{root}/{name}.bin", sizes[name])
+            if bucket:
+                self._rollups.append((name, _Rollup(bucket)))
+        self.worker = None
+        self._values = array("f", [0.0] * len(FIELDS))
+        self._means = array("f", [0.0] * len(FIELDS))  # 彙總的平均值另用一份，不能蓋掉每回合的值
+        self._buf = bytearray(RECORD_SIZE)
+        self._pending = []  # 校時前的讀值 (ticks, 數值, 低水位)
+        self.pending_limit = pending_limit
+        self.written = 0
+        self.skipped = 0
+
+    def append(self, record: Reading, ts: Optional[int] = None) -> bool:
+        """寫入一回合的讀值，並在桶結束時寫出彙總
+
+        Args:
+            record (Reading): 已經過異常清洗的讀值
+            ts (Optional[int]): Unix 秒，None 表示現在（尚未校時則先暫存，校時後補上時間）
+
+        Returns:
+            bool: 暫存、時間無效或比上一筆早而沒有寫入時返回 False
+        """
+        values = self._values
+        values[0] = _NAN if record.temperature is None else record.temperature
+        values[1] = _NAN if record.humidity is None else record.humidity
+        values[2] = _NAN if record.turbidity_percent is None else record.turbidity_percent
+        values[3] = _NAN if record.tds_value is None else record.tds_value
+        values[4] = _NAN if record.water_level_raw is None else record.water_level_raw
+        low = 2 if record.water_level_low is None else int(bool(record.water_level_low))
+        if ts is None:
+            if not time_valid():
+                if len(self._pending) >= self.pending_limit:
+                    self._pending.pop(0)
+                    self.skipped += 1
+                self._pending.append((ticks_ms(), array("f", values), low))
+                return False
+            if self._pending:
+                self._flush_pending()
+            ts = unix_time()
+        return self._append(ts, values, low)
+
+    def _flush_pending(self):
+        '''校時後以「現在 - 經過時間」補上暫存讀值的時間並依序寫入'''
+        now, now_ticks = unix_time(), ticks_ms()
+        pending, self._pending = self._pending, []
+        for ticks, values, low in pending:
+            self._append(now - ticks_diff(now_ticks, ticks) // 1000, values, low)
+
+    def _append(self, ts: int, values, low: int) -> bool:
+        cycle = self.rings["cycle"]
+        if ts < MIN_VALID_TIME or ts < cycle.last_ts:
+            self.skipped += 1
+            return False
+        self._write(cycle, ts, values, 1, low)
+
+        for name, rollup in self._rollups:
+            start = ts - ts % rollup.bucket
+            if start != rollup.start:
+                if rollup.samples:
+                    self._write_rollup(self.rings[name], rollup)
+                rollup.reset(start)
+            rollup.add(values, low)
+        self.written += 1
+        return True
+
+    def _write_rollup(self, ring: _RingFile, rollup: _Rollup):
+        means = self._means
+        for i in range(len(FIELDS)):
+            means[i] = rollup.sums[i] / rollup.counts[i] if rollup.counts[i] else _NAN
+        self._write(ring, rollup.start, means, min(rollup.samples, 0xFFFF), rollup.low)
+
+    def _write(self, ring: _RingFile, ts: int, values, samples: int, low: int):
+        struct.pack_into(RECORD, self._buf, 0, ts, values[0], values[1], values[2], values[3], values[4], samples, low)
+        index = ring.reserve(ts)
+        if self.worker is not None and self.worker.post(ring.write_at, index, bytes(self._buf)):
+            return
+        ring.write_at(index, self._buf)
+
+    def read(self, level: str = "cycle", start: Optional[int] = None, end: Optional[int] = None,
+             limit: int = 100) -> List[dict]:
+        """範圍讀取（一次回傳全部，筆數多時改用 iter_rows）
+
+        Args:
+            level (str): cycle / 1m / 1h / 1d
+            start (Optional[int]): 起始 Unix 秒（含），None 表示取最後 limit 筆
+            end (Optional[int]): 結束 Unix 秒（不含），None 表示到最新
+            limit (int): 最多回傳筆數
+
+        Returns:
+            List[dict]: 與上傳摘要相同欄位的紀錄，另含 ts（Unix 秒）與 samples
+        """
+        return list(self.iter_rows(level, start, end, limit))
+
+    def iter_rows(self, level: str = "cycle", start: Optional[int] = None, end: Optional[int] = None,
+                  limit: int = 100):
+        """範圍讀取，邊讀邊產生紀錄，記憶體用量與筆數無關（參數同 read）
+
+        Raises:
+            ValueError: 未知層級（呼叫時立即檢查，不等到開始迭代）
+        """
+        ring = self.rings.get(level)
+        if ring is None:
+            raise ValueError(f"未知層級: {level}")
+        hi = ring.count if end is None else ring.find(end)
+        lo = max(0, hi - limit) if start is None else ring.find(start)
+        return self._rows(ring.read(lo, min(hi, lo + limit), end))
+
+    @staticmethod
+    def _rows(records):
+        for record in records:
+            row = {"ts": record[0], "timestamp": format_time(record[0])}
+            for i, key in enumerate(FIELDS):
+                value = record[i + 1]
+                row[key] = None if value != value else value
+            row["samples"] = record[6]
+            row["water_level_low"] = None if record[7] == 2 else bool(record[7])
+            yield row
+
+    def report(self) -> dict:
+        '''各層級筆數、容量與時間範圍'''
+        result = {"written": self.written, "skipped": self.skipped, "pending": len(self._pending),
+                  "flash_bytes": sum(HEADER_SIZE + r.capacity * RECORD_SIZE for r in self.rings.values())}
+        for name, ring in self.rings.items():
+            result[name] = {"count": ring.count, "capacity": ring.capacity, "last_ts": ring.last_ts or None}
+        return result
+
+    def close(self):
+        for ring in self.rings.values():
+            ring.close()
@@ -0,0 +1,85 @@
+'''
+非阻塞 HTTP 用戶端模組
+以 asyncio.open_connection 送出 JSON POST，等待回應時不會卡住事件迴圈
+（取代會阻塞整個迴圈的 requests.post）；同步的 DNS 查詢可交給 I/O 工作執行緒
+'''
+import asyncio
+import socket
+
+def parse_url(url: str) -> tuple:
+    """拆解 URL
+
+    Args:
+        url (str): http:// 或 https:// 開頭的網址
+
+    Returns:
+        tuple: (是否為 https, 主機, 連接埠, 路徑)
+    """
+    if url.startswith("https://"):
+        secure, rest = True, url[8:]
+    elif url.startswith("http://"):
+        secure, rest = False, url[7:]
+    else:
+        raise ValueError(f"不支援的網址: {url}")
+    slash = rest.find("/")
+    netloc, path = (rest, "/") if slash < 0 else (rest[:slash], rest[slash:])
+    if ":" in netloc:
+        host, port = netloc.rsplit(":", 1)
+        port = int(port)
+    else:
+        host, port = netloc, 443 if secure else 80
+    return secure, host, port, path
+
+
+async def _post(url: str, body: bytes, content_type: str, worker) -> int:
+    secure, host, port, path = parse_url(url)
+    if worker is not None:
+        # 先在工作執行緒解析網址，open_connection 拿到 IP 就不會再做同步查詢
+        addr = (await worker.call(socket.getaddrinfo, host, port))[0][-1][0]
+        if secure:
+            reader, writer = await asyncio.open_connection(addr, port, ssl=True, server_hostname=host)
+        else:
+            reader, writer = await asyncio.open_connection(addr, port)
+    else:
+        reader, writer = await asyncio.open_connection(host, port, ssl=True if secure else None)
+    try:
+        header = (f"POST {path} HTTP/1.0\r\n"
+                  f"Host: {host}\r\n"
+                  f"Content-Type: {content_type}\r\n"
+                  f"Content-Length: {len(body)}\r\n"
+                  "Connection: close\r\n\r\n")
+        writer.write(header.encode())
+        writer.write(body)
+        await writer.drain()
+        status_line = await reader.readline()
+        parts = status_line.split()
+        if len(parts) < 2:
+            raise OSError("HTTP 回應格式錯誤")
+        return int(parts[1])
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def post(url: str, body: bytes, timeout: float = 10.0,
+               content_type: str = "application/json", worker=None) -> int:
+    """送出 POST 請求並回傳狀態碼
+
+    Args:
+        url (str): 目的網址
+        body (bytes): 請求本文（已編碼）
+        timeout (float): 從連線到收到狀態行的逾時（秒）
+        content_type (str): Content-Type
+        worker (IOWorker): 負責 DNS 查詢的 I/O 工作執行緒，None 則在事件迴圈上查詢
+
+    Returns:
+        int: HTTP 狀態碼
+
+    Raises:
+        asyncio.TimeoutError: 逾時
+        OSError: 連線失敗或回應格式錯誤
+    """
+    return await asyncio.wait_for(_post(url, body, content_type, worker), timeout)
@@ -0,0 +1,242 @@
+'''
+I/O 工作執行緒模組
+會阻塞的網路與 flash 操作（NTP 校時、DNS 查詢、寫紀錄檔）交給獨立的執行緒執行，
+事件迴圈只負責把工作放進有上限、以鎖保護的環形佇列，完成後再由執行緒通知回事件迴圈。
+板子上用 _thread，主機端用 threading
+'''
+import _thread
+import asyncio
+try:
+    from typing import Optional
+except ImportError:
+    pass
+from lib.esplog.core import Logger
+
+from core.compat import ticks_ms, ticks_diff, IS_MICROPYTHON
+
+
+def _start_thread(target):
+    if IS_MICROPYTHON:
+        _thread.start_new_thread(target, ())
+        return
+    import threading
+    threading.Thread(target=target, name="io-worker", daemon=True).start()
+
+
+class IOWorkerFull(OSError):
+    '''佇列已滿，工作沒有被接受'''
+
+
+class IOWorkerStopped(OSError):
+    '''工作執行緒已停止，排隊中的工作沒有執行'''
+
+
+class _Job:
+    '''
+    一件等待結果的工作；執行緒完成後以 ThreadSafeFlag（板子）或 call_soon_threadsafe（主機）喚醒事件迴圈
+    '''
+    def __init__(self):
+        self.result = None
+        self.error = None
+        if IS_MICROPYTHON:
+            self._flag = asyncio.ThreadSafeFlag()
+        else:
+            self._loop = asyncio.get_event_loop()
+            self._future = self._loop.create_future()
+
+    def complete(self, result, error):
+        '''由工作執行緒呼叫'''
+        self.result = result
+        self.error = error
+        if IS_MICROPYTHON:
+            self._flag.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if not self._future.done():
+            self._future.set_result(None)
+
+    async def wait(self):
+        if IS_MICROPYTHON:
+            await self._flag.wait()
+        else:
+            await self._future
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class IOWorker:
+    '''
+    單一工作執行緒 + 固定大小的環形佇列（單一生產者：事件迴圈；單一消費者：工作執行緒）
+    '''
+    def __init__(self, logger: Logger, capacity: int = 8):
+        """I/O 工作執行緒的初始化
+
+        Args:
+            logger (Logger): 日誌記錄器
+            capacity (int): 佇列上限，滿了新工作會被拒絕（IOWorkerFull）
+        """
+        self.logger = logger
+        self.capacity = capacity
+        self._ring = [None] * capacity  # 每格為 (函式, 參數, _Job 或 None)
+        self._head = 0
+        self._count = 0
+        self._lock = _thread.allocate_lock()
+        # 當作號誌使用：上鎖表示沒有新工作，生產者 release() 喚醒執行緒
+        self._signal = _thread.allocate_lock()
+        self._signal.acquire()
+        # 執行緒存活期間上鎖，結束時釋放；stop() 以此等待執行緒做完手上的工作
+        self._alive = _thread.allocate_lock()
+        self.running = False
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_backlog = 0
+        self.busy_ms = 0
+
+    def start(self):
+        '''啟動工作執行緒'''
+        if self.running:
+            return
+        self._alive.acquire()
+        self.running = True
+        _start_thread(self._run)
+        self.logger.info("I/O 工作執行緒已啟動")
+
+    def stop(self, timeout: float = 5) -> bool:
+        """要求工作執行緒在處理完目前的工作後結束，並等它結束；還在佇列裡的工作不再交給執行緒：
+        等待結果的 call() 立即以 IOWorkerStopped 結束，不需要結果的工作（寫檔）在執行緒結束後於這裡補做
+
+        Args:
+            timeout (float): 最多等執行緒幾秒
+
+        Returns:
+            bool: 執行緒已結束；逾時返回 False，此時佇列中的寫檔不補做，以免與執行緒手上的寫入同時進行
+        """
+        self.running = False
+        self._wake()
+        stopped = self._alive.acquire(1, timeout)
+        if stopped:
+            self._alive.release()
+        else:
+            self.logger.warning(f"I/O 工作執行緒 {timeout} 秒內沒有結束，佇列中的寫檔不補做")
+        while True:
+            item = self._pop()
+            if item is None:
+                break
+            fn, args, job = item
+            if job is not None:
+                self.failed += 1
+                job.complete(None, IOWorkerStopped("I/O 工作執行緒已停止"))
+                continue
+            if not stopped:
+                self.failed += 1
+                continue
+            try:
+                fn(*args)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                self.logger.error(f"I/O 工作失敗: {e}")
+        return stopped
+
+    @property
+    def backlog(self) -> int:
+        return self._count
+
+    def post(self, fn, *args) -> bool:
+        """放入一件不需要結果的工作（例如寫檔），立即返回
+
+        Returns:
+            bool: 佇列已滿或執行緒未啟動時返回 False，呼叫端可改為同步執行
+        """
+        return self._push(fn, args, None)
+
+    async def call(self, fn, *args):
+        """在工作執行緒上執行 fn(*args) 並等待結果，例外會在呼叫端重新拋出
+
+        Raises:
+            IOWorkerFull: 佇列已滿或執行緒未啟動
+        """
+        job = _Job()
+        if not self._push(fn, args, job):
+            raise IOWorkerFull("I/O 佇列已滿")
+        return await job.wait()
+
+    def _push(self, fn, args, job) -> bool:
+        if not self.running:
+            return False
+        with self._lock:
+            if self._count >= self.capacity:
+                self.rejected += 1
+                return False
+            self._ring[(self._head + self._count) % self.capacity] = (fn, args, job)
+            self._count += 1
+            if self._count > self.max_backlog:
+                self.max_backlog = self._count
+            self.submitted += 1
+        self._wake()
+        return True
+
+    def _wake(self):
+        # 事件迴圈與工作執行緒（FileLog 在執行緒上也會 post）都可能呼叫，檢查與釋放要在同一個鎖內，避免重複 release()
+        with self._lock:
+            if self._signal.locked():
+                self._signal.release()
+
+    def _pop(self):
+        with self._lock:
+            if not self._count:
+                return None
+            item = self._ring[self._head]
+            self._ring[self._head] = None
+            self._head = (self._head + 1) % self.capacity
+            self._count -= 1
+            return item
+
+    def _run(self):
+        '''工作執行緒主體；停止後不再取新工作，剩下的交給 stop()'''
+        try:
+            self._loop()
+        finally:
+            self._alive.release()
+
+    def _loop(self):
+        while self.running:
+            self._signal.acquire()
+            while self.running:
+                item = self._pop()
+                if item is None:
+                    break
+                fn, args, job = item
+                start = ticks_ms()
+                result = None
+                error = None
+                try:
+                    result = fn(*args)
+                except Exception as e:
+                    error = e
+                    self.failed += 1
+                    if job is None:
+                        self.logger.error(f"I/O 工作失敗: {e}")
+                self.busy_ms += ticks_diff(ticks_ms(), start)
+                self.completed += 1
+                if job is not None:
+                    job.complete(result, error)
+
+    def report(self) -> dict:
+        '''整理成字典'''
+        return {
+            "running": self.running,
+            "backlog": self._count,
+            "max_backlog": self.max_backlog,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "busy_ms": self.busy_ms
+        }
@@ -0,0 +1,158 @@
+'''
+依連線品質排程上傳
+固定每 DATA_UPLOAD_INTERVALS 回合上傳一次時，訊號在邊緣的請求常常要等很久又失敗，白白耗掉空中時間與電力。
+這裡看 WiFi 訊號強度（RSSI）與最近的上傳延遲、成功率（取表現最好、沒有離線的目的地）決定什麼時候送：
+    - 連線良好：到期的摘要立即送出，累積的多份合併成一個請求
+    - 連線不佳：先留在板上累積，最舊的一份等超過最大資料年齡、或累積到上限時才送出
+    - 因為延遲或失敗而暫停時，每隔一段時間放行一次當作探測，讓統計值有機會恢復
+'''
+try:
+    from typing import Optional
+except ImportError:
+    pass
+
+from core.compat import ticks_ms, ticks_diff
+from core.uploader import DOWN
+
+GOOD = "good"
+POOR = "poor"
+OFFLINE = "offline"
+
+
+class LinkScheduler:
+    '''
+    上傳排程器：決定暫存的摘要何時送出
+    '''
+    def __init__(self, wlan, uploader, rssi_min: int = -75, latency_max: int = 3000,
+                 success_min: float = 0.7, max_age: int = 600, max_batch: int = 10, probe_interval: int = 120):
+        """上傳排程器的初始化
+
+        Args:
+            wlan: network.WLAN（讀取連線狀態與 RSSI）
+            uploader (FanoutUploader): 上傳器（讀取各目的地的延遲與成功率）
+            rssi_min (int): RSSI 低於此值（dBm）視為連線不佳
+            latency_max (int): 平均上傳延遲超過此值（毫秒）視為連線不佳
+            success_min (float): 上傳成功率低於此值視為連線不佳
+            max_age (int): 最舊的一份摘要最多等待幾秒，到了不論連線品質都送出
+            max_batch (int): 最多累積幾份摘要，到了就合併送出
+            probe_interval (int): 因延遲或失敗暫停時，每隔幾秒放行一次
+        """
+        self.wlan = wlan
+        self.uploader = uploader
+        self.rssi_min = rssi_min
+        self.latency_max = latency_max
+        self.success_min = success_min
+        self.max_age_ms = max_age * 1000
+        self.max_batch = max_batch
+        self.probe_interval_ms = probe_interval * 1000
+        self._pending = []  # (ticks, summary)
+        self._sent_at = ticks_ms()
+
+        self.rssi: Optional[float] = None
+        self.quality = OFFLINE
+        self.reason: Optional[str] = None
+        self._by_stats = False  # 是否因為延遲或成功率（而不是訊號）判定不佳
+        self.flushes = 0
+        self.coalesced = 0
+        self.forced = 0
+        self.probes = 0
+        self.dropped = 0
+        self.max_wait_ms = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add(self, summary: dict):
+        '''暫存一份到期的摘要（超過上限丟最舊的，正常情況下 max_batch 會先觸發送出）'''
+        if len(self._pending) >= self.max_batch * 2:
+            self._pending.pop(0)
+            self.dropped += 1
+        self._pending.append((ticks_ms(), summary))
+
+    def _read_rssi(self) -> Optional[int]:
+        try:
+            return self.wlan.status("rssi")
+        except Exception:
+            return None
+
+    def assess(self) -> str:
+        """評估目前的連線品質
+
+        Returns:
+            str: GOOD、POOR 或 OFFLINE（原因記在 self.reason）
+        """
+        if not self.wlan.isconnected():
+            self.quality, self.reason = OFFLINE, "WiFi 未連線"
+            return self.quality
+        rssi = self._read_rssi()
+        if rssi is not None:
+            # 平滑處理，避免訊號在門檻附近跳動時反覆切換
+            self.rssi = rssi if self.rssi is None else 0.7 * self.rssi + 0.3 * rssi
+        quality, reason, by_stats = GOOD, None, False
+        if self.rssi is not None and self.rssi < self.rssi_min:
+            quality, reason = POOR, f"RSSI {self.rssi:.0f} dBm"
+        elif self.uploader.destinations:
+            dest = self._best_destination()
+            if dest is None:
+                quality, reason, by_stats = POOR, "所有目的地離線", True
+            elif dest.success_rate < self.success_min:
+                quality, reason, by_stats = POOR, f"[{dest.name}] 成功率 {dest.success_rate:.2f}", True
+            elif dest.avg_latency_ms is not None and dest.avg_latency_ms > self.latency_max:
+                quality, reason, by_stats = POOR, f"[{dest.name}] 延遲 {dest.avg_latency_ms:.0f} ms", True
+        self.quality, self.reason, self._by_stats = quality, reason, by_stats
+        return quality
+
+    def _best_destination(self):
+        '''表現最好的目的地（成功率最高，同分時延遲較低）；離線（DOWN）的目的地不列入：
+        單一網址失效是那個目的地的問題，不代表連線不好，不應該拖慢其他目的地
+        '''
+        best = None
+        for dest in self.uploader.destinations:
+            if dest.state == DOWN:
+                continue
+            latency = dest.avg_latency_ms if dest.avg_latency_ms is not None else 0
+            if best is None or dest.success_rate > best[0] or (dest.success_rate == best[0] and latency < best[1]):
+                best = (dest.success_rate, latency, dest)
+        return None if best is None else best[2]
+
+    def take(self) -> Optional[list]:
+        """需要送出時取出全部暫存的摘要
+
+        Returns:
+            Optional[list]: 由舊到新的摘要；還不需要送出時返回 None
+        """
+        if not self._pending:
+            return None
+        now = ticks_ms()
+        age = ticks_diff(now, self._pending[0][0])
+        quality = self.assess()
+        if quality == GOOD:
+            pass
+        elif age >= self.max_age_ms or len(self._pending) >= self.max_batch:
+            self.forced += 1
+        elif self._by_stats and ticks_diff(now, self._sent_at) >= self.probe_interval_ms:
+            self.probes += 1  # 訊號沒問題，只是延遲或成功率的統計還停在過去，放行一次更新統計
+        else:
+            return None
+        pending, self._pending = self._pending, []
+        self._sent_at = now
+        self.flushes += 1
+        if len(pending) > 1:
+            self.coalesced += len(pending)
+        self.max_wait_ms = max(self.max_wait_ms, age)
+        return [summary for _, summary in pending]
+
+    def report(self) -> dict:
+        return {
+            "quality": self.quality,
+            "reason": self.reason,
+            "rssi": None if self.rssi is None else round(self.rssi),
+            "pending": self.pending,
+            "flushes": self.flushes,
+            "coalesced": self.coalesced,
+            "forced": self.forced,
+            "probes": self.probes,
+            "dropped": self.dropped,
+            "max_wait_s": self.max_wait_ms // 1000
+        }
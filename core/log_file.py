@@ -0,0 +1,135 @@
+'''
+log 寫檔模組
+lib/esplog 的 Logger 每寫一行 log 就同步寫一次 flash，而 log 是最常寫 flash 的來源。
+這裡把 log 行先放進預先配置的緩衝區，滿了或每回合結束時整批交給 I/O 工作執行緒寫入，
+事件迴圈不等 flash；沒有工作執行緒時在同一時間點同步寫入。
+檔案超過上限時改名為 <檔名>.1（覆寫舊的），再開新檔
+'''
+import _thread
+import os
+
+from core.compat import unix_time
+
+
+class FileLog:
+    '''
+    log 檔寫入器（搭配 FileLogger 代理使用）
+    '''
+    def __init__(self, path: str, max_bytes: int = 1024, buffer_size: int = 512, max_line: int = 160):
+        """log 檔寫入器的初始化
+
+        Args:
+            path (str): log 檔路徑
+            max_bytes (int): 單一檔案大小上限，超過就輪替
+            buffer_size (int): 緩衝區大小（bytes），滿了就送出
+            max_line (int): 每行最多保存的位元組，過長的訊息截斷
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_line = max_line
+        self.worker = None
+        self._buf = bytearray(buffer_size)
+        self._pos = 0
+        # 工作執行緒本身也會寫 log，緩衝區以鎖保護
+        self._lock = _thread.allocate_lock()
+        try:
+            self._size = os.stat(path)[6]
+        except OSError:
+            self._size = 0
+
+        self.lines = 0
+        self.writes = 0
+        self.rotations = 0
+        self.errors = 0
+
+    def wrap(self, logger) -> "FileLogger":
+        '''包裝既有的 logger（其本身不寫檔），寫 log 的同時放一份進緩衝區'''
+        return FileLogger(logger, self)
+
+    def add(self, level: str, message: str):
+        '''放一行 log 進緩衝區，放不下就先送出'''
+        line = f"{unix_time()} {level} {message}".encode()
+        if len(line) > self.max_line:
+            line = line[:self.max_line]
+        n = len(line) + 1
+        with self._lock:
+            if self._pos + n > len(self._buf):
+                self._flush_locked()
+            self._buf[self._pos:self._pos + n - 1] = line
+            self._buf[self._pos + n - 1] = 10  # "\n"
+            self._pos += n
+            self.lines += 1
+
+    def flush(self):
+        '''送出緩衝區（有 worker 時交給工作執行緒，立即返回）'''
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pos:
+            return
+        data = bytes(memoryview(self._buf)[:self._pos])
+        self._pos = 0
+        if self.worker is not None and self.worker.post(self._append, data):
+            return
+        self._append(data)
+
+    def _append(self, data: bytes):
+        '''寫入檔案（通常在 I/O 工作執行緒上執行）'''
+        try:
+            if self._size + len(data) > self.max_bytes and self._size:
+                try:
+                    os.remove(self.path + ".1")
+                except OSError:
+                    pass
+                os.rename(self.path, self.path + ".1")
+                self._size = 0
+                self.rotations += 1
+            with open(self.path, "ab") as f:
+                f.write(data)
+            self._size += len(data)
+            self.writes += 1
+        except OSError:
+            self.errors += 1  # 不能在這裡寫 log，否則會遞迴
+
+    def report(self) -> dict:
+        return {
+            "path": self.path,
+            "size": self._size,
+            "lines": self.lines,
+            "writes": self.writes,
+            "rotations": self.rotations,
+            "errors": self.errors
+        }
+
+
+class FileLogger:
+    '''
+    logger 代理：照常寫 log（終端機），同時把訊息交給 FileLog 寫檔
+    '''
+    def __init__(self, logger, file_log: FileLog):
+        self._logger = logger
+        self._file = file_log
+
+    def debug(self, message: str):
+        self._logger.debug(message)
+        self._file.add("DEBUG", message)
+
+    def info(self, message: str):
+        self._logger.info(message)
+        self._file.add("INFO", message)
+
+    def warning(self, message: str):
+        self._logger.warning(message)
+        self._file.add("WARNING", message)
+
+    def error(self, message: str):
+        self._logger.error(message)
+        self._file.add("ERROR", message)
+
+    def critical(self, message: str):
+        self._logger.critical(message)
+        self._file.add("CRITICAL", message)
+
+    def __getattr__(self, name):
+        return getattr(self._logger, name)
@@ -0,0 +1,251 @@
+'''
+日誌回傳模組
+板子上的 log 檔只有 1 KB 而且只能接序列埠讀，現場出問題時證據早就被覆寫。
+這裡把 log 依優先順序留在記憶體裡（錯誤 > 警告 > 一般訊息，各自有上限、滿了丟最舊），
+上傳摘要時壓縮成一批附在同一個請求裡，網路閒置時也可以單獨送出：
+    - 每批以位元組預算限制（含 "logs" 欄位的外層 JSON），先放錯誤、再放警告、最後放一般訊息，同等級中較新的優先
+    - 取出的紀錄在送達前不刪除：任一目的地確認收到才丟掉，全部失敗就放回佇列等下一批
+    - 內容為每行 "<Unix 秒> <等級字母> <訊息>"，以 zlib 壓縮後 base64 編碼（板子不支援壓縮時原文編碼）
+    - 主機端以 server/logdecode.py 解碼
+'''
+import binascii
+import io
+import json
+try:
+    from typing import Optional
+except ImportError:
+    pass
+
+from core.compat import ticks_ms, ticks_diff, unix_time
+
+try:
+    import deflate  # MicroPython 1.21 以後
+except ImportError:
+    deflate = None
+try:
+    import zlib
+except ImportError:
+    zlib = None
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+# 等級 -> 優先佇列索引（0 最優先）
+_PRIORITY = {"CRITICAL": 0, "ERROR": 0, "WARNING": 1, "INFO": 2, "DEBUG": 2}
+BASE64_RATIO = 4 / 3
+MAX_INFLIGHT = 4  # 送出中最多保留幾批，超過時最舊的一批視為失敗放回佇列（記憶體有上限）
+_FIELD = len(',"logs":')  # 附在摘要後面時多出的位元組（單獨送出時的 {"logs": } 也是同樣長度）
+
+
+def _zlib(raw: bytes) -> Optional[bytes]:
+    '''zlib 格式壓縮；板子的韌體沒有壓縮功能時返回 None'''
+    if deflate is not None:
+        buf = io.BytesIO()
+        try:
+            with deflate.DeflateIO(buf, deflate.ZLIB, 10) as f:  # 1 KB 視窗，壓縮時的記憶體用量小
+                f.write(raw)
+        except Exception:
+            return None
+        return buf.getvalue()
+    if zlib is not None and hasattr(zlib, "compress"):
+        return zlib.compress(raw)
+    return None
+
+
+class LogShipper:
+    '''
+    依優先順序保存最近的 log，並產生符合位元組預算的壓縮批次
+    '''
+    def __init__(self, queue_size: int = 24, min_level: str = "INFO", budget: int = 768, max_line: int = 160):
+        """日誌回傳的初始化
+
+        Args:
+            queue_size (int): 每個優先等級保存的筆數上限
+            min_level (str): 最低保存等級
+            budget (int): 每批的位元組上限（base64 內容加上 "logs" 欄位的外層 JSON）
+            max_line (int): 每行最多保存的位元組，過長的訊息截斷
+        """
+        self.queue_size = queue_size
+        self.min_level = LEVELS.index(min_level)
+        self.budget = budget
+        self.max_line = max_line
+        self._queues = ([], [], [])
+        self._inflight = []  # [(批次, [(優先等級, 原本位置, 紀錄)])]，送達或失敗前保留
+        self._ratio = 3.0  # 壓縮比估計，依實際結果更新
+        self._compress = True
+
+        self.captured = 0
+        self.dropped = [0, 0, 0]
+        self.batches = 0
+        self.shipped = 0
+        self.requeued = 0
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+        self.last_ms: Optional[int] = None
+        self.max_ms = 0
+
+    def wrap(self, logger) -> "ShippingLogger":
+        '''包裝既有的 logger，寫 log 的同時留一份給這裡'''
+        return ShippingLogger(logger, self)
+
+    def add(self, level: str, message: str):
+        '''保存一筆 log（佇列滿了丟最舊的）'''
+        if LEVELS.index(level) < self.min_level:
+            return
+        queue = self._queues[_PRIORITY[level]]
+        if len(queue) >= self.queue_size:
+            queue.pop(0)
+            self.dropped[_PRIORITY[level]] += 1
+        line = f"{unix_time()} {level[0]} {message}".encode()
+        if len(line) > self.max_line:
+            line = line[:self.max_line]
+        queue.append(line)
+        self.captured += 1
+
+    @property
+    def pending(self) -> int:
+        return len(self._queues[0]) + len(self._queues[1]) + len(self._queues[2])
+
+    @property
+    def urgent(self) -> bool:
+        '''是否有尚未送出的錯誤或警告'''
+        return bool(self._queues[0] or self._queues[1])
+
+    def _select(self, limit: int) -> list:
+        '''依優先順序挑出原文合計不超過 limit 的紀錄（同等級由新到舊）'''
+        chosen = []
+        size = 0
+        for p, queue in enumerate(self._queues):
+            for i in range(len(queue) - 1, -1, -1):
+                n = len(queue[i]) + 1
+                if size + n > limit and chosen:
+                    return chosen
+                chosen.append((p, i, queue[i]))
+                size += n
+        return chosen
+
+    def _envelope(self, enc: str, n: int) -> int:
+        '''批次中 base64 內容以外的位元組數（欄位名稱、其他欄位與 "logs" 本身）'''
+        dropped = self.dropped[0] + self.dropped[1] + self.dropped[2]
+        return _FIELD + len(json.dumps({"v": 1, "enc": enc, "data": "", "n": n, "pending": self.pending - n,
+                                        "dropped": dropped}))
+
+    def take(self) -> Optional[dict]:
+        """取出一批 log；紀錄移到送出中，等 settle() 回報結果再決定刪除或放回
+
+        Returns:
+            Optional[dict]: {'v', 'enc', 'data', 'n', 'pending', 'dropped'}，沒有 log 時返回 None
+        """
+        if not self.pending:
+            return None
+        start = ticks_ms()
+        # 依估計的壓縮比挑選原文，壓縮後超過預算就少放一些低優先的紀錄再試
+        room = self.budget - self._envelope("zlib", self.pending)
+        raw_limit = max(1, int(room / BASE64_RATIO * self._ratio))
+        for _ in range(4):
+            chosen = self._select(raw_limit)
+            raw = b"\n".join([line for _, _, line in chosen])
+            enc, data = "raw", raw
+            if self._compress:
+                packed = _zlib(raw)
+                if packed is None:
+                    self._compress = False  # 韌體不支援，之後不再嘗試
+                else:
+                    enc, data = "zlib", packed
+            encoded_len = (len(data) + 2) // 3 * 4
+            room = self.budget - self._envelope(enc, len(chosen))
+            if encoded_len <= room or len(chosen) == 1:
+                break
+            raw_limit = max(1, len(raw) * room // encoded_len * 9 // 10)
+        if enc == "zlib":
+            self._ratio = 0.5 * self._ratio + 0.5 * len(raw) / max(1, len(data))
+
+        # 由後往前移出，前面的索引才不會位移
+        for p, i, _ in sorted(chosen, key=lambda c: (c[0], -c[1])):
+            self._queues[p].pop(i)
+        encoded = binascii.b2a_base64(data).strip().decode()
+
+        elapsed = ticks_diff(ticks_ms(), start)
+        self.last_ms = elapsed
+        self.max_ms = max(self.max_ms, elapsed)
+        self.batches += 1
+        self.raw_bytes += len(raw)
+        self.encoded_bytes += len(encoded)
+        dropped = self.dropped[0] + self.dropped[1] + self.dropped[2]
+        batch = {"v": 1, "enc": enc, "data": encoded, "n": len(chosen), "pending": self.pending, "dropped": dropped}
+        if len(self._inflight) >= MAX_INFLIGHT:
+            self.settle(self._inflight[0][0], False)
+        self._inflight.append((batch, chosen))
+        return batch
+
+    def settle(self, batch: dict, ok: bool):
+        """回報一批 log 的送出結果（由上傳器呼叫）
+
+        Args:
+            batch (dict): take() 返回的批次
+            ok (bool): True 表示至少一個目的地收到，紀錄可以丟掉；False 表示全部失敗，放回佇列
+        """
+        for k, (b, chosen) in enumerate(self._inflight):
+            if b is batch:
+                self._inflight.pop(k)
+                break
+        else:
+            return
+        if ok:
+            self.shipped += len(chosen)
+            return
+        for p, queue in enumerate(self._queues):
+            # 放回的紀錄比佇列中的都舊，依原本的順序放在最前面，超過上限時丟最舊的
+            lines = [line for q, _, line in sorted(chosen, key=lambda c: c[1]) if q == p]
+            if not lines:
+                continue
+            queue[:0] = lines
+            self.requeued += len(lines)
+            while len(queue) > self.queue_size:
+                queue.pop(0)
+                self.dropped[p] += 1
+
+    def report(self) -> dict:
+        return {
+            "pending": self.pending,
+            "captured": self.captured,
+            "dropped": {"error": self.dropped[0], "warning": self.dropped[1], "info": self.dropped[2]},
+            "batches": self.batches,
+            "shipped": self.shipped,
+            "inflight": sum(len(chosen) for _, chosen in self._inflight),
+            "requeued": self.requeued,
+            "ratio": round(self.raw_bytes / self.encoded_bytes, 2) if self.encoded_bytes else None,
+            "avg_bytes": self.encoded_bytes // self.batches if self.batches else None,
+            "last_ms": self.last_ms,
+            "max_ms": self.max_ms
+        }
+
+
+class ShippingLogger:
+    '''
+    logger 代理：照常寫 log，同時把訊息交給 LogShipper
+    '''
+    def __init__(self, logger, shipper: LogShipper):
+        self._logger = logger
+        self._shipper = shipper
+
+    def debug(self, message: str):
+        self._logger.debug(message)
+        self._shipper.add("DEBUG", message)
+
+    def info(self, message: str):
+        self._logger.info(message)
+        self._shipper.add("INFO", message)
+
+    def warning(self, message: str):
+        self._logger.warning(message)
+        self._shipper.add("WARNING", message)
+
+    def error(self, message: str):
+        self._logger.error(message)
+        self._shipper.add("ERROR", message)
+
+    def critical(self, message: str):
+        self._logger.critical(message)
+        self._shipper.add("CRITICAL", message)
+
+    def __getattr__(self, name):
+        return getattr(self._logger, name)
@@ -0,0 +1,218 @@
+'''
+事件迴圈卡頓偵測與硬體看門狗模組
+背景任務每隔固定時間醒來一次，醒來比預期晚多少就是事件迴圈被阻塞的時間（lag）；
+可能阻塞的程式段落先呼叫 monitor.mark("名稱")，卡頓時就知道是誰造成的。
+只有在迴圈健康（沒有卡住、控制迴圈持續回報心跳）時才餵硬體看門狗，真的當機時板子會自動重開
+'''
+import asyncio
+import time
+try:
+    from typing import Optional
+except ImportError:
+    pass
+from lib.esplog.core import Logger
+
+from core.compat import ticks_ms, ticks_diff, ticks_add, IS_MICROPYTHON
+
+
+class LoopMonitor:
+    '''
+    事件迴圈延遲監測器，記錄最嚴重的幾次卡頓與當時執行中的段落
+    '''
+    def __init__(self):
+        self.logger: Optional[Logger] = None
+        self.interval_ms = 100
+        self.stall_ms = 500
+        self.top_n = 5
+        self.heartbeat_timeout_ms = 0
+
+        self.samples = 0
+        self.total_lag_ms = 0
+        self.max_lag_ms = 0
+        self.stalls = 0
+        self.top_stalls = []  # [(lag_ms, 段落, 時間)]，由大到小
+        self.wdt_feeds = 0
+        self.beats = 0  # 每次醒來 +1，主機端看門狗執行緒據此判斷迴圈是否還在跑
+
+        self._wdt = None
+        self._task: Optional[asyncio.Task] = None
+        self._host_watchdog = None
+        self._section = ""
+        self._section_start = ticks_ms()
+        self._worst_ms = 0
+        self._worst_section = ""
+        self._heartbeat = ticks_ms()
+        self._where = None  # 主機端看門狗在卡住當下抓到的程式位置
+
+    def mark(self, section: str = ""):
+        """標記接下來執行的程式段落（不配置記憶體，請傳字串常數）
+
+        Args:
+            section (str): 段落名稱，例如 "dht11"、"ntp"；空字串表示段落結束
+        """
+        now = ticks_ms()
+        if self._section:
+            elapsed = ticks_diff(now, self._section_start)
+            if elapsed > self._worst_ms:
+                self._worst_ms = elapsed
+                self._worst_section = self._section
+        self._section = section
+        self._section_start = now
+
+    def heartbeat(self):
+        '''控制迴圈每完成一回合呼叫一次；太久沒有心跳就停止餵看門狗'''
+        self._heartbeat = ticks_ms()
+
+    def start(self, logger: Logger, interval_ms: int = 100, stall_ms: int = 500, top_n: int = 5,
+              wdt_timeout_ms: int = 0, heartbeat_timeout_ms: int = 0):
+        """啟動監測任務
+
+        Args:
+            logger (Logger): 日誌記錄器
+            interval_ms (int): 量測間隔（毫秒）
+            stall_ms (int): lag 超過此值視為卡頓
+            top_n (int): 保留最嚴重的幾次卡頓
+            wdt_timeout_ms (int): 硬體看門狗逾時（毫秒），0 表示不啟用（啟用後無法關閉）
+            heartbeat_timeout_ms (int): 控制迴圈超過此時間沒有心跳就停止餵狗，0 表示不檢查
+        """
+        if self._task is not None:
+            return
+        self.logger = logger
+        self.interval_ms = interval_ms
+        self.stall_ms = stall_ms
+        self.top_n = top_n
+        self.heartbeat_timeout_ms = heartbeat_timeout_ms
+        self._heartbeat = ticks_ms()
+        if wdt_timeout_ms:
+            from machine import WDT  # type: ignore
+            self._wdt = WDT(timeout=wdt_timeout_ms)
+            logger.info(f"硬體看門狗已啟用，逾時 {wdt_timeout_ms} ms")
+        if not IS_MICROPYTHON:
+            self._host_watchdog = HostWatchdog(self, stall_ms)
+            self._host_watchdog.start()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._host_watchdog is not None:
+            self._host_watchdog.stop()
+            self._host_watchdog = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        '''背景監測任務'''
+        interval = self.interval_ms
+        while True:
+            expected = ticks_add(ticks_ms(), interval)
+            await asyncio.sleep(interval / 1000)
+            now = ticks_ms()
+            lag = ticks_diff(now, expected)
+            if lag < 0:
+                lag = 0
+            self.beats += 1
+            self.samples += 1
+            self.total_lag_ms += lag
+            if lag > self.max_lag_ms:
+                self.max_lag_ms = lag
+            if lag >= self.stall_ms:
+                self._record_stall(lag, now)
+            self._worst_ms = 0
+            self._worst_section = ""
+            self._where = None
+            self._feed(lag, now)
+
+    def _record_stall(self, lag: int, now: int):
+        '''記錄一次卡頓（只在卡頓時配置記憶體）'''
+        section = self._worst_section
+        if self._section and ticks_diff(now, self._section_start) > self._worst_ms:
+            section = self._section
+        if self._where:
+            section = f"{section or '?'} @ {self._where}"
+        section = section or "unknown"
+        self.stalls += 1
+        top = self.top_stalls
+        if len(top) < self.top_n or lag > top[-1][0]:
+            top.append((lag, section, time.time()))
+            top.sort(key=lambda s: s[0], reverse=True)
+            del top[self.top_n:]
+        self.logger.warning(f"事件迴圈卡住 {lag} ms（{section}）")
+
+    def _feed(self, lag: int, now: int):
+        '''迴圈健康時才餵看門狗'''
+        if self._wdt is None or lag >= self.stall_ms:
+            return
+        if self.heartbeat_timeout_ms and ticks_diff(now, self._heartbeat) > self.heartbeat_timeout_ms:
+            return
+        self._wdt.feed()
+        self.wdt_feeds += 1
+
+    def report(self) -> dict:
+        '''整理成字典'''
+        return {
+            "avg_lag_ms": self.total_lag_ms / self.samples if self.samples else None,
+            "max_lag_ms": self.max_lag_ms,
+            "stalls": self.stalls,
+            "top_stalls": [{"lag_ms": lag, "section": section, "time": t} for lag, section, t in self.top_stalls],
+            "wdt_enabled": self._wdt is not None,
+            "wdt_feeds": self.wdt_feeds
+        }
+
+    def summary(self) -> str:
+        '''單行文字摘要，方便寫進 log'''
+        worst = self.top_stalls[0] if self.top_stalls else None
+        text = f"迴圈延遲最大 {self.max_lag_ms} ms，卡頓 {self.stalls} 次"
+        if worst:
+            text += f"，最嚴重 {worst[0]} ms（{worst[1]}）"
+        return text
+
+
+class HostWatchdog:
+    '''
+    主機端的看門狗執行緒（模擬與開發用）
+    事件迴圈卡住時監測任務根本不會執行，這個執行緒從外面觀察，並在卡住的當下抓出迴圈執行緒的程式位置
+    '''
+    def __init__(self, monitor: LoopMonitor, stall_ms: int):
+        import threading
+        self.monitor = monitor
+        self.stall_s = stall_ms / 1000
+        self.loop_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        import os
+        import sys
+        beats = self.monitor.beats
+        since = time.monotonic()
+        while not self._stop.wait(self.stall_s / 4):
+            now = time.monotonic()
+            if self.monitor.beats != beats:
+                beats = self.monitor.beats
+                since = now
+                continue
+            if now - since >= self.stall_s and self.monitor._where is None:
+                frame = sys._current_frames().get(self.loop_thread)
+                where = []
+                while frame is not None and len(where) < 3:
+                    code = frame.f_code
+                    where.append(f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}")
+                    frame = frame.f_back
+                if where:
+                    self.monitor._where = " < ".join(where)
+                    # 真的當機時迴圈不會再醒來，只能由這裡留下紀錄
+                    self.monitor.logger.warning(f"事件迴圈已卡住 {now - since:.1f} s：{self.monitor._where}")
+
+
+# 全域單例：任何模組都可以直接 mark()，不必把監測器一路傳進去
+monitor = LoopMonitor()
@@ -0,0 +1,110 @@
+'''
+啟動與執行期指標模組
+記錄開機到各個里程碑（匯入完成、第一次讀值...）的時間與堆積用量
+'''
+from core.compat import ticks_ms, ticks_diff, mem_alloc, mem_free, IS_MICROPYTHON
+
+class StartupMetrics:
+    '''
+    開機里程碑記錄器，每個里程碑只記錄第一次
+    板子上 ticks_ms 從重開機起算，因此時間就是「開機到里程碑」；
+    主機端則從本模組被匯入時起算
+    '''
+    def __init__(self):
+        self.t0 = 0 if IS_MICROPYTHON else ticks_ms()
+        self.marks = {}
+        self.peak_heap = mem_alloc()
+        self.reported = False
+
+    def mark(self, name: str):
+        """記錄一個里程碑
+
+        Args:
+            name (str): 里程碑名稱，例如 "imports_done"、"first_reading"
+        """
+        if name in self.marks:
+            return
+        heap = mem_alloc()
+        if heap is not None and (self.peak_heap is None or heap > self.peak_heap):
+            self.peak_heap = heap
+        self.marks[name] = (ticks_diff(ticks_ms(), self.t0), heap)
+
+    def report(self) -> dict:
+        """整理成可上傳或記錄的字典
+
+        Returns:
+            dict: {'<里程碑>_ms': 毫秒, ..., 'peak_heap': 最大已配置堆積（位元組）}
+        """
+        result = {}
+        for name, (elapsed, _) in self.marks.items():
+            result[name + "_ms"] = elapsed
+        result["peak_heap"] = self.peak_heap
+        return result
+
+    def summary(self) -> str:
+        '''單行文字摘要，方便寫進 log'''
+        parts = [f"{name}={elapsed}ms" for name, (elapsed, _) in self.marks.items()]
+        parts.append(f"peak_heap={self.peak_heap}")
+        return ", ".join(parts)
+
+
+class RuntimeMetrics:
+    '''
+    執行期指標：每回合配置量與 GC 暫停時間
+    配置量以回合開始/結束時的 gc.mem_alloc() 差值估算（期間若發生自動 GC 則不計）
+    '''
+    def __init__(self):
+        self.cycles = 0
+        self.last_cycle_alloc = None
+        self.max_cycle_alloc = None
+        self.last_gc_pause_ms = None
+        self.max_gc_pause_ms = 0
+        self.gc_skipped = 0  # 水泵補水中而延後的手動 GC 次數
+        self._alloc_start = None
+
+    def begin_cycle(self):
+        '''回合開始時呼叫'''
+        self._alloc_start = mem_alloc()
+
+    def end_cycle(self):
+        '''回合結束（GC 之前）時呼叫'''
+        self.cycles += 1
+        now = mem_alloc()
+        if now is None or self._alloc_start is None or now < self._alloc_start:
+            return
+        delta = now - self._alloc_start
+        self.last_cycle_alloc = delta
+        if self.max_cycle_alloc is None or delta > self.max_cycle_alloc:
+            self.max_cycle_alloc = delta
+
+    def record_gc(self, pause_ms: int):
+        """記錄一次手動 GC 的暫停時間
+
+        Args:
+            pause_ms (int): gc.collect() 花費的毫秒數
+        """
+        self.last_gc_pause_ms = pause_ms
+        if pause_ms > self.max_gc_pause_ms:
+            self.max_gc_pause_ms = pause_ms
+
+    def report(self) -> dict:
+        '''整理成字典'''
+        return {
+            "cycles": self.cycles,
+            "last_cycle_alloc": self.last_cycle_alloc,
+            "max_cycle_alloc": self.max_cycle_alloc,
+            "last_gc_pause_ms": self.last_gc_pause_ms,
+            "max_gc_pause_ms": self.max_gc_pause_ms,
+            "gc_skipped": self.gc_skipped,
+            "mem_free": mem_free()
+        }
+
+    def summary(self) -> str:
+        '''單行文字摘要，方便寫進 log'''
+        return (f"每回合配置 {self.last_cycle_alloc} bytes（最大 {self.max_cycle_alloc}），"
+                f"GC 暫停 {self.last_gc_pause_ms} ms（最大 {self.max_gc_pause_ms}），可用記憶體 {mem_free()}")
+
+
+# 全域單例：main.py 最先匯入，讓起算點盡量貼近開機
+startup = StartupMetrics()
+runtime = RuntimeMetrics()
@@ -0,0 +1,160 @@
+'''
+水泵閉迴路控制模組
+水泵運轉時以高頻率輪詢水位，越過遲滯帶即停止，並具備最長運轉與最短停機保護
+'''
+import asyncio
+try:
+    from typing import Optional
+except ImportError:
+    pass
+from lib.esplog.core import Logger
+
+from core.compat import ticks_ms, ticks_diff, ticks_add
+
+class PumpController:
+    '''
+    水泵控制任務：由控制迴圈呼叫 request() 提出補水需求，
+    實際開關水泵、監看水位與保護機制都在 run() 背景任務中完成
+    '''
+    def __init__(self, relay, level_sensor, logger: Logger,
+                 level_on: int = 1000, hysteresis: int = 200,
+                 poll_ms: int = 100, max_runtime: float = 30.0,
+                 min_off_time: float = 60.0, settle_ms: int = 1000):
+        """水泵控制器的初始化
+
+        Args:
+            relay (Relay): 控制水泵的繼電器
+            level_sensor (WaterLevelSensor): 水位感測器
+            logger (Logger): 日誌記錄器
+            level_on (int): 水位原始值低於此值時需要補水
+            hysteresis (int): 遲滯帶寬度，水位達 level_on + hysteresis 才停止
+            poll_ms (int): 水泵運轉時的水位輪詢間隔（毫秒）
+            max_runtime (float): 單次最長運轉時間（秒）
+            min_off_time (float): 兩次運轉之間的最短停機時間（秒）
+            settle_ms (int): 停止後觀察過衝的時間（毫秒）
+        """
+        self.relay = relay
+        self.level_sensor = level_sensor
+        self.logger = logger
+        self.level_on = level_on
+        self.level_off = level_on + hysteresis
+        self.poll_ms = poll_ms
+        self.max_runtime_ms = int(max_runtime * 1000)
+        self.min_off_ms = int(min_off_time * 1000)
+        self.settle_ms = settle_ms
+
+        self._event = asyncio.Event()
+        self._requested_at: Optional[int] = None
+        self._last_off: Optional[int] = None
+        self.is_running = False
+
+        # 調校用統計
+        self.runs = 0
+        self.total_runtime_ms = 0
+        self.last_runtime_ms: Optional[int] = None
+        self.last_latency_ms: Optional[int] = None
+        self.last_overshoot: Optional[int] = None
+        self.last_stop_reason: Optional[str] = None
+
+    def report(self) -> dict:
+        '''整理調校用統計'''
+        return {
+            "running": self.is_running,
+            "runs": self.runs,
+            "total_runtime_ms": self.total_runtime_ms,
+            "last_runtime_ms": self.last_runtime_ms,
+            "last_latency_ms": self.last_latency_ms,
+            "last_overshoot": self.last_overshoot,
+            "last_stop_reason": self.last_stop_reason
+        }
+
+    @property
+    def busy(self) -> bool:
+        '''運轉中，或已有補水需求等待處理（很快就會啟動）'''
+        return self.is_running or self._requested_at is not None or self._event.is_set()
+
+    def request(self):
+        '''提出補水需求（不阻塞，重複呼叫只算一次）'''
+        if self._requested_at is None:
+            self._requested_at = ticks_ms()
+        self._event.set()
+
+    async def run(self):
+        '''水泵控制背景任務'''
+        try:
+            while True:
+                await self._event.wait()
+                self._event.clear()
+                await self._serve_request()
+        except asyncio.CancelledError:
+            self.logger.info("水泵控制任務已取消")
+        finally:
+            self.relay.off()
+            self.is_running = False
+
+    async def _serve_request(self):
+        '''處理一次補水需求'''
+        # 最短停機保護
+        if self._last_off is not None:
+            wait_ms = self.min_off_ms - ticks_diff(ticks_ms(), self._last_off)
+            if wait_ms > 0:
+                self.logger.info(f"水泵停機保護中，{wait_ms} ms 後才會再次啟動")
+                await asyncio.sleep(wait_ms / 1000)
+
+        level = self.level_sensor.read_raw()
+        if level < 0:
+            self.logger.error("水位讀取失敗，取消本次補水")
+            self._requested_at = None
+            return
+        if level >= self.level_on:
+            self.logger.debug(f"水位已回升 ({level})，取消本次補水")
+            self._requested_at = None
+            return
+
+        self.relay.on()
+        self.is_running = True
+        started = ticks_ms()
+        latency = ticks_diff(started, self._requested_at) if self._requested_at is not None else 0
+        self._requested_at = None
+        self.logger.info(f"水泵啟動，水位 {level}，目標 {self.level_off}")
+
+        reason = "max_runtime"
+        try:
+            while ticks_diff(ticks_ms(), started) < self.max_runtime_ms:
+                await asyncio.sleep(self.poll_ms / 1000)
+                level = self.level_sensor.read_raw()
+                if level < 0:
+                    reason = "sensor_error"
+                    break
+                if level >= self.level_off:
+                    reason = "level"
+                    break
+        finally:
+            self.relay.off()
+            self.is_running = False
+            stopped = ticks_ms()
+            self._last_off = stopped
+        runtime = ticks_diff(stopped, started)
+
+        # 停止後持續觀察一段時間，記錄水位最高點以估算過衝
+        peak = level
+        settle_end = ticks_add(stopped, self.settle_ms)
+        while ticks_diff(settle_end, ticks_ms()) > 0:
+            await asyncio.sleep(self.poll_ms / 1000)
+            sample = self.level_sensor.read_raw()
+            if sample > peak:
+                peak = sample
+        overshoot = peak - self.level_off if reason == "level" else None
+
+        self.runs += 1
+        self.total_runtime_ms += runtime
+        self.last_runtime_ms = runtime
+        self.last_latency_ms = latency
+        self.last_overshoot = overshoot
+        self.last_stop_reason = reason
+
+        msg = f"水泵停止（{reason}）: 運轉 {runtime} ms, 反應延遲 {latency} ms, 過衝 {overshoot}"
+        if reason == "level":
+            self.logger.info(msg)
+        else:
+            self.logger.warning(msg + "，請檢查水源或水位感測器")
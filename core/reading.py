@@ -0,0 +1,34 @@
+'''
+感測器讀值紀錄模組
+整個程式只建立一筆 Reading 重複填寫，避免每回合配置新的 dict
+'''
+
+class Reading:
+    '''
+    單回合感測器讀值（可重複使用的固定欄位紀錄）
+    '''
+    __slots__ = ("temperature", "humidity", "turbidity_percent",
+                 "tds_value", "water_level_raw", "water_level_low")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        '''清空所有欄位（None 表示讀取失敗或未接感測器）'''
+        self.temperature = None
+        self.humidity = None
+        self.turbidity_percent = None
+        self.tds_value = None
+        self.water_level_raw = None
+        self.water_level_low = None
+
+    def as_dict(self) -> dict:
+        '''轉成 dict（僅供除錯或上傳時使用，熱路徑請直接讀欄位）'''
+        return {
+            "temperature": self.temperature,
+            "humidity": self.humidity,
+            "turbidity_percent": self.turbidity_percent,
+            "tds_value": self.tds_value,
+            "water_level_raw": self.water_level_raw,
+            "water_level_low": self.water_level_low
+        }
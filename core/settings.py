@@ -0,0 +1,96 @@
+'''
+設定值模組
+控制器以 settings.X 讀取設定：使用者的 config.py 有設就用它，沒有就用這裡的預設值，
+舊的 config.py 少了後來新增的設定也能開機。每次讀取都查 config 模組，
+模擬工具覆寫設定後不必重新匯入控制器就會生效。
+只有接線、閾值、連線憑證這些原本就必填的設定沒有預設值
+'''
+import sys
+
+DEFAULTS = {
+    "PUMP_HYSTERESIS": 200,
+    "PUMP_POLL_INTERVAL_MS": 100,
+    "PUMP_MAX_RUNTIME": 30,
+    "PUMP_MIN_OFF_TIME": 60,
+    "FAULT_STUCK_SAMPLES": 30,
+    "FAULT_EWMA_ALPHA": 0.05,
+    "FAULT_Z_MAX": 6.0,
+    "FAULT_WARMUP": 20,
+    "FAULT_REBASELINE": 5,
+    "TRACE_ENABLED": False,
+    "TRACE_FILE": "trace.bin",
+    "TRACE_MAX_BYTES": 512 * 1024,
+    "HISTORY_ENABLED": True,
+    "HISTORY_DIR": "history",
+    "HISTORY_CAPACITY": {"cycle": 720, "1m": 4320, "1h": 1440, "1d": 730},
+    "VERBOSE_SENSOR_LOG": False,
+    "UPLOAD_DEFER_LIMIT": 10,
+    "STATUS_SERVER_ENABLED": True,
+    "STATUS_SERVER_PORT": 80,
+    "STATUS_SERVER_MAX_CLIENTS": 2,
+    "IO_WORKER_ENABLED": True,
+    "IO_WORKER_QUEUE": 8,
+    "LOG_FILE": "farm_controller.txt",
+    "LOG_FILE_MAX_BYTES": 1024,
+    "LOOP_MONITOR_INTERVAL_MS": 100,
+    "LOOP_STALL_MS": 500,
+    "WDT_TIMEOUT_MS": 0,
+    "LOOP_HEARTBEAT_TIMEOUT": 120,
+    "UPLOAD_SCHEDULER_ENABLED": True,
+    "UPLOAD_RSSI_MIN": -75,
+    "UPLOAD_LATENCY_MAX": 3000,
+    "UPLOAD_SUCCESS_MIN": 0.7,
+    "UPLOAD_MAX_AGE": 600,
+    "UPLOAD_BATCH_MAX": 10,
+    "UPLOAD_PROBE_INTERVAL": 120,
+    "LOG_SHIP_ENABLED": True,
+    "LOG_SHIP_LEVEL": "INFO",
+    "LOG_SHIP_QUEUE": 24,
+    "LOG_SHIP_BUDGET": 768,
+    "LOG_SHIP_IDLE_INTERVAL": 60,
+    "GATEWAY_MODE": "off",
+    "NODE_ID": 1,
+    "GATEWAY_HOST": "192.168.1.10",
+    "GATEWAY_PORT": 5684,
+    "GATEWAY_BATCH_SIZE": 20,
+    "GATEWAY_BATCH_INTERVAL": 30,
+    "GATEWAY_ACK_TIMEOUT": 1.0,
+    "GATEWAY_RETRY_INTERVAL": 300,
+}
+
+
+def _config():
+    module = sys.modules.get("config")
+    if module is None:
+        import config as module
+    return module
+
+
+def _destinations(config) -> list:
+    '''舊的 config.py 沒有 WEBHOOK_DESTINATIONS 時，沿用原本的兩個 Webhook 網址'''
+    return [
+        {"name": "server", "url": getattr(config, "WEBHOOK_URL", None), "timeout": 5, "queue": 20, "retries": 5,
+         "backoff": 2, "backoff_max": 60},
+        {"name": "make", "url": getattr(config, "MAKE_WEBHOOK_URL", None), "timeout": 10, "queue": 10, "retries": 3,
+         "backoff": 5, "backoff_max": 120},
+    ]
+
+
+class Settings:
+    '''
+    以屬性讀取設定：config.X，沒有設定時用 DEFAULTS["X"]
+    '''
+    def __getattr__(self, name: str):
+        config = _config()
+        try:
+            return getattr(config, name)
+        except AttributeError:
+            pass
+        if name in DEFAULTS:
+            return DEFAULTS[name]
+        if name == "WEBHOOK_DESTINATIONS":
+            return _destinations(config)
+        raise AttributeError(f"config.py 缺少必填設定 {name}")
+
+
+settings = Settings()
@@ -0,0 +1,282 @@
+'''
+板上 HTTP 狀態端點模組
+在區網內提供最新讀值、警示狀態、進行中的上傳視窗彙總與執行期指標
+讀值、警示與視窗彙總只在控制迴圈完成新的一回合後才重新產生，多個客戶端輪詢幾乎不花成本；
+執行期指標（水泵、上傳、端點計數）每次請求都重新整理
+'''
+import asyncio
+import json
+try:
+    from typing import Optional
+except ImportError:
+    pass
+from lib.esplog.core import Logger
+
+from core.metrics import startup, runtime
+from core.loop_monitor import monitor
+
+_STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    414: "URI Too Long",
+    500: "Internal Server Error",
+    503: "Service Unavailable"
+}
+
+
+class StatusServer:
+    '''
+    輕量 asyncio HTTP 伺服器（只支援 GET），路由：
+        /status   讀值、警示與視窗彙總（指標另見 /metrics，避免回應超過長度上限）
+        /reading  最新一回合讀值
+        /alerts   目前警示狀態
+        /window   進行中上傳視窗的彙總（previous 為上一個已凍結的視窗）
+        /metrics  啟動與執行期指標
+        /history  板上歷史紀錄（?level=cycle|1m|1h|1d&start=&end=&limit=，時間為 Unix 秒）
+    '''
+    ROUTES = ("/status", "/reading", "/alerts", "/window", "/metrics")
+    HISTORY_LIMIT = 500  # /history 單次最多回傳筆數
+
+    def __init__(self, controller, logger: Logger, host: str = "0.0.0.0", port: int = 80,
+                 max_clients: int = 2, max_request_bytes: int = 512,
+                 max_response_bytes: int = 4096, timeout: float = 3.0):
+        """狀態端點的初始化
+
+        Args:
+            controller (FarmController): 資料來源
+            logger (Logger): 日誌記錄器
+            host (str): 綁定位址
+            port (int): 連接埠
+            max_clients (int): 同時處理的連線上限，超過直接回 503
+            max_request_bytes (int): 請求行與標頭總長上限
+            max_response_bytes (int): 回應本文長度上限
+            timeout (float): 讀取請求的逾時（秒）
+        """
+        self.controller = controller
+        self.logger = logger
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        self.max_request_bytes = max_request_bytes
+        self.max_response_bytes = max_response_bytes
+        self.timeout = timeout
+
+        self._server = None
+        self._active = 0
+        self._cache = {}  # path -> (state_version, JSON bytes)
+
+        self.requests = 0
+        self.cache_hits = 0
+        self.rejected = 0
+
+    async def start(self):
+        '''啟動伺服器'''
+        if self._server is not None:
+            return
+        try:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            self.logger.info(f"狀態端點已啟動，port {self.port}")
+        except Exception as e:
+            self.logger.error(f"狀態端點啟動失敗: {e}")
+
+    async def stop(self):
+        '''關閉伺服器'''
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+        self.logger.info("狀態端點已關閉")
+
+    def _snapshot(self, path: str) -> dict:
+        '''依路由整理每回合才會變的內容（/reading、/alerts、/window）'''
+        c = self.controller
+        if path == "/reading":
+            return c.reading.as_dict()
+        if path == "/alerts":
+            return c.alerts
+        window = c.history.summarize()
+        window["samples"] = c.history.count
+        # 上一個已凍結的視窗：直接彙總雙緩衝中凍結的那一份，不複製也不影響寫入
+        previous = c.history.summarize_frozen()
+        previous["samples"] = c.history.frozen.count
+        window["previous"] = previous
+        return window
+
+    def _metrics(self) -> dict:
+        '''啟動與執行期指標（水泵狀態、上傳與端點計數隨時在變，每次請求都重新整理）'''
+        c = self.controller
+        gateway = c.gateway if c.gateway is not None else c.gateway_client
+        return {
+            "startup": startup.report(),
+            "runtime": runtime.report(),
+            "pump": c.pump.report() if c.pump is not None else None,
+            "health": c.fault_detector.report(),
+            "uploads": c.uploader.report(),
+            "link": c.link_scheduler.report() if c.link_scheduler is not None else None,
+            "gateway": gateway.report() if gateway is not None else None,
+            "loop": monitor.report(),
+            "io_worker": c.io_worker.report() if c.io_worker is not None else None,
+            "history": c.history_store.report() if c.history_store is not None else None,
+            "logs": c.log_shipper.report() if c.log_shipper is not None else None,
+            "log_file": c.file_log.report() if c.file_log is not None else None,
+            "status_server": {
+                "requests": self.requests,
+                "cache_hits": self.cache_hits,
+                "rejected": self.rejected
+            }
+        }
+
+    def _cached_body(self, path: str) -> bytes:
+        '''每回合才會變的路由的 JSON，資料沒變就直接回傳快取'''
+        version = self.controller.state_version
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == version:
+            self.cache_hits += 1
+            return cached[1]
+        body = json.dumps(self._snapshot(path)).encode()
+        self._cache[path] = (version, body)
+        return body
+
+    def _response(self, path: str) -> bytes:
+        '''取得路由的完整 HTTP 回應；/metrics 每次重新產生'''
+        if path == "/metrics":
+            body = json.dumps(self._metrics()).encode()
+        elif path == "/status":
+            body = b"".join((
+                b'{"version": ', str(self.controller.state_version).encode(),
+                b', "reading": ', self._cached_body("/reading"),
+                b', "alerts": ', self._cached_body("/alerts"),
+                b', "window": ', self._cached_body("/window"), b"}"
+            ))
+        else:
+            body = self._cached_body(path)
+        if len(body) > self.max_response_bytes:
+            return self._plain(500, "response too large")
+        return self._header(200, "application/json", len(body)) + body
+
+    def _header(self, status: int, content_type: str, length: Optional[int]) -> bytes:
+        length_line = "" if length is None else f"Content-Length: {length}\r\n"
+        return (f"HTTP/1.0 {status} {_STATUS_TEXT[status]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"{length_line}"
+                "Connection: close\r\n\r\n").encode()
+
+    def _plain(self, status: int, text: str) -> bytes:
+        body = text.encode()
+        return self._header(status, "text/plain", len(body)) + body
+
+    async def _history(self, writer, query: str):
+        """依查詢參數邊讀邊寫出 JSON 陣列：每讀一筆就寫出一筆，不先把整個範圍讀進記憶體（也不經快取）
+
+        Args:
+            writer: 連線的 StreamWriter
+            query (str): 查詢字串，例如 "level=1m&start=1717000000&limit=100"
+        """
+        store = self.controller.history_store
+        if store is None:
+            writer.write(self._plain(404, "history disabled"))
+            return
+        params = {}
+        for pair in query.split("&"):
+            if "=" in pair:
+                key, value = pair.split("=", 1)
+                params[key] = value
+        try:
+            start = int(params["start"]) if "start" in params else None
+            end = int(params["end"]) if "end" in params else None
+            limit = min(int(params.get("limit", 100)), self.HISTORY_LIMIT)
+            rows = store.iter_rows(params.get("level", "cycle"), start, end, limit)
+        except ValueError as e:
+            writer.write(self._plain(400, str(e)))
+            return
+        writer.write(self._header(200, "application/json", None))
+        writer.write(b"[")
+        for i, row in enumerate(rows):
+            if i:
+                writer.write(b",")
+            writer.write(json.dumps(row).encode())
+            if i % 32 == 31:
+                await writer.drain()  # 分段送出，緩衝區不會隨筆數變大
+        writer.write(b"]")
+
+    async def _read_request(self, reader) -> Optional[str]:
+        """讀取請求行並略過標頭
+
+        Returns:
+            Optional[str]: 請求目標（路徑與查詢字串）；方法不支援時返回 ""；過長時返回 None
+        """
+        line = await reader.readline()
+        total = len(line)
+        if total > self.max_request_bytes:
+            return None
+        # 讀掉標頭，總長超過上限就放棄
+        while True:
+            header = await reader.readline()
+            total += len(header)
+            if total > self.max_request_bytes:
+                return None
+            if not header or header == b"\r\n":
+                break
+        parts = line.decode().split()
+        if len(parts) < 2 or parts[0] != "GET":
+            return ""
+        return parts[1]
+
+    async def _handle(self, reader, writer):
+        '''處理單一連線'''
+        if self._active >= self.max_clients:
+            self.rejected += 1
+            try:
+                # 先讀掉請求（限時），避免未讀資料讓對方收到連線重置而不是 503
+                try:
+                    await asyncio.wait_for(reader.read(self.max_request_bytes), 0.2)
+                except asyncio.TimeoutError:
+                    pass
+                writer.write(self._plain(503, "busy"))
+                await writer.drain()
+            finally:
+                writer.close()
+                await writer.wait_closed()
+            return
+
+        self._active += 1
+        self.requests += 1
+        try:
+            try:
+                target = await asyncio.wait_for(self._read_request(reader), self.timeout)
+            except asyncio.TimeoutError:
+                writer.write(self._plain(408, "timeout"))
+                await writer.drain()
+                return
+            path, query = target, ""
+            if target and "?" in target:
+                path, query = target.split("?", 1)
+            if path == "/history":
+                await self._history(writer, query)
+                await writer.drain()
+                return
+            if path is None:
+                response = self._plain(414, "request too large")
+            elif path == "":
+                response = self._plain(405, "GET only")
+            elif path == "/":
+                response = self._response("/status")
+            elif path in self.ROUTES:
+                response = self._response(path)
+            else:
+                response = self._plain(404, "not found")
+            writer.write(response)
+            await writer.drain()
+        except Exception as e:
+            self.logger.error(f"狀態端點處理請求時發生錯誤: {e}")
+        finally:
+            self._active -= 1
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
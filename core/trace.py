@@ -0,0 +1,318 @@
+'''
+感測/執行紀錄（trace）模組
+把每一次原始感測讀值、執行器指令、每回合警示判斷與上傳摘要連同 ticks 寫成精簡的二進位檔，
+之後可在主機上用 sim/replay.py 以比實際時間快很多的速度重播
+
+檔案格式（little endian）：
+    檔頭 12 bytes：b"FTRC"、版本 u8、epoch 年代 u8（0=1970、1=2000）、保留 u16、開始時間 u32（秒）
+    紀錄 10 bytes：種類 u8、通道 u8、ticks u32（距開始的毫秒）、數值 f32（讀取失敗為 NaN）
+'''
+import asyncio
+import struct
+import time
+try:
+    from typing import Optional
+except ImportError:
+    pass
+
+from core.compat import ticks_ms, ticks_diff, IS_MICROPYTHON
+from core.io_worker import IOWorkerFull, IOWorkerStopped
+
+MAGIC = b"FTRC"
+VERSION = 1
+HEADER = "<4sBBHI"
+RECORD = "<BBIf"
+HEADER_SIZE = struct.calcsize(HEADER)
+RECORD_SIZE = struct.calcsize(RECORD)
+
+# 紀錄種類
+SENSOR = 1
+ACTUATOR = 2
+CYCLE = 3      # 每回合結束，數值為警示位元遮罩
+SUMMARY = 4    # 上傳摘要，通道為 SUMMARY_FIELDS 的索引
+
+# 感測通道
+CH_DHT_MEASURE = 0  # 1.0 成功、NaN 失敗
+CH_TEMP = 1
+CH_HUMI = 2
+CH_TURBIDITY_ADC = 3
+CH_TDS_ADC = 4
+CH_WATER_ADC = 5
+
+# 執行器通道
+CH_RELAY = 0   # 腳位電位
+CH_BUZZER = 1  # PWM duty
+CH_RGB = 2     # (r << 16) | (g << 8) | b
+
+ALERT_KEYS = ("temp_high", "humid_low", "turbidity_high", "tds_high", "water_low")
+SUMMARY_FIELDS = ("avg_temperature", "avg_humidity", "avg_turbidity_percent",
+                  "avg_tds_value", "avg_water_level_raw", "water_level_low")
+
+_NAN = float("nan")
+
+
+def _noop():
+    pass
+
+
+def alert_mask(alerts: dict) -> int:
+    '''把警示 dict 轉成位元遮罩（ALERT_KEYS 順序）'''
+    mask = 0
+    for i, key in enumerate(ALERT_KEYS):
+        if alerts.get(key):
+            mask |= 1 << i
+    return mask
+
+
+class TraceRecorder:
+    '''
+    紀錄寫入器：先寫進預先配置的緩衝區，滿了才一次寫入檔案，避免頻繁的小量 flash 寫入。
+    設定 worker（IOWorker）時寫入 flash 交給 I/O 工作執行緒，幾塊緩衝區輪流使用，
+    工作執行緒忙著其他 I/O（例如 NTP）時還能繼續記錄；事件迴圈從不等待寫入完成，
+    需要確定寫完時（例如關閉前）await drain()
+    '''
+    def __init__(self, stream, max_bytes: int = 0, buffer_size: int = 512, buffers: int = 1):
+        """紀錄寫入器的初始化
+
+        Args:
+            stream: 可寫入的二進位串流（檔案或 io.BytesIO）
+            max_bytes (int): 檔案大小上限，超過就停止記錄，0 表示不限制
+            buffer_size (int): 每塊緩衝區大小（bytes）
+            buffers (int): 緩衝區數量，搭配 worker 時建議 4
+        """
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.worker = None
+        size = buffer_size - buffer_size % RECORD_SIZE
+        self._buffers = [bytearray(size) for _ in range(max(1, buffers))]
+        self._active = 0
+        self._buf = self._buffers[0]
+        # 送出與寫完的緩衝區數分別只由事件迴圈與工作執行緒累加，相減就是還在寫的數量
+        self._queued = 0
+        self._done = 0
+        self._pos = 0
+        self.written = HEADER_SIZE
+        self.records = 0
+        self.dropped = 0  # 工作執行緒跟不上而丟棄的紀錄
+        self.full = False
+        self.t0 = ticks_ms()
+        epoch = 1 if time.gmtime(0)[0] == 2000 else 0
+        stream.write(struct.pack(HEADER, MAGIC, VERSION, epoch, 0, int(time.time())))
+
+    @classmethod
+    def open(cls, path: str, max_bytes: int = 0, buffers: int = 1) -> "TraceRecorder":
+        '''建立新的紀錄檔（覆寫舊檔）'''
+        return cls(open(path, "wb"), max_bytes=max_bytes, buffers=buffers)
+
+    def record(self, kind: int, channel: int, value: float):
+        '''寫入一筆紀錄（不配置記憶體）'''
+        if self.full:
+            return
+        if self.max_bytes and self.written + RECORD_SIZE > self.max_bytes:
+            self.full = True
+            self.flush()
+            return
+        struct.pack_into(RECORD, self._buf, self._pos, kind, channel,
+                         ticks_diff(ticks_ms(), self.t0) & 0xFFFFFFFF, value)
+        self._pos += RECORD_SIZE
+        self.written += RECORD_SIZE
+        self.records += 1
+        if self._pos >= len(self._buf):
+            self.flush()
+
+    def cycle(self, alerts: dict):
+        '''記錄一回合結束與警示判斷'''
+        self.record(CYCLE, 0, alert_mask(alerts))
+
+    def summary(self, summary: dict):
+        '''記錄一次上傳摘要'''
+        for i, key in enumerate(SUMMARY_FIELDS):
+            value = summary.get(key)
+            self.record(SUMMARY, i, _NAN if value is None else float(value))
+
+    def flush(self):
+        '''把緩衝區寫入檔案（有 worker 時交給工作執行緒，立即返回，不在事件迴圈上等待）'''
+        if self.worker is not None:
+            if not self._pos:
+                return
+            if self._queued - self._done < len(self._buffers) - 1:
+                posted = self.worker.post(self._write, self._buf, self._pos)
+                if posted:
+                    self._active = (self._active + 1) % len(self._buffers)
+                    self._buf = self._buffers[self._active]
+            else:
+                # 其他緩衝區都還在寫（例如水泵運轉時密集記錄），複製一份交出去而不是等待
+                posted = self.worker.post(self._write, bytes(memoryview(self._buf)[:self._pos]), self._pos)
+            if posted:
+                self._queued += 1
+                self._pos = 0
+                return
+            if self._queued != self._done:
+                # 佇列滿了而先前的還沒寫完，此時同步寫入會打亂順序，只能丟棄並計數
+                self.dropped += self._pos // RECORD_SIZE
+                self._pos = 0
+                return
+        if self._pos:
+            self.stream.write(memoryview(self._buf)[:self._pos])
+            self._pos = 0
+        if hasattr(self.stream, "flush"):
+            self.stream.flush()
+
+    def _write(self, buf, n: int):
+        '''在 I/O 工作執行緒上執行'''
+        try:
+            self.stream.write(memoryview(buf)[:n])
+            if hasattr(self.stream, "flush"):
+                self.stream.flush()
+        finally:
+            self._done += 1
+
+    async def drain(self):
+        '''等工作執行緒寫完已送出的緩衝區（await 工作執行緒的完成通知，不佔住事件迴圈）'''
+        while self.worker is not None and self._queued != self._done:
+            try:
+                # 佇列先進先出，這件工作完成時前面的寫入都已完成
+                await self.worker.call(_noop)
+            except IOWorkerStopped:
+                return  # 停止時排隊中的寫入已在 IOWorker.stop() 補做
+            except IOWorkerFull:
+                if not self.worker.running:
+                    return
+                await asyncio.sleep(0.01)
+
+    async def close(self):
+        '''寫出剩下的紀錄並關閉檔案'''
+        self.flush()
+        await self.drain()
+        self.worker = None
+        self.flush()
+        self.stream.close()
+
+    def attach(self, controller):
+        """把控制器的感測器與執行器換成會記錄的代理物件
+
+        Args:
+            controller (FarmController): 要記錄的控制器
+        """
+        if controller.dht11 is not None:
+            controller.dht11.sensor = _RecordingDHT(controller.dht11.sensor, self)
+        if controller.turbidity_sensor is not None:
+            controller.turbidity_sensor._adc = _RecordingADC(controller.turbidity_sensor._adc, self, CH_TURBIDITY_ADC)
+        if controller.tds_sensor is not None:
+            controller.tds_sensor._adc = _RecordingADC(controller.tds_sensor._adc, self, CH_TDS_ADC)
+        if controller.water_level_sensor is not None:
+            controller.water_level_sensor._adc = _RecordingADC(controller.water_level_sensor._adc, self, CH_WATER_ADC)
+        controller.relay_pump.pin = _RecordingPin(controller.relay_pump.pin, self, CH_RELAY)
+        controller.buzzer.pwm = _RecordingPWM(controller.buzzer.pwm, self, CH_BUZZER)
+        led = controller.rgb_led
+        set_rgb = led.set_rgb
+
+        def recording_set_rgb(r: int, g: int, b: int):
+            self.record(ACTUATOR, CH_RGB, (r << 16) | (g << 8) | b)
+            set_rgb(r, g, b)
+        led.set_rgb = recording_set_rgb
+
+
+class _RecordingADC:
+    '''記錄每次 read() 的 ADC 代理'''
+    def __init__(self, adc, recorder: TraceRecorder, channel: int):
+        self._adc = adc
+        self._recorder = recorder
+        self._channel = channel
+
+    def read(self):
+        try:
+            value = self._adc.read()
+        except Exception:
+            self._recorder.record(SENSOR, self._channel, _NAN)
+            raise
+        self._recorder.record(SENSOR, self._channel, value)
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self._adc, name)
+
+
+class _RecordingDHT:
+    '''記錄 measure / temperature / humidity 的 DHT 代理'''
+    def __init__(self, sensor, recorder: TraceRecorder):
+        self._sensor = sensor
+        self._recorder = recorder
+
+    def measure(self):
+        try:
+            self._sensor.measure()
+        except Exception:
+            self._recorder.record(SENSOR, CH_DHT_MEASURE, _NAN)
+            raise
+        self._recorder.record(SENSOR, CH_DHT_MEASURE, 1.0)
+
+    def temperature(self):
+        value = self._sensor.temperature()
+        self._recorder.record(SENSOR, CH_TEMP, value)
+        return value
+
+    def humidity(self):
+        value = self._sensor.humidity()
+        self._recorder.record(SENSOR, CH_HUMI, value)
+        return value
+
+
+class _RecordingPin:
+    '''記錄寫入電位的 Pin 代理'''
+    def __init__(self, pin, recorder: TraceRecorder, channel: int):
+        self._pin = pin
+        self._recorder = recorder
+        self._channel = channel
+
+    def value(self, v: Optional[int] = None):
+        if v is None:
+            return self._pin.value()
+        self._recorder.record(ACTUATOR, self._channel, v)
+        self._pin.value(v)
+
+    def __getattr__(self, name):
+        return getattr(self._pin, name)
+
+
+class _RecordingPWM:
+    '''記錄 duty 設定的 PWM 代理'''
+    def __init__(self, pwm, recorder: TraceRecorder, channel: int):
+        self._pwm = pwm
+        self._recorder = recorder
+        self._channel = channel
+
+    def duty(self, d: Optional[int] = None):
+        if d is None:
+            return self._pwm.duty()
+        self._recorder.record(ACTUATOR, self._channel, d)
+        self._pwm.duty(d)
+
+    def __getattr__(self, name):
+        return getattr(self._pwm, name)
+
+
+def read_header(stream) -> tuple:
+    """讀取並檢查檔頭
+
+    Returns:
+        tuple: (版本, epoch 年代（1970 或 2000）, 開始時間秒數)
+    """
+    data = stream.read(HEADER_SIZE)
+    if len(data) != HEADER_SIZE:
+        raise ValueError("紀錄檔太短")
+    magic, version, epoch, _, start = struct.unpack(HEADER, data)
+    if magic != MAGIC:
+        raise ValueError("不是 trace 紀錄檔")
+    if version != VERSION:
+        raise ValueError(f"不支援的紀錄檔版本: {version}")
+    return version, 2000 if epoch else 1970, start
+
+
+def iter_records(stream):
+    '''逐筆讀取紀錄：產生 (種類, 通道, ticks, 數值)，檔尾不完整的紀錄會被忽略'''
+    while True:
+        data = stream.read(RECORD_SIZE)
+        if len(data) < RECORD_SIZE:
+            return
+        yield struct.unpack(RECORD, data)
@@ -0,0 +1,335 @@
+'''
+多目的地上傳模組
+每個 Webhook 目的地各自有佇列、逾時、重試策略與健康狀態，並在自己的背景任務中送出，
+某個目的地變慢或失敗不會拖累其他目的地，也不會卡住控制迴圈
+'''
+import asyncio
+import json
+try:
+    from typing import Optional, List
+except ImportError:
+    pass
+from lib.esplog.core import Logger
+
+from core import http_client
+from core.compat import ticks_ms, ticks_diff
+from core.metrics import startup
+
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+DOWN = "down"
+
+
+def _attach(body: bytes, packed_logs: bytes) -> bytes:
+    '''把已編碼的 log 批次接在已編碼的 JSON 後面，摘要不必再編碼一次'''
+    return body[:-1] + b',"logs":' + packed_logs + b"}"
+
+
+class _Receipt:
+    '''
+    一批 log 送往多個目的地的結果：任一目的地送達就回報成功，全部目的地都放棄才回報失敗
+    '''
+    def __init__(self, batch: dict, callback, count: int):
+        self.batch = batch
+        self.callback = callback
+        self.remaining = count
+
+    def done(self, ok: bool):
+        if self.callback is None:
+            return
+        self.remaining -= 1
+        if ok or self.remaining <= 0:
+            callback, self.callback = self.callback, None
+            callback(self.batch, ok)
+
+
+class WebhookDestination:
+    '''
+    單一上傳目的地
+    '''
+    def __init__(self, name: str, url: str, logger: Logger, timeout: float = 10.0,
+                 queue_size: int = 10, retries: int = 3, backoff: float = 2.0,
+                 backoff_max: float = 60.0, down_after: int = 3, io_worker=None, logs: bool = False,
+                 batch: bool = False):
+        """上傳目的地的初始化
+
+        Args:
+            name (str): 顯示名稱
+            url (str): Webhook 網址
+            logger (Logger): 日誌記錄器
+            timeout (float): 單次請求逾時（秒）
+            queue_size (int): 佇列上限，滿了丟棄最舊的一筆
+            retries (int): 同一筆資料最多重試次數，超過就丟棄
+            backoff (float): 第一次重試前的等待（秒），之後每次加倍
+            backoff_max (float): 重試等待上限（秒）
+            down_after (int): 連續失敗幾次視為離線
+            io_worker (IOWorker): 負責 DNS 查詢的 I/O 工作執行緒
+            logs (bool): 是否接收板子回傳的 log
+            batch (bool): 是否接收合併的摘要 {"timestamp", "readings"}；否則合併的摘要拆開，一份一個請求
+        """
+        self.name = name
+        self.url = url
+        self.logger = logger
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.down_after = down_after
+        self.io_worker = io_worker
+        self.logs = logs
+        self.batch = batch
+
+        self._queue = []
+        self._event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.state = HEALTHY
+        self.consecutive_failures = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_latency_ms: Optional[int] = None
+        self.avg_latency_ms: Optional[float] = None
+        self.success_rate = 1.0  # 最近請求的成功率（指數加權）
+        self.airtime_ms = 0  # 全部請求（含失敗）花掉的時間
+        self.last_error: Optional[str] = None
+
+    @property
+    def backlog(self) -> int:
+        '''佇列中等待送出的筆數'''
+        return len(self._queue)
+
+    def submit(self, body: bytes, receipt: Optional[_Receipt] = None):
+        """加入佇列（不阻塞）
+
+        Args:
+            body (bytes): 請求內容
+            receipt (Optional[_Receipt]): 內容含 log 時，送達或放棄後回報結果
+        """
+        if len(self._queue) >= self.queue_size:
+            _, dropped = self._queue.pop(0)
+            self.dropped += 1
+            self.logger.warning(f"[{self.name}] 上傳佇列已滿，丟棄最舊的一筆")
+            if dropped is not None:
+                dropped.done(False)
+        self._queue.append((body, receipt))
+        self._event.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        '''背景送出任務'''
+        attempts = 0
+        while True:
+            if not self._queue:
+                self._event.clear()
+                await self._event.wait()
+                continue
+            item = self._queue[0]
+            body, receipt = item
+            if await self._send(body):
+                attempts = 0
+                if self._queue and self._queue[0] is item:
+                    self._queue.pop(0)
+                if receipt is not None:
+                    receipt.done(True)
+                continue
+            attempts += 1
+            delay = min(self.backoff * (2 ** (attempts - 1)), self.backoff_max)
+            if attempts > self.retries:
+                if self._queue and self._queue[0] is item:
+                    self._queue.pop(0)
+                    self.dropped += 1
+                    if receipt is not None:
+                        receipt.done(False)
+                self.logger.error(f"[{self.name}] 重試 {self.retries} 次仍失敗，放棄這筆資料")
+                attempts = 0
+            await asyncio.sleep(delay)  # 失敗後退避，離線的目的地不會一直佔用網路
+
+    async def _send(self, body: bytes) -> bool:
+        '''送出一筆並更新健康狀態'''
+        start = ticks_ms()
+        try:
+            status = await http_client.post(self.url, body, timeout=self.timeout, worker=self.io_worker)
+            ok = 200 <= status < 300
+            error = None if ok else f"HTTP {status}"
+        except asyncio.TimeoutError:
+            ok, error = False, "timeout"
+        except Exception as e:
+            ok, error = False, str(e)
+        latency = ticks_diff(ticks_ms(), start)
+        self.airtime_ms += latency
+        self.success_rate = 0.7 * self.success_rate + (0.3 if ok else 0.0)
+
+        if ok:
+            self.sent += 1
+            self.last_latency_ms = latency
+            self.avg_latency_ms = latency if self.avg_latency_ms is None else 0.8 * self.avg_latency_ms + 0.2 * latency
+            self.consecutive_failures = 0
+            if self.state != HEALTHY:
+                self.logger.info(f"[{self.name}] 上傳恢復正常")
+            self.state = HEALTHY
+            startup.mark("first_upload")
+            self.logger.info(f"[{self.name}] 數據上傳成功（{latency} ms）")
+            return True
+
+        self.failed += 1
+        self.last_error = error
+        self.consecutive_failures += 1
+        state = DOWN if self.consecutive_failures >= self.down_after else DEGRADED
+        if state != self.state:
+            self.logger.warning(f"[{self.name}] 狀態變為 {state}")
+        self.state = state
+        self.logger.warning(f"[{self.name}] 數據上傳失敗: {error}")
+        return False
+
+    def report(self) -> dict:
+        '''目的地指標'''
+        return {
+            "state": self.state,
+            "backlog": self.backlog,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "last_latency_ms": self.last_latency_ms,
+            "avg_latency_ms": self.avg_latency_ms,
+            "success_rate": round(self.success_rate, 2),
+            "airtime_ms": self.airtime_ms,
+            "last_error": self.last_error
+        }
+
+
+class FanoutUploader:
+    '''
+    把每筆摘要同時送往多個目的地；資料只編碼一次，各目的地共用同一份 bytes
+    '''
+    def __init__(self, destinations: List[dict], logger: Logger, io_worker=None):
+        """多目的地上傳器的初始化
+
+        Args:
+            destinations (List[dict]): 目的地設定，例如
+                {'name': 'ingest', 'url': '...', 'timeout': 5, 'queue': 20, 'retries': 5, 'logs': True, 'batch': True}
+            logger (Logger): 日誌記錄器
+            io_worker (IOWorker): 負責 DNS 查詢的 I/O 工作執行緒，None 則在事件迴圈上查詢
+        """
+        self.logger = logger
+        self.destinations = []
+        for cfg in destinations:
+            if not cfg.get("url"):
+                continue
+            self.destinations.append(WebhookDestination(
+                name=cfg.get("name", cfg["url"]),
+                url=cfg["url"],
+                logger=logger,
+                timeout=cfg.get("timeout", 10.0),
+                queue_size=cfg.get("queue", 10),
+                retries=cfg.get("retries", 3),
+                backoff=cfg.get("backoff", 2.0),
+                backoff_max=cfg.get("backoff_max", 60.0),
+                io_worker=io_worker,
+                logs=cfg.get("logs", False),
+                batch=cfg.get("batch", False)
+            ))
+
+    def start(self):
+        '''啟動各目的地的背景任務'''
+        for dest in self.destinations:
+            dest.start()
+
+    async def stop(self):
+        for dest in self.destinations:
+            await dest.stop()
+
+    def submit(self, data: dict, logs: Optional[dict] = None, on_logs=None):
+        """送出一筆摘要（立即返回）
+
+        Args:
+            data (dict): 上傳摘要
+            logs (Optional[dict]): LogShipper.take() 的批次，只附加給接收 log 的目的地
+            on_logs: 回報 log 送出結果的函式 on_logs(logs, ok)，例如 LogShipper.settle
+        """
+        body = json.dumps(data).encode()
+        with_logs, receipt = body, None
+        if logs is not None:
+            with_logs = _attach(body, json.dumps(logs).encode())
+            receipt = self._receipt(logs, on_logs)
+        for dest in self.destinations:
+            if dest.logs:
+                dest.submit(with_logs, receipt)
+            else:
+                dest.submit(body)
+
+    def submit_batch(self, data: dict, logs: Optional[dict] = None, on_logs=None):
+        """送出合併的摘要 {"timestamp", "readings": [...]}（立即返回）
+
+        只有設了 batch 的目的地收到合併格式；其他目的地（例如只認得單份摘要格式的 Make Webhook）
+        每份摘要各送一個請求，log 附在最後一個請求上。參數同 submit
+        """
+        merged = merged_logs = None
+        flat = []
+        flat_logs = None
+        if any(dest.batch for dest in self.destinations):
+            merged = merged_logs = json.dumps(data).encode()
+        if not all(dest.batch for dest in self.destinations):
+            flat = [json.dumps(summary).encode() for summary in data["readings"]]
+            flat_logs = flat[-1]
+        receipt = None
+        if logs is not None:
+            packed = json.dumps(logs).encode()
+            merged_logs = merged and _attach(merged, packed)
+            flat_logs = flat and _attach(flat[-1], packed)
+            receipt = self._receipt(logs, on_logs)
+        for dest in self.destinations:
+            if dest.batch:
+                if dest.logs:
+                    dest.submit(merged_logs, receipt)
+                else:
+                    dest.submit(merged)
+                continue
+            for body in flat[:-1]:
+                dest.submit(body)
+            if dest.logs:
+                dest.submit(flat_logs, receipt)
+            else:
+                dest.submit(flat[-1])
+
+    def _receipt(self, logs: dict, on_logs) -> Optional[_Receipt]:
+        if on_logs is None:
+            return None
+        count = sum(1 for dest in self.destinations if dest.logs)
+        if not count:
+            on_logs(logs, False)
+            return None
+        return _Receipt(logs, on_logs, count)
+
+    @property
+    def accepts_logs(self) -> bool:
+        return any(dest.logs for dest in self.destinations)
+
+    def idle(self) -> bool:
+        '''接收 log 的目的地是否都正常且佇列已清空（可以利用空檔送 log）'''
+        dests = [dest for dest in self.destinations if dest.logs]
+        return bool(dests) and all(dest.state == HEALTHY and dest.backlog == 0 for dest in dests)
+
+    def submit_logs(self, logs: dict, on_logs=None):
+        '''單獨送出一批 log（只送往接收 log 的目的地；on_logs 同 submit）'''
+        body = json.dumps({"logs": logs}).encode()
+        receipt = self._receipt(logs, on_logs)
+        for dest in self.destinations:
+            if dest.logs:
+                dest.submit(body, receipt)
+
+    def report(self) -> dict:
+        return {dest.name: dest.report() for dest in self.destinations}
@@ -4,21 +4,29 @@ WiFi 管理模組，負責連接與管理 WiFi 連線。
 import network  # type: ignore
 import ntptime  # type: ignore
 import time
-from typing import Optional
+try:
+    from typing import Optional
+except ImportError:
+    pass
 from lib.esplog.core import Logger
 import asyncio
 
+from core.loop_monitor import monitor
+from core.metrics import startup
+
 class WiFiManager:
-    def __init__(self, ssid: str, password: str, logger: Optional[Logger] = None):
+    def __init__(self, ssid: str, password: str, logger: Optional[Logger] = None, io_worker=None):
         """WiFiManager 的初始化
 
         Args:
             ssid (str): WiFi SSID
             password (str): WiFi 密碼
             logger (Optional[Logger]): 日誌記錄器，預設為 None
+            io_worker (IOWorker): 執行 NTP 校時的 I/O 工作執行緒，None 則在事件迴圈上同步校時
         """
         self.ssid = ssid
         self.password = password
+        self.io_worker = io_worker
         if logger:
             self.logger = logger
         else:
@@ -36,8 +44,24 @@ class WiFiManager:
     
     def correct_ntp_time(self):
         """校正系統時間（需要已連接到網路）"""
+        monitor.mark("ntp")  # settime() 是同步的，網路慢時會卡住整個事件迴圈
         try:
             ntptime.settime()
+            startup.mark("time_synced")
+            self.logger.info("NTP 時間校正成功")
+        except Exception as e:
+            self.logger.error(f"NTP 時間校正失敗: {e}")
+        finally:
+            monitor.mark()
+    
+    async def sync_time(self):
+        """校正系統時間，有 I/O 工作執行緒時在執行緒上進行，不卡住事件迴圈"""
+        if self.io_worker is None:
+            self.correct_ntp_time()
+            return
+        try:
+            await self.io_worker.call(ntptime.settime)
+            startup.mark("time_synced")
             self.logger.info("NTP 時間校正成功")
         except Exception as e:
             self.logger.error(f"NTP 時間校正失敗: {e}")
@@ -73,8 +97,9 @@ class WiFiManager:
                 return False
             await asyncio.sleep(1)
         
+        startup.mark("wifi_connected")
         self.logger.info(f"WiFi 連接成功，IP 地址: {self.wlan.ifconfig()[0]}")
-        self.correct_ntp_time()
+        await self.sync_time()
         return True
 
     async def keep_connected(self, check_interval: int = 10, timeout: int = 10):
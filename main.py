@@ -1,16 +1,20 @@
-from core.wifi_manager import WiFiManager
+from core.metrics import startup  # 最先匯入，起算開機里程碑
 from core.controller import FarmController
 from lib.esplog.core import Logger
-from config import *
+from config import (
+    DHT11_PIN, TURBIDITY_PIN, TDS_PIN, WATER_LEVEL_PIN,
+    RGB_R_PIN, RGB_G_PIN, RGB_B_PIN, BUZZER_PIN, RELAY_PUMP_PIN
+)
+from core.settings import settings
 import asyncio
 
+startup.mark("imports_done")
+
 def main():
     logger = Logger(
         level="DEBUG",
         log_to_console=True,
-        log_to_file=True,
-        file_name="farm_controller.txt",
-        max_file_size=1024,
+        log_to_file=False,  # 寫檔交給 FarmController 的 FileLog（經由 I/O 工作執行緒）
         use_colors=True,
         log_format="text"
     )
@@ -27,7 +31,7 @@ def main():
         'relay_pump': RELAY_PUMP_PIN
     }
     
-    controller = FarmController(pins=pins, logger=logger)
+    controller = FarmController(pins=pins, logger=logger, log_file=settings.LOG_FILE)
 
     async def run_controller():
         await controller.run()
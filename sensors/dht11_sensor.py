@@ -3,7 +3,10 @@ DHT11 感測器模組
 '''
 from machine import Pin # type: ignore
 import dht # type: ignore
-from typing import Dict, Optional
+try:
+    from typing import Dict, Optional
+except ImportError:
+    pass
 
 class DHT11Sensor:
     '''
@@ -31,6 +34,26 @@ class DHT11Sensor:
         except Exception as e:
             print("DHT11 讀取失敗:", e)
             return {'temp': None, 'humi': None, 'ok': False}
+
+    def read_into(self, record) -> bool:
+        """ 讀取溫濕度並直接寫入既有紀錄（不配置新的 dict）
+
+        Args:
+            record (Reading): 要填寫 temperature / humidity 欄位的紀錄
+
+        Returns:
+            bool: 讀取成功返回 True，否則返回 False（欄位填 None）
+        """
+        try:
+            self.sensor.measure()
+            record.temperature = self.sensor.temperature()
+            record.humidity = self.sensor.humidity()
+            return True
+        except Exception as e:
+            print("DHT11 讀取失敗:", e)
+            record.temperature = None
+            record.humidity = None
+            return False
     
     def __del__(self):
         '''釋放資源'''
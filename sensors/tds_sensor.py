@@ -1,7 +1,10 @@
 '''
 TDS 感測器模組
 '''
-from typing import Optional
+try:
+    from typing import Optional
+except ImportError:
+    pass
 from machine import ADC, Pin # type: ignore
 
 class TDSSensor:
@@ -37,10 +40,12 @@ class TDSSensor:
         """ 讀取估算的TDS值並返還
 
         Returns:
-            float: 估算的TDS值 (ppm)
+            float: 估算的TDS值 (ppm)，讀取失敗返回 None
         """
         try:
             v = self.read_voltage()
+            if v < 0:  # read_voltage 失敗時回傳 -1，避免算出負的 ppm
+                return None
             compensation = 1.0 + 0.02 * (temp_c - 25.0)  # 假設溫度為25度C
             v_compensated = v / compensation
             tds = (133.42 * v_compensated**3 - 255.86 * v_compensated**2 + 857.39 * v_compensated) * 0.5
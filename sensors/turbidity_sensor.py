@@ -2,7 +2,10 @@
 濁度感測器模組
 '''
 from machine import ADC, Pin # type: ignore
-from typing import Optional
+try:
+    from typing import Optional
+except ImportError:
+    pass
 
 class TurbiditySensor:
     '''
@@ -36,10 +39,12 @@ class TurbiditySensor:
         """ 讀取濁度百分比並返還
 
         Returns:
-            float: 濁度百分比 (0.0-100.0)
+            float: 濁度百分比 (0.0-100.0)，讀取失敗返回 None
         """
         try:
             raw_value = self.read_raw()
+            if raw_value < 0:  # read_raw 失敗時回傳 -1，不能當成讀值換算
+                return None
             clarity = (raw_value / 4095) * 100.0
             turbidity = 100.0 - clarity
             return turbidity
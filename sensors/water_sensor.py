@@ -5,7 +5,10 @@
 所以用作為短期的水漏偵測
 '''
 from machine import Pin, ADC # type: ignore
-from typing import Optional
+try:
+    from typing import Optional
+except ImportError:
+    pass
 
 class WaterLevelSensor:
     '''
@@ -37,14 +40,21 @@ class WaterLevelSensor:
             print("水感測器原始值讀取失敗:", e)
             return -1
     
-    def is_low(self) -> Optional[bool]:
+    def is_low(self, raw: Optional[int] = None) -> Optional[bool]:
         """ 判斷是否有水接觸
 
+        Args:
+            raw (Optional[int]): 已讀到的原始值，提供時不再重新讀取 ADC
+
         Returns:
-            bool: 有水接觸返回True，否則返回False
+            bool: 有水接觸返回True，否則返回False；讀取失敗返回 None
         """
         try:
-            return self.read_raw() < self._threshold
+            if raw is None:
+                raw = self.read_raw()
+            if raw < 0:  # read_raw 失敗時回傳 -1，不能判定為水位過低
+                return None
+            return raw < self._threshold
         except Exception as e:
             print("水感測器濕度判斷失敗:", e)
             return None
@@ -0,0 +1,84 @@
+'''
+從板子的歷史紀錄補回主機資料庫（在主機上執行，需要 numpy）
+
+板子離線期間上傳失敗的摘要仍保存在板上的環形歷史檔裡，連線恢復後從狀態端點 /history
+分頁讀出資料庫最後一筆之後的紀錄，寫入 TimeSeriesStore：
+
+    python -m server.backfill http://192.168.1.50 --device farm-1 --root data
+    python -m server.backfill http://192.168.1.50 --device farm-1 --root data --level 1h --since 2024-06-01
+'''
+import argparse
+import calendar
+import json
+import time
+import urllib.request
+from typing import List, Optional
+
+from server.tsstore import TimeSeriesStore
+
+PAGE = 500  # 與 StatusServer.HISTORY_LIMIT 相同
+
+
+def fetch(base_url: str, level: str, start: Optional[int], limit: int = PAGE, timeout: float = 10.0) -> List[dict]:
+    """讀取一頁歷史紀錄
+
+    Args:
+        base_url (str): 板子的網址，例如 "http://192.168.1.50"
+        level (str): cycle / 1m / 1h / 1d
+        start (Optional[int]): 起始 epoch 秒（含），None 表示最舊的一筆
+        limit (int): 每頁筆數
+        timeout (float): 請求逾時（秒）
+
+    Returns:
+        List[dict]: 依時間遞增的紀錄
+    """
+    url = f"{base_url.rstrip('/')}/history?level={level}&limit={limit}&start={start or 0}"
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def backfill(store: TimeSeriesStore, device: str, base_url: str, level: str = "1m",
+             since: Optional[int] = None) -> int:
+    """把板上比資料庫最後一筆更新的紀錄寫入資料庫
+
+    Args:
+        store (TimeSeriesStore): 目標資料庫
+        device (str): 設備名稱
+        base_url (str): 板子的網址
+        level (str): 要補的層級，預設 1m（與每分鐘上傳一次的摘要解析度相近）
+        since (Optional[int]): 只補這個時間之後的資料，None 表示接在資料庫最後一筆之後
+
+    Returns:
+        int: 寫入筆數
+    """
+    last = store.last_timestamp(device)
+    start = since if last is None else max(last + 1, since or 0)
+    total = 0
+    while True:
+        rows = fetch(base_url, level, start)
+        if not rows:
+            break
+        total += store.append(device, rows)
+        if len(rows) < PAGE:
+            break
+        start = rows[-1]["ts"] + 1
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="從板子的 /history 補回主機資料庫")
+    parser.add_argument("url", help="板子的網址，例如 http://192.168.1.50")
+    parser.add_argument("--device", required=True, help="資料庫中的設備名稱")
+    parser.add_argument("--root", default="data", help="TimeSeriesStore 資料目錄")
+    parser.add_argument("--level", default="1m", choices=("cycle", "1m", "1h", "1d"), help="要補的層級")
+    parser.add_argument("--since", help="只補這天之後的資料（YYYY-mm-dd，UTC）")
+    args = parser.parse_args()
+
+    since = calendar.timegm(time.strptime(args.since, "%Y-%m-%d")) if args.since else None
+    store = TimeSeriesStore(args.root)
+    count = backfill(store, args.device, args.url, level=args.level, since=since)
+    print(f"{args.device} 補回 {count} 筆（{args.level}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+'''
+即時推播伺服器的基準測試（在主機上執行）
+
+在子程序啟動 server/stream.py，本程序開數千個本機 SSE 連線（各自訂閱一個設備，少數訂閱全部），
+再以固定速率 POST 摘要（故意不讀的慢客戶端訂閱全部設備），量測：
+    - 推播延遲：POST 送出到每個客戶端收到（只計算正常讀取的客戶端）
+    - 每個訂閱者的記憶體：伺服器 RSS 在客戶端連上前後的差值
+    - 故意不讀的慢客戶端是否只丟自己的訊息，正常客戶端是否一則不漏、不會收到別的設備
+
+    python -m server.bench_stream
+    python -m server.bench_stream --clients 5000 --messages 500 --rate 100 --slow 0.05
+'''
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import socket
+import time
+from typing import Dict, List
+
+
+def _serve(port: int, queue_size: int, ready):
+    from server.stream import Broker, StreamServer
+
+    async def run():
+        server = StreamServer(Broker(queue_size=queue_size), host="127.0.0.1", port=port)
+        await server.start()
+        ready.set()
+        await asyncio.Event().wait()
+    asyncio.run(run())
+
+
+def _rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _request(port: int, method: str, path: str, body: bytes = b"") -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return data.split(b"\r\n\r\n", 1)[1]
+
+
+class Client:
+    '''一個 SSE 訂閱者：記下收到的讀值與延遲（慢客戶端連上後就不再讀）'''
+
+    def __init__(self, devices: List[str], slow: bool):
+        self.devices = devices
+        self.slow = slow
+        self.readings = 0
+        self.foreign = 0
+        self.dropped = 0
+        self.latencies: List[int] = []
+        self.connected = asyncio.Event()
+
+    async def run(self, port: int):
+        sock = socket.socket()
+        if self.slow:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)  # 讓伺服器很快就感受到背壓
+        sock.setblocking(False)
+        loop = asyncio.get_running_loop()
+        await loop.sock_connect(sock, ("127.0.0.1", port))
+        request = f"GET /stream?device={','.join(self.devices)} HTTP/1.1\r\nHost: bench\r\n\r\n".encode()
+        if self.slow:
+            # 直接用 socket，不交給 StreamReader（它會在背景持續把資料讀進自己的緩衝）
+            await loop.sock_sendall(sock, request)
+            self.connected.set()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                sock.close()
+        reader, writer = await asyncio.open_connection(sock=sock, limit=1 << 20)
+        writer.write(request)
+        await writer.drain()
+        await reader.readuntil(b"\r\n\r\n")
+        self.connected.set()
+        wanted = [f'"device":"{d}"'.encode() for d in self.devices] if self.devices else None
+        while True:
+            message = await reader.readuntil(b"\n\n")
+            now = time.time_ns()
+            if b"event: reading" in message:
+                self.readings += 1
+                if wanted is not None and not any(w in message for w in wanted):
+                    self.foreign += 1
+                i = message.find(b'"sent_ns":') + 10
+                self.latencies.append(now - int(message[i:message.find(b"}", i)].split(b",")[0]))
+            elif b"event: dropped" in message:
+                self.dropped += json.loads(message.split(b"data: ", 1)[1])["count"]
+
+
+async def _bench(args) -> dict:
+    port = _free_port()
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Event()
+    proc = ctx.Process(target=_serve, args=(port, args.queue, ready), daemon=True)
+    proc.start()
+    ready.wait(30)
+    try:
+        rng = random.Random(args.seed)
+        devices = [f"farm-{i}" for i in range(args.devices)]
+        clients = []
+        for i in range(args.clients):
+            slow = rng.random() < args.slow
+            subscribed = [] if slow or rng.random() < args.all else [rng.choice(devices)]  # 慢客戶端訂閱全部，最快塞滿
+            clients.append(Client(subscribed, slow=slow))
+        await asyncio.sleep(0.5)
+        rss_before = _rss_kb(proc.pid)
+        tasks = []
+        for i in range(0, len(clients), 200):  # 分批連線，避免超過 listen backlog
+            batch = clients[i:i + 200]
+            tasks += [asyncio.create_task(c.run(port)) for c in batch]
+            await asyncio.wait_for(asyncio.gather(*(c.connected.wait() for c in batch)), 30)
+        await asyncio.sleep(0.5)
+        rss_after = _rss_kb(proc.pid)
+
+        published: Dict[str, int] = {d: 0 for d in devices}
+        start = time.perf_counter()
+        for n in range(args.messages):
+            device = rng.choice(devices)
+            published[device] += 1
+            summary = {"avg_temperature": 25.0 + rng.random(), "avg_humidity": 60.0, "avg_turbidity_percent": 10.0,
+                       "avg_tds_value": 300.0, "avg_water_level_raw": 2000.0, "water_level_low": False,
+                       "timestamp": "2025-01-01 00:00:00", "sent_ns": time.time_ns()}
+            await _request(port, "POST", f"/data/webhook?device={device}", json.dumps(summary).encode())
+            delay = start + (n + 1) / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elapsed = time.perf_counter() - start
+        fast = [c for c in clients if not c.slow]
+
+        def expected(c: Client) -> int:
+            return sum(published.values()) if not c.devices else sum(published[d] for d in c.devices)
+        deadline = time.perf_counter() + 30
+        while time.perf_counter() < deadline and any(c.readings < expected(c) for c in fast):
+            await asyncio.sleep(0.1)
+        rss_end = _rss_kb(proc.pid)
+        metrics = json.loads(await _request(port, "GET", "/metrics"))
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        proc.terminate()
+        proc.join()
+
+    latencies = sorted(x for c in fast for x in c.latencies)
+
+    def pct(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] / 1e6 if latencies else 0.0
+    return {
+        "elapsed": elapsed,
+        "rss_before": rss_before, "rss_after": rss_after, "rss_end": rss_end,
+        "fast": len(fast), "slow": len(clients) - len(fast),
+        "missing": sum(max(0, expected(c) - c.readings) for c in fast),
+        "foreign": sum(c.foreign for c in clients),
+        "fast_dropped": sum(c.dropped for c in fast),
+        "p50": pct(0.5), "p99": pct(0.99), "max": latencies[-1] / 1e6 if latencies else 0.0,
+        "deliveries": len(latencies),
+        "metrics": metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量測推播伺服器的延遲、每個訂閱者的記憶體與慢客戶端處理")
+    parser.add_argument("--clients", type=int, default=2000, help="SSE 連線數")
+    parser.add_argument("--devices", type=int, default=20, help="設備數（每個客戶端訂閱其中一個）")
+    parser.add_argument("--all", type=float, default=0.1, help="訂閱全部設備的客戶端比例")
+    parser.add_argument("--slow", type=float, default=0.05, help="連上後就不讀的客戶端比例")
+    parser.add_argument("--messages", type=int, default=1000, help="POST 幾筆摘要")
+    parser.add_argument("--rate", type=float, default=100, help="每秒 POST 幾筆")
+    parser.add_argument("--queue", type=int, default=64, help="每個訂閱者的佇列長度")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    r = asyncio.run(_bench(args))
+    m = r["metrics"]
+    per_sub = (r["rss_after"] - r["rss_before"]) * 1024 / max(1, args.clients)
+    print(f"{args.clients} 個訂閱者（正常 {r['fast']}、不讀 {r['slow']}），{args.devices} 個設備，"
+          f"{args.messages} 筆摘要於 {r['elapsed']:.1f} 秒內送出")
+    print(f"伺服器 RSS：連線前 {r['rss_before'] / 1024:.1f} MB、連線後 {r['rss_after'] / 1024:.1f} MB"
+          f"（每個訂閱者約 {per_sub / 1024:.1f} KB）、推播後 {r['rss_end'] / 1024:.1f} MB")
+    print(f"推播延遲（POST 送出到客戶端收到，{r['deliveries']} 次送達）：p50 {r['p50']:.1f} ms、"
+          f"p99 {r['p99']:.1f} ms、最多 {r['max']:.1f} ms")
+    print(f"伺服器端每則分發平均 {m['avg_publish_us']} µs、最多 {m['max_publish_us']} µs；"
+          f"編碼 {m['published']} 則、送進佇列 {m['deliveries']} 次")
+    print(f"正常客戶端漏收 {r['missing']} 則、收到丟棄通知 {r['fast_dropped']} 則；"
+          f"收到未訂閱設備的訊息 {r['foreign']} 則；慢客戶端丟棄 {m['dropped']} 則")
+
+
+if __name__ == "__main__":
+    main()
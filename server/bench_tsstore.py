@@ -0,0 +1,97 @@
+'''
+時間序列儲存的基準測試（在主機上執行，需要 numpy）
+
+產生合成資料寫入 TimeSeriesStore，量測寫入速度與各種範圍查詢的延遲：
+    python -m server.bench_tsstore --rows 100000000 --dir /tmp/tsbench
+預設 1 億筆、每秒一筆，約需 4 GB 磁碟空間；先用 --rows 1000000 試跑也可以
+'''
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from server.tsstore import TimeSeriesStore
+
+START = 1_700_000_000  # 合成資料起點（epoch 秒）
+
+
+def synthesize(rng: np.random.Generator, offset: int, n: int, interval: int) -> tuple:
+    '''產生 n 筆合成摘要（溫度有日夜週期，偶爾缺值）'''
+    ts = START + (offset + np.arange(n, dtype=np.int64)) * interval
+    day = (ts % 86400) / 86400.0
+    temp = 25 + 6 * np.sin(2 * np.pi * day) + rng.normal(0, 0.5, n)
+    temp[rng.random(n) < 0.001] = np.nan
+    columns = {
+        "avg_temperature": temp,
+        "avg_humidity": 60 - 10 * np.sin(2 * np.pi * day) + rng.normal(0, 2, n),
+        "avg_turbidity_percent": rng.uniform(0, 60, n),
+        "avg_tds_value": rng.uniform(150, 800, n),
+        "avg_water_level_raw": rng.uniform(800, 3500, n),
+        "water_level_low": (rng.random(n) < 0.05).astype(np.float32),
+    }
+    return ts, columns
+
+
+def bench_queries(store: TimeSeriesStore, device: str, span: int, repeat: int, rng: np.random.Generator):
+    '''各種範圍/解析度組合的查詢延遲'''
+    cases = (
+        ("1 小時原始資料", 3600, None, ("avg_temperature",)),
+        ("1 天、每分鐘", 86400, 60, ("avg_temperature", "avg_humidity")),
+        ("30 天、每小時", 30 * 86400, 3600, None),
+        ("全部、每天", span, 86400, ("avg_tds_value",)),
+    )
+    for name, length, step, columns in cases:
+        length = min(length, span)
+        latencies = []
+        rows = 0
+        for _ in range(repeat):
+            start = START + int(rng.integers(0, max(1, span - length)))
+            t0 = time.perf_counter()
+            result = store.query(device, start, start + length, columns=columns, step=step)
+            latencies.append(time.perf_counter() - t0)
+            rows = len(result["ts"])
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+        print(f"  {name:<14} 回傳 {rows:>6} 筆  p50 {p50:8.2f} ms  p95 {p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TimeSeriesStore 基準測試")
+    parser.add_argument("--rows", type=int, default=100_000_000, help="合成資料筆數")
+    parser.add_argument("--interval", type=int, default=1, help="資料間隔（秒）")
+    parser.add_argument("--chunk", type=int, default=5_000_000, help="每批寫入筆數")
+    parser.add_argument("--repeat", type=int, default=50, help="每種查詢重複次數")
+    parser.add_argument("--dir", default=None, help="資料目錄（預設使用暫存目錄，結束後刪除）")
+    args = parser.parse_args()
+
+    root = args.dir or tempfile.mkdtemp(prefix="tsbench-")
+    rng = np.random.default_rng(0)
+    device = "bench-node"
+    try:
+        store = TimeSeriesStore(root)
+        print(f"寫入 {args.rows:,} 筆到 {root} ...")
+        t0 = time.perf_counter()
+        written = 0
+        while written < args.rows:
+            n = min(args.chunk, args.rows - written)
+            ts, columns = synthesize(rng, written, n, args.interval)
+            store.append_arrays(device, ts, columns)
+            written += n
+        elapsed = time.perf_counter() - t0
+        print(f"寫入完成：{elapsed:.1f} s，{args.rows / elapsed:,.0f} 筆/秒（含 1m/1h/1d 彙總）")
+
+        # 重新開啟，模擬冷查詢（memmap 從磁碟載入）
+        store = TimeSeriesStore(root)
+        print("查詢延遲：")
+        bench_queries(store, device, args.rows * args.interval, args.repeat, rng)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
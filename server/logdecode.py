@@ -0,0 +1,92 @@
+'''
+板子回傳 log 的解碼工具（在主機上執行）
+
+上傳摘要（或單獨的 log 請求）中的 "logs" 欄位由 core/log_shipper.py 產生：
+    {"v": 1, "enc": "zlib" | "raw", "data": base64, "n": 筆數, "pending": 板上剩餘筆數, "dropped": 累計丟棄筆數}
+
+    python -m server.logdecode payload.json            # 一個 JSON 請求內容
+    python -m server.logdecode received.jsonl --level W # 每行一個請求，只看警告以上
+'''
+import argparse
+import base64
+import json
+import sys
+import time
+import zlib
+from typing import Iterable, List, Tuple
+
+LEVEL_NAMES = {"D": "DEBUG", "I": "INFO", "W": "WARNING", "E": "ERROR", "C": "CRITICAL"}
+_ORDER = "DIWEC"
+
+
+def decode(logs: dict) -> List[Tuple[int, str, str]]:
+    """解開一批 log
+
+    Args:
+        logs (dict): 請求中的 "logs" 欄位
+
+    Returns:
+        List[Tuple[int, str, str]]: 依時間排序的 (Unix 秒, 等級, 訊息)
+    """
+    if logs.get("v") != 1:
+        raise ValueError(f"不支援的 log 版本: {logs.get('v')}")
+    data = base64.b64decode(logs["data"])
+    if logs["enc"] == "zlib":
+        data = zlib.decompress(data)
+    elif logs["enc"] != "raw":
+        raise ValueError(f"未知編碼: {logs['enc']}")
+    records = []
+    for line in data.split(b"\n"):
+        if not line:
+            continue
+        ts, level, message = line.decode("utf-8", errors="replace").split(" ", 2)
+        records.append((int(ts), LEVEL_NAMES.get(level, level), message))
+    records.sort(key=lambda r: r[0])  # 板上依優先順序打包，這裡還原成時間順序
+    return records
+
+
+def iter_payloads(lines: Iterable[str]) -> Iterable[dict]:
+    '''從 JSON 或 JSON Lines 內容中取出帶有 "logs" 的請求'''
+    text = "".join(lines).strip()
+    if not text:
+        return
+    try:
+        docs = [json.loads(text)]
+    except json.JSONDecodeError:
+        docs = [json.loads(line) for line in text.splitlines() if line.strip()]
+    for doc in docs:
+        for payload in doc if isinstance(doc, list) else [doc]:
+            if isinstance(payload, dict) and "logs" in payload:
+                yield payload
+
+
+def format_record(record: Tuple[int, str, str]) -> str:
+    ts, level, message = record
+    when = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts))
+    return f"{when} [{level}] {message}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解碼板子回傳的 log")
+    parser.add_argument("files", nargs="*", help="JSON 或 JSON Lines 檔，省略時讀標準輸入")
+    parser.add_argument("--level", default="D", choices=list(_ORDER), help="最低顯示等級（D/I/W/E/C）")
+    args = parser.parse_args()
+
+    minimum = _ORDER.index(args.level)
+    records = []
+    batches = 0
+    for path in args.files or ["-"]:
+        stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        with stream:
+            for payload in iter_payloads(stream):
+                batches += 1
+                records.extend(decode(payload["logs"]))
+    records.sort(key=lambda r: r[0])
+    for record in records:
+        if _ORDER.index(record[1][0]) >= minimum:
+            print(format_record(record))
+    print(f"共 {batches} 批、{len(records)} 筆", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+'''
+上傳資料接收與即時推播伺服器（在主機上執行，只用標準函式庫；寫入資料庫時需要 numpy）
+
+板子（或閘道）把摘要 POST 到這裡，收到後立刻以 Server-Sent Events 推給所有訂閱的儀表板，
+不必輪詢 Webhook 後端或等下一次上傳：
+    POST /data/webhook?device=farm-1   接收上傳摘要（單筆、合併上傳的 readings、閘道批次都可以）
+    GET  /stream?device=farm-1,farm-2  訂閱讀值與警示（省略 device 表示全部設備）
+    GET  /metrics                      訂閱者數量、推播與丟棄統計
+
+推播設計：
+    - 每則訊息只編碼一次，所有訂閱者共用同一份 bytes
+    - 每個訂閱者有固定長度的佇列，跟不上時丟最舊的訊息並在下一次送出時告知丟了幾則
+    - 寫入以 drain() 取得背壓，傳輸緩衝有上限；長時間完全不讀的連線會被關閉
+    - 新訂閱者先收到每個設備最新的一則讀值與警示狀態
+    - 有資料庫時先寫入再推播：時間戳格式錯誤回 400，早於設備最後一筆回 409，寫入失敗的讀值不推播
+
+    python -m server.stream --port 1567
+    python -m server.stream --port 1567 --root data --set TEMP_HIGH=30
+    curl -N "http://localhost:1567/stream?device=farm-1"
+'''
+import argparse
+import asyncio
+import json
+import socket
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# 與裝置端相同的警示條件，套用在上傳摘要的平均值上：(警示, 欄位, 方向, 設定名稱)
+ALERT_RULES = (
+    ("temp_high", "avg_temperature", 1, "TEMP_HIGH"),
+    ("humid_low", "avg_humidity", -1, "HUMID_LOW"),
+    ("turbidity_high", "avg_turbidity_percent", 1, "TURBIDITY_MAX"),
+    ("tds_high", "avg_tds_value", 1, "TDS_MAX"),
+)
+DEFAULT_THRESHOLDS = {"TEMP_HIGH": 35.0, "HUMID_LOW": 40.0, "TURBIDITY_MAX": 2500, "TDS_MAX": 700}
+# 與 server.tsstore.TIMESTAMP_FORMAT 相同（這裡不匯入 tsstore，沒有 numpy 也能只推播）
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+                413: "Payload Too Large"}
+
+
+def encode_event(event: str, data: dict, event_id: Optional[int] = None) -> bytes:
+    '''編碼成一則 SSE 訊息'''
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+def split_payload(payload: dict, device: str) -> List[Tuple[str, dict]]:
+    """把一個上傳請求拆成 (設備, 摘要)
+
+    Args:
+        payload (dict): 單筆摘要、{'readings': [...]}（板子合併上傳）或閘道批次（每筆帶 'node'）
+        device (str): 請求指定的設備名稱
+
+    Returns:
+        List[Tuple[str, dict]]: 每筆摘要與所屬設備；只有 log 的請求返回空串列
+
+    Raises:
+        ValueError: 摘要的時間戳不是 TIMESTAMP_FORMAT 格式
+    """
+    rows = payload.get("readings")
+    if rows is None:
+        if "timestamp" not in payload:
+            return []
+        rows = [payload]
+    result = []
+    for row in rows:
+        row = {k: v for k, v in row.items() if k != "logs"}
+        timestamp = row["timestamp"]
+        if not isinstance(timestamp, str):
+            raise ValueError(f"時間戳必須是字串: {timestamp!r}")
+        time.strptime(timestamp, TIMESTAMP_FORMAT)  # 推播與寫入前先擋下格式錯誤的時間戳
+        result.append((f"node-{row['node']}" if "node" in row else device, row))
+    return result
+
+
+class Subscriber:
+    '''一個串流連線：固定長度的待送佇列，滿了丟最舊的'''
+    __slots__ = ("devices", "queue", "wake", "dropped", "unreported", "sent")
+
+    def __init__(self, devices: Optional[Set[str]], queue_size: int):
+        self.devices = devices
+        self.queue = deque((), queue_size)
+        self.wake = asyncio.Event()
+        self.dropped = 0
+        self.unreported = 0  # 尚未告知客戶端的丟棄則數
+        self.sent = 0
+
+    def push(self, message: bytes):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+            self.unreported += 1
+        self.queue.append(message)
+        self.wake.set()
+
+
+class Broker:
+    '''
+    訊息分發：依設備找出訂閱者，同一份編碼結果放進每個訂閱者的佇列
+    '''
+    def __init__(self, queue_size: int = 64, thresholds: Optional[Dict[str, float]] = None):
+        """分發器的初始化
+
+        Args:
+            queue_size (int): 每個訂閱者最多累積幾則未送出的訊息
+            thresholds (Optional[Dict[str, float]]): 警示閾值，未指定的使用 DEFAULT_THRESHOLDS
+        """
+        self.queue_size = queue_size
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self._by_device: Dict[str, Set[Subscriber]] = {}
+        self._all: Set[Subscriber] = set()
+        self._latest: Dict[str, List[bytes]] = {}  # 設備 -> [最新讀值, 最新警示]
+        self._alerts: Dict[str, Set[str]] = {}
+        self._next_id = 0
+
+        self.published = 0
+        self.encoded_bytes = 0
+        self.deliveries = 0
+        self.publish_ns = 0
+        self.max_publish_ns = 0
+
+    def subscribe(self, devices: Optional[Iterable[str]]) -> Subscriber:
+        '''新增訂閱者，並先放入各設備最新的讀值與警示'''
+        sub = Subscriber(set(devices) if devices else None, self.queue_size)
+        if sub.devices is None:
+            self._all.add(sub)
+        else:
+            for device in sub.devices:
+                self._by_device.setdefault(device, set()).add(sub)
+        for device, messages in self._latest.items():
+            if sub.devices is None or device in sub.devices:
+                for message in messages:
+                    if message is not None:
+                        sub.push(message)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._all.discard(sub)
+        for device in sub.devices or ():
+            subs = self._by_device.get(device)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_device[device]
+
+    def _publish(self, device: str, event: str, data: dict) -> bytes:
+        start = time.perf_counter_ns()
+        self._next_id += 1
+        message = encode_event(event, data, self._next_id)  # 只編碼一次
+        n = 0
+        for sub in self._all:
+            sub.push(message)
+            n += 1
+        for sub in self._by_device.get(device, ()):
+            sub.push(message)
+            n += 1
+        elapsed = time.perf_counter_ns() - start
+        self.published += 1
+        self.encoded_bytes += len(message)
+        self.deliveries += n
+        self.publish_ns += elapsed
+        self.max_publish_ns = max(self.max_publish_ns, elapsed)
+        return message
+
+    def _check_alerts(self, summary: dict) -> Set[str]:
+        active = set()
+        for name, field, direction, key in ALERT_RULES:
+            value = summary.get(field)
+            if value is not None and (value - self.thresholds[key]) * direction > 0:
+                active.add(name)
+        if summary.get("water_level_low"):
+            active.add("water_low")
+        return active
+
+    def publish_reading(self, device: str, summary: dict):
+        """推播一筆讀值；警示狀態改變時另外推播一則警示
+
+        Args:
+            device (str): 設備名稱
+            summary (dict): 上傳摘要
+        """
+        latest = self._latest.setdefault(device, [None, None])
+        latest[0] = self._publish(device, "reading", dict(summary, device=device))
+        active = self._check_alerts(summary)
+        previous = self._alerts.get(device, set())
+        if active != previous:
+            self._alerts[device] = active
+            latest[1] = self._publish(device, "alert", {
+                "device": device,
+                "timestamp": summary.get("timestamp"),
+                "active": sorted(active),
+                "raised": sorted(active - previous),
+                "cleared": sorted(previous - active)
+            })
+
+    def report(self) -> dict:
+        subs = self._all.union(*self._by_device.values()) if self._by_device else set(self._all)
+        return {
+            "subscribers": len(subs),
+            "devices": len(self._latest),
+            "published": self.published,
+            "encoded_bytes": self.encoded_bytes,
+            "deliveries": self.deliveries,
+            "dropped": sum(s.dropped for s in subs),
+            "avg_publish_us": self.publish_ns // self.published // 1000 if self.published else None,
+            "max_publish_us": self.max_publish_ns // 1000
+        }
+
+
+class StreamServer:
+    '''
+    接收上傳並推播的 asyncio HTTP 伺服器
+    '''
+    def __init__(self, broker: Broker, host: str = "0.0.0.0", port: int = 1567, store=None,
+                 write_buffer: int = 16384, send_buffer: int = 65536, stall_timeout: float = 60.0, heartbeat: float = 15.0,
+                 max_body: int = 1 << 20):
+        """伺服器的初始化
+
+        Args:
+            broker (Broker): 訊息分發器
+            host (str): 綁定位址
+            port (int): 連接埠
+            store (TimeSeriesStore): 收到的摘要同時寫入此資料庫，None 則只推播
+            write_buffer (int): 每個連線的傳送緩衝上限（bytes），超過時 drain() 會等待
+            send_buffer (int): 串流連線的 socket 傳送緩衝（SO_SNDBUF），限制慢客戶端佔用的核心記憶體
+            stall_timeout (float): 客戶端完全不讀超過幾秒就關閉連線
+            heartbeat (float): 沒有訊息時每隔幾秒送一次註解行，維持連線並偵測斷線
+            max_body (int): POST 本文上限（bytes）
+        """
+        self.broker = broker
+        self.host = host
+        self.port = port
+        self.store = store
+        self.write_buffer = write_buffer
+        self.send_buffer = send_buffer
+        self.stall_timeout = stall_timeout
+        self.heartbeat = heartbeat
+        self.max_body = max_body
+        self._server = None
+        self._streams = {}  # 串流連線的 writer -> 訂閱者，關閉伺服器時一併關閉
+        self.received = 0
+        self.stalled = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer, sub in list(self._streams.items()):
+                writer.close()
+                sub.wake.set()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            line = await reader.readline()
+            headers = {}
+            while True:
+                header = await reader.readline()
+                if header in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = header.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            parts = line.decode("latin-1").split()
+            if len(parts) < 2:
+                return
+            method, target = parts[0], urlsplit(parts[1])
+            query = parse_qs(target.query)
+            if target.path == "/stream" and method == "GET":
+                await self._stream(writer, query)
+            elif target.path.startswith("/data/webhook") and method == "POST":
+                await self._receive(reader, writer, headers, query)
+            elif target.path == "/metrics" and method == "GET":
+                report = dict(self.broker.report(), received=self.received, stalled=self.stalled)
+                self._reply(writer, 200, json.dumps(report).encode(), "application/json")
+            else:
+                self._reply(writer, 404, b"not found")
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _reply(self, writer, status: int, body: bytes, content_type: str = "text/plain"):
+        writer.write(f"HTTP/1.1 {status} {_STATUS_TEXT[status]}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+
+    async def _receive(self, reader, writer, headers: dict, query: dict):
+        '''接收一個上傳請求，（有設定資料庫時）先寫入，寫入成功的讀值才推播'''
+        length = int(headers.get("content-length", 0))
+        if length > self.max_body:
+            self._reply(writer, 413, b"too large")
+            return
+        try:
+            payload = json.loads(await reader.readexactly(length))
+            rows = split_payload(payload, query.get("device", ["default"])[0])
+        except (ValueError, KeyError, AttributeError) as e:
+            self._reply(writer, 400, str(e).encode())
+            return
+        error = None
+        if self.store is not None and rows:
+            rows, error = await asyncio.get_running_loop().run_in_executor(None, self._store_rows, rows)
+        for device, summary in rows:
+            self.broker.publish_reading(device, summary)
+        self.received += len(rows)
+        if error is None:
+            self._reply(writer, 200, b"ok")
+        else:
+            from server.tsstore import OutOfOrderError
+            self._reply(writer, 409 if isinstance(error, OutOfOrderError) else 400, str(error).encode())
+
+    def _store_rows(self, rows: List[Tuple[str, dict]]) -> Tuple[List[Tuple[str, dict]], Optional[ValueError]]:
+        '''依設備寫入資料庫，返回寫入成功的摘要與第一個錯誤；一個設備寫入失敗不影響其他設備'''
+        by_device: Dict[str, List[dict]] = {}
+        for device, summary in rows:
+            by_device.setdefault(device, []).append(summary)
+        stored, error = [], None
+        for device, summaries in by_device.items():
+            try:
+                self.store.append(device, summaries)
+            except ValueError as e:
+                error = error or e
+                continue
+            stored.extend((device, summary) for summary in summaries)
+        return stored, error
+
+    async def _stream(self, writer, query: dict):
+        '''SSE 串流：等待佇列有訊息就整批寫出，drain() 等不到就代表客戶端讀太慢'''
+        devices = [d for value in query.get("device", ()) for d in value.split(",") if d]
+        writer.transport.set_write_buffer_limits(high=self.write_buffer)
+        sock = writer.get_extra_info("socket")
+        if sock is not None and self.send_buffer:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: keep-alive\r\n\r\nretry: 3000\n\n")
+        sub = self.broker.subscribe(devices)
+        self._streams[writer] = sub
+        try:
+            while True:
+                if not sub.queue:
+                    sub.wake.clear()
+                    try:
+                        await asyncio.wait_for(sub.wake.wait(), self.heartbeat)
+                    except asyncio.TimeoutError:
+                        writer.write(b": ping\n\n")
+                if writer.is_closing():
+                    return
+                if sub.unreported:
+                    writer.write(encode_event("dropped", {"count": sub.unreported}))
+                    sub.unreported = 0
+                n = len(sub.queue)
+                if n:
+                    writer.write(b"".join([sub.queue.popleft() for _ in range(n)]))
+                    sub.sent += n
+                try:
+                    await asyncio.wait_for(writer.drain(), self.stall_timeout)
+                except asyncio.TimeoutError:
+                    self.stalled += 1
+                    return
+        finally:
+            self._streams.pop(writer, None)
+            self.broker.unsubscribe(sub)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接收上傳摘要並以 SSE 即時推播")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=1567)
+    parser.add_argument("--root", help="同時寫入這個 TimeSeriesStore 目錄（需要 numpy）")
+    parser.add_argument("--queue", type=int, default=64, help="每個訂閱者最多累積幾則未送出的訊息")
+    parser.add_argument("--set", nargs="*", metavar="KEY=VALUE", help="警示閾值，例如 TEMP_HIGH=30")
+    args = parser.parse_args()
+
+    thresholds = {}
+    for item in args.set or ():
+        key, _, value = item.partition("=")
+        thresholds[key.strip()] = float(value)
+    store = None
+    if args.root:
+        from server.tsstore import TimeSeriesStore
+        store = TimeSeriesStore(args.root)
+
+    async def run():
+        server = StreamServer(Broker(queue_size=args.queue, thresholds=thresholds),
+                              host=args.host, port=args.port, store=store)
+        await server.start()
+        print(f"接收: POST http://{args.host}:{args.port}/data/webhook?device=<設備>，"
+              f"推播: GET /stream?device=<設備>")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
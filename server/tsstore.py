@@ -0,0 +1,417 @@
+'''
+主機端時間序列儲存模組（在主機上執行，需要 numpy）
+
+存放 FarmHistoryData.summarize_and_clear() 產生的上傳摘要，方便對整個場域做長期分析：
+    - 每個設備一個目錄，每個欄位一個只會附加的二進位檔（欄式儲存）
+    - 寫入時以 NumPy 向量化計算 1 分鐘 / 1 小時 / 1 天彙總（sum、count、min、max）
+    - 查詢以 memory-mapped 檔案讀取，只碰到需要的欄位與時間區塊
+      依 step 自動挑選最粗且仍夠細的彙總層級，再向量化降採樣
+
+目錄結構：
+    <root>/<device>/meta.json              各層級已提交的筆數
+    <root>/<device>/raw/ts.i8              時間戳（epoch 秒）
+    <root>/<device>/raw/<欄位>.f4           原始值（缺值為 NaN）
+    <root>/<device>/1m/ts.i8               彙總桶起點
+    <root>/<device>/1m/<欄位>.sum.f8 / .count.u4 / .min.f4 / .max.f4
+'''
+import calendar
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 上傳摘要中的數值欄位（water_level_low 以 0/1 儲存，mean 即為過低比例、max 即為「是否曾過低」）
+COLUMNS = (
+    "avg_temperature",
+    "avg_humidity",
+    "avg_turbidity_percent",
+    "avg_tds_value",
+    "avg_water_level_raw",
+    "water_level_low",
+)
+# 彙總層級名稱 -> 桶寬（秒）
+ROLLUPS = (("1m", 60), ("1h", 3600), ("1d", 86400))
+AGGREGATES = ("mean", "sum", "count", "min", "max")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 稀疏索引的區塊大小（筆），查詢先以此定位時間區塊再在區塊內二分搜尋
+BLOCK_ROWS = 65536
+
+_ROLLUP_PARTS = (("sum", np.float64), ("count", np.uint32), ("min", np.float32), ("max", np.float32))
+
+
+class OutOfOrderError(ValueError):
+    '''寫入的資料早於設備最後一筆'''
+
+
+def parse_timestamp(text: str) -> int:
+    '''把摘要的 "YYYY-mm-dd HH:MM:SS" 轉成 epoch 秒（視為 UTC）'''
+    return calendar.timegm(time.strptime(text, TIMESTAMP_FORMAT))
+
+
+class _Level:
+    '''單一層級（raw 或某個彙總）的檔案與 memmap 快取'''
+
+    def __init__(self, path: str, bucket: int):
+        self.path = path
+        self.bucket = bucket
+        self.rows = 0
+        self._maps: Dict[str, np.memmap] = {}
+        self._block_index: Optional[np.ndarray] = None
+        os.makedirs(path, exist_ok=True)
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def map(self, name: str, dtype) -> np.ndarray:
+        '''取得唯讀 memmap（筆數增加後自動重建）'''
+        mm = self._maps.get(name)
+        if mm is None or len(mm) < self.rows:
+            if self.rows == 0:
+                return np.empty(0, dtype=dtype)
+            mm = np.memmap(self.file(name), dtype=dtype, mode="r", shape=(self.rows,))
+            self._maps[name] = mm
+        return mm[:self.rows]
+
+    def append(self, name: str, values: np.ndarray):
+        with open(self.file(name), "ab") as f:
+            f.write(np.ascontiguousarray(values).tobytes())
+
+    def truncate(self, name: str, dtype, rows: int):
+        '''丟掉未提交（meta 之後）的尾端資料，處理寫到一半中斷的情況'''
+        path = self.file(name)
+        if os.path.exists(path):
+            size = rows * np.dtype(dtype).itemsize
+            if os.path.getsize(path) > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def overwrite_last(self, name: str, dtype, value):
+        '''覆寫最後一筆（合併跨批次的同一個彙總桶）'''
+        item = np.asarray([value], dtype=dtype)
+        with open(self.file(name), "r+b") as f:
+            f.seek((self.rows - 1) * item.itemsize)
+            f.write(item.tobytes())
+        self._maps.pop(name, None)
+
+    def invalidate(self):
+        self._maps.clear()
+        self._block_index = None
+
+    def row_range(self, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+        '''以稀疏區塊索引 + 區塊內二分搜尋找出 [start, end) 對應的列範圍'''
+        ts = self.map("ts.i8", np.int64)
+        if self.rows == 0:
+            return 0, 0
+        if self._block_index is None or len(self._block_index) != (self.rows + BLOCK_ROWS - 1) // BLOCK_ROWS:
+            self._block_index = np.array(ts[::BLOCK_ROWS])
+        return (self._locate(ts, start) if start is not None else 0,
+                self._locate(ts, end) if end is not None else self.rows)
+
+    def _locate(self, ts: np.ndarray, value: int) -> int:
+        block = int(np.searchsorted(self._block_index, value, side="left")) - 1
+        if block < 0:
+            return 0
+        lo = block * BLOCK_ROWS
+        hi = min(lo + BLOCK_ROWS, self.rows)
+        return lo + int(np.searchsorted(ts[lo:hi], value, side="left"))
+
+
+class TimeSeriesStore:
+    '''
+    依設備分開存放的欄式時間序列儲存
+    寫入需依時間遞增（同一批內會先排序）；同一設備的寫入與查詢以鎖保護
+    '''
+
+    def __init__(self, root: str):
+        """時間序列儲存的初始化
+
+        Args:
+            root (str): 資料根目錄
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._devices: Dict[str, Dict[str, _Level]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    # ------------------------------------------------------------ 內部
+    def _device(self, device: str) -> Dict[str, _Level]:
+        if not device or os.sep in device or device.startswith("."):
+            raise ValueError(f"不合法的設備名稱: {device!r}")
+        with self._guard:
+            levels = self._devices.get(device)
+            if levels is not None:
+                return levels
+            base = os.path.join(self.root, device)
+            levels = {"raw": _Level(os.path.join(base, "raw"), 0)}
+            for name, bucket in ROLLUPS:
+                levels[name] = _Level(os.path.join(base, name), bucket)
+            meta_path = os.path.join(base, "meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path, encoding="utf-8") as f:
+                    rows = json.load(f)
+                for name, level in levels.items():
+                    level.rows = rows.get(name, 0)
+                    self._repair(level)
+            self._devices[device] = levels
+            self._locks[device] = threading.Lock()
+            return levels
+
+    def _repair(self, level: _Level):
+        level.truncate("ts.i8", np.int64, level.rows)
+        for col in COLUMNS:
+            if level.bucket == 0:
+                level.truncate(col + ".f4", np.float32, level.rows)
+            else:
+                for part, dtype in _ROLLUP_PARTS:
+                    level.truncate(f"{col}.{part}", dtype, level.rows)
+
+    def _commit(self, device: str, levels: Dict[str, _Level]):
+        meta_path = os.path.join(self.root, device, "meta.json")
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({name: level.rows for name, level in levels.items()}, f)
+        os.replace(tmp, meta_path)
+
+    def devices(self) -> List[str]:
+        '''列出已有資料的設備'''
+        return sorted(d for d in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, d, "meta.json")))
+
+    def last_timestamp(self, device: str) -> Optional[int]:
+        '''設備最後一筆原始資料的時間（epoch 秒），沒有資料返回 None'''
+        levels = self._device(device)
+        with self._locks[device]:
+            raw = levels["raw"]
+            if raw.rows == 0:
+                return None
+            return int(raw.map("ts.i8", np.int64)[raw.rows - 1])
+
+    # ------------------------------------------------------------ 寫入
+    def append(self, device: str, payloads: Iterable[dict]) -> int:
+        """寫入上傳摘要
+
+        Args:
+            device (str): 設備名稱
+            payloads (Iterable[dict]): summarize_and_clear() 格式的摘要，或板子合併上傳的 {'readings': [摘要, ...]}
+
+        Returns:
+            int: 寫入筆數
+        """
+        payloads = [p for payload in payloads for p in payload.get("readings", (payload,))]
+        if not payloads:
+            return 0
+        ts = np.fromiter((parse_timestamp(p["timestamp"]) for p in payloads), dtype=np.int64, count=len(payloads))
+        columns = {}
+        for col in COLUMNS:
+            columns[col] = np.fromiter(
+                (np.nan if p.get(col) is None else float(p[col]) for p in payloads),
+                dtype=np.float32, count=len(payloads))
+        return self.append_arrays(device, ts, columns)
+
+    def append_batch(self, payload: dict, prefix: str = "node-") -> int:
+        """寫入閘道送來的批次，依節點拆到各自的設備（名稱為 prefix + 節點編號）
+
+        Args:
+            payload (dict): {'gateway': 編號, 'readings': [{'node': 編號, ...摘要}, ...]}
+            prefix (str): 設備名稱前綴
+
+        Returns:
+            int: 寫入筆數
+        """
+        by_node: Dict[str, List[dict]] = {}
+        for row in payload.get("readings", ()):
+            by_node.setdefault(f"{prefix}{row['node']}", []).append(row)
+        total = 0
+        for device, rows in by_node.items():
+            rows.sort(key=lambda r: parse_timestamp(r["timestamp"]))
+            total += self.append(device, rows)
+        return total
+
+    def append_arrays(self, device: str, ts: np.ndarray, columns: Dict[str, np.ndarray]) -> int:
+        """以陣列批次寫入（大量匯入、基準測試用）
+
+        Args:
+            device (str): 設備名稱
+            ts (np.ndarray): epoch 秒
+            columns (Dict[str, np.ndarray]): 欄位名稱 -> 數值，缺少的欄位視為 NaN
+
+        Returns:
+            int: 寫入筆數
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        n = len(ts)
+        if n == 0:
+            return 0
+        order = None
+        if n > 1 and np.any(ts[1:] < ts[:-1]):
+            order = np.argsort(ts, kind="stable")
+            ts = ts[order]
+        values = {}
+        for col in COLUMNS:
+            v = columns.get(col)
+            v = np.full(n, np.nan, dtype=np.float32) if v is None else np.asarray(v, dtype=np.float32)
+            values[col] = v[order] if order is not None else v
+
+        levels = self._device(device)
+        with self._locks[device]:
+            raw = levels["raw"]
+            if raw.rows:
+                last = int(raw.map("ts.i8", np.int64)[-1])
+                if ts[0] < last:
+                    raise OutOfOrderError(f"{device} 的資料必須依時間遞增寫入（{ts[0]} < {last}）")
+            raw.append("ts.i8", ts)
+            for col in COLUMNS:
+                raw.append(col + ".f4", values[col])
+            raw.rows += n
+            raw.invalidate()
+            for name, bucket in ROLLUPS:
+                self._rollup(levels[name], ts, values)
+            self._commit(device, levels)
+        return n
+
+    def _rollup(self, level: _Level, ts: np.ndarray, values: Dict[str, np.ndarray]):
+        '''向量化計算本批次的彙總，並與最後一個已存在的桶合併'''
+        keys = ts - ts % level.bucket
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+        bucket_ts = keys[starts]
+        parts = {}
+        for col in COLUMNS:
+            v = values[col]
+            valid = ~np.isnan(v)
+            parts[col] = (
+                np.add.reduceat(np.where(valid, v, 0).astype(np.float64), starts),
+                np.add.reduceat(valid.astype(np.uint32), starts),
+                np.fmin.reduceat(v, starts),
+                np.fmax.reduceat(v, starts),
+            )
+
+        skip = 0
+        if level.rows and int(level.map("ts.i8", np.int64)[-1]) == bucket_ts[0]:
+            # 第一個桶延續上一批的最後一個桶，合併後覆寫
+            for col in COLUMNS:
+                s, c, lo, hi = parts[col]
+                old = [level.map(f"{col}.{part}", dtype)[-1] for part, dtype in _ROLLUP_PARTS]
+                merged = (old[0] + s[0], old[1] + c[0], np.fmin(old[2], lo[0]), np.fmax(old[3], hi[0]))
+                for (part, dtype), value in zip(_ROLLUP_PARTS, merged):
+                    level.overwrite_last(f"{col}.{part}", dtype, value)
+            skip = 1
+
+        if skip < len(bucket_ts):
+            level.append("ts.i8", bucket_ts[skip:])
+            for col in COLUMNS:
+                for (part, dtype), arr in zip(_ROLLUP_PARTS, parts[col]):
+                    level.append(f"{col}.{part}", arr[skip:].astype(dtype))
+            level.rows += len(bucket_ts) - skip
+        level.invalidate()
+
+    # ------------------------------------------------------------ 查詢
+    def query(self, device: str, start: Optional[int] = None, end: Optional[int] = None,
+              columns: Optional[Sequence[str]] = None, step: Optional[int] = None,
+              agg: str = "mean") -> Dict[str, np.ndarray]:
+        """範圍查詢
+
+        Args:
+            device (str): 設備名稱
+            start (Optional[int]): 起始 epoch 秒（含），None 表示從頭
+            end (Optional[int]): 結束 epoch 秒（不含），None 表示到最後
+            columns (Optional[Sequence[str]]): 要讀的欄位，None 表示全部
+            step (Optional[int]): 降採樣間隔（秒），None 表示回傳原始資料；
+                以彙總層級回答時以桶為單位，包含 start 所在的桶與起點早於 end 的桶
+            agg (str): 降採樣的彙總方式：mean / sum / count / min / max
+
+        Returns:
+            Dict[str, np.ndarray]: {'ts': 時間（桶起點）, <欄位>: 數值}
+        """
+        columns = tuple(columns) if columns is not None else COLUMNS
+        for col in columns:
+            if col not in COLUMNS:
+                raise ValueError(f"未知欄位: {col}")
+        if agg not in AGGREGATES:
+            raise ValueError(f"未知彙總方式: {agg}")
+        if step is not None and step <= 0:
+            raise ValueError("step 必須為正整數")
+
+        levels = self._device(device)
+        with self._locks[device]:
+            level = self._pick_level(levels, step)
+            if start is not None and level.bucket:
+                start -= start % level.bucket  # 包含 start 所在的桶
+            lo, hi = level.row_range(start, end)
+            ts = np.array(level.map("ts.i8", np.int64)[lo:hi])
+            if level.bucket == 0:
+                data = {col: np.array(level.map(col + ".f4", np.float32)[lo:hi]) for col in columns}
+                if step is None:
+                    data["ts"] = ts
+                    return data
+                return self._downsample_raw(ts, data, step, agg)
+            parts = {}
+            for col in columns:
+                parts[col] = [np.array(level.map(f"{col}.{part}", dtype)[lo:hi]) for part, dtype in _ROLLUP_PARTS]
+            return self._downsample_rollup(ts, parts, step, agg)
+
+    @staticmethod
+    def _pick_level(levels: Dict[str, _Level], step: Optional[int]) -> _Level:
+        '''挑選桶寬能整除 step 的最粗層級'''
+        if step is None:
+            return levels["raw"]
+        best = levels["raw"]
+        for name, bucket in ROLLUPS:
+            if step % bucket == 0 and levels[name].rows:
+                best = levels[name]
+        return best
+
+    @staticmethod
+    def _groups(ts: np.ndarray, step: int) -> Tuple[np.ndarray, np.ndarray]:
+        keys = ts - ts % step
+        if len(keys) == 0:
+            return keys, np.empty(0, dtype=np.intp)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+        return keys[starts], starts
+
+    def _downsample_raw(self, ts, data, step, agg) -> Dict[str, np.ndarray]:
+        out_ts, starts = self._groups(ts, step)
+        result = {"ts": out_ts}
+        for col, v in data.items():
+            if len(starts) == 0:
+                result[col] = np.empty(0)
+                continue
+            valid = ~np.isnan(v)
+            s = np.add.reduceat(np.where(valid, v, 0).astype(np.float64), starts)
+            c = np.add.reduceat(valid.astype(np.uint32), starts)
+            result[col] = self._finish(agg, s, c, lambda: np.fmin.reduceat(v, starts), lambda: np.fmax.reduceat(v, starts))
+        return result
+
+    def _downsample_rollup(self, ts, parts, step, agg) -> Dict[str, np.ndarray]:
+        if step is None or len(ts) == 0:
+            out_ts, starts = ts, None
+        else:
+            out_ts, starts = self._groups(ts, step)
+        result = {"ts": out_ts}
+        for col, (s, c, lo, hi) in parts.items():
+            if starts is not None and len(starts):
+                s = np.add.reduceat(s, starts)
+                c = np.add.reduceat(c, starts)
+                lo_fn = lambda lo=lo: np.fmin.reduceat(lo, starts)
+                hi_fn = lambda hi=hi: np.fmax.reduceat(hi, starts)
+            else:
+                lo_fn = lambda lo=lo: lo
+                hi_fn = lambda hi=hi: hi
+            result[col] = self._finish(agg, s, c, lo_fn, hi_fn)
+        return result
+
+    @staticmethod
+    def _finish(agg, s, c, lo_fn, hi_fn) -> np.ndarray:
+        if agg == "sum":
+            return s
+        if agg == "count":
+            return c
+        if agg == "min":
+            return lo_fn()
+        if agg == "max":
+            return hi_fn()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(c > 0, s / np.maximum(c, 1), np.nan)
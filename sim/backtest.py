@@ -0,0 +1,383 @@
+'''
+警示閾值回測工具（在主機上執行，需要 numpy）
+
+以歷史資料一次評估大量候選閾值：讀入 trace 紀錄檔或 TimeSeriesStore 的上傳摘要，
+用與 FarmController._one_cycle 相同的判斷（超過/低於閾值就警示），另外可加上
+遲滯（回到閾值內側 h 才解除）與去抖動（連續 k 回合超標才警示）兩種變化，
+回報每組候選的警示次數、警示總時間、漏報與誤報事件數與估計的水泵運轉時間：
+
+    python -m sim.backtest --trace trace.bin
+    python -m sim.backtest --store data --device farm-1 \\
+        --grid TEMP_HIGH=28:36:0.5 --grid HUMID_LOW=20:40:2 --hyst TEMP_HIGH=0,0.5,1 --debounce 1,2,3
+
+做法：
+    - 每個感測通道彼此獨立，先對單一通道的（閾值 × 遲滯 × 去抖動）以 NumPy 二維陣列向量化計算，
+      時間軸上的狀態以 maximum.accumulate 求「最後一次觸發 / 解除的位置」，不需逐筆迴圈
+    - 再以廣播把各通道的結果相加成完整的候選網格，數萬組候選只需要幾次陣列加法
+    - 「事件」指讀值超出參考界線（預設為目前設定值）且持續至少 --event-min 回合的區段；
+      候選在事件期間完全沒有警示算漏報，警示區段與任何事件都不重疊算誤報
+    - 水泵運轉時間為估計值：每次低水位警示開始時啟動，運轉到紀錄中的水位回到
+      閾值 + PUMP_HYSTERESIS 或達到 PUMP_MAX_RUNTIME 為止（歷史水位本身受當時的水泵影響）
+'''
+import argparse
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from sim import env
+env.install_hardware()
+
+from core import trace  # noqa: E402
+
+# (警示鍵, 設定名稱, 讀值欄位, 方向)  方向 1：高於閾值警示；-1：低於閾值警示
+CHANNELS = (
+    ("temp_high", "TEMP_HIGH", "temperature", 1),
+    ("humid_low", "HUMID_LOW", "humidity", -1),
+    ("turbidity_high", "TURBIDITY_MAX", "turbidity_percent", 1),
+    ("tds_high", "TDS_MAX", "tds_value", 1),
+    ("water_low", "WATER_LEVEL_MIN", "water_level_raw", -1),
+)
+# 一次處理的（候選數 × 回合數）上限，控制暫存陣列大小
+CHUNK_ELEMENTS = 1 << 22
+MAX_CANDIDATES = 20_000_000
+
+_TRACE_DTYPE = np.dtype([("kind", "u1"), ("channel", "u1"), ("ticks", "<u4"), ("value", "<f4")])
+
+
+class Series:
+    '''回測用的時間序列：每回合一筆，缺值為 NaN'''
+
+    def __init__(self, ts: np.ndarray, values: Dict[str, np.ndarray], masks: Optional[np.ndarray] = None):
+        """
+        Args:
+            ts (np.ndarray): 每回合的 epoch 秒
+            values (Dict[str, np.ndarray]): 讀值欄位 -> 數值
+            masks (Optional[np.ndarray]): 紀錄檔中每回合實際的警示位元遮罩（trace 才有）
+        """
+        self.ts = np.asarray(ts, dtype=np.float64)
+        self.values = {key: np.asarray(v, dtype=np.float64) for key, v in values.items()}
+        self.masks = masks
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def dt(self) -> np.ndarray:
+        '''每回合代表的秒數（到下一回合為止，超過中位數 3 倍的斷線空檔不計）'''
+        if len(self.ts) < 2:
+            return np.ones(len(self.ts))
+        gaps = np.diff(self.ts)
+        step = float(np.median(gaps))
+        return np.minimum(np.append(gaps, step), step * 3)
+
+    @classmethod
+    def from_trace(cls, path: str) -> "Series":
+        '''從 trace 紀錄檔還原控制迴圈每回合看到的讀值'''
+        with open(path, "rb") as f:
+            _, epoch, start = trace.read_header(f)
+            data = f.read()
+        usable = len(data) - len(data) % _TRACE_DTYPE.itemsize
+        rec = np.frombuffer(data[:usable], dtype=_TRACE_DTYPE)
+        cycles = np.flatnonzero(rec["kind"] == trace.CYCLE)
+        prev = np.concatenate(([-1], cycles[:-1]))
+        is_sensor = rec["kind"] == trace.SENSOR
+
+        def positions(channel: int) -> np.ndarray:
+            return np.flatnonzero(is_sensor & (rec["channel"] == channel))
+
+        def last_in_cycle(channel: int):
+            '''每回合中該通道最後一筆紀錄的位置，沒有則為 -1'''
+            pos = positions(channel)
+            i = np.searchsorted(pos, cycles) - 1
+            found = pos[np.maximum(i, 0)] if len(pos) else np.full(len(cycles), -1)
+            return np.where((i >= 0) & (found > prev), found, -1)
+
+        def take(where: np.ndarray) -> np.ndarray:
+            out = np.full(len(where), np.nan)
+            ok = where >= 0
+            out[ok] = rec["value"][where[ok]]
+            return out
+
+        last = {ch: last_in_cycle(ch) for ch in (trace.CH_DHT_MEASURE, trace.CH_TEMP, trace.CH_HUMI,
+                                                trace.CH_TURBIDITY_ADC, trace.CH_TDS_ADC)}
+        # 水位在同一回合也會被水泵任務輪詢；控制迴圈讀的是緊接在其他感測器之後的那一筆
+        anchor = np.maximum(prev, np.max(np.stack(list(last.values())), axis=0))
+        water_pos = positions(trace.CH_WATER_ADC)
+        j = np.searchsorted(water_pos, anchor, side="right")
+        water_at = np.where(j < len(water_pos), water_pos[np.minimum(j, len(water_pos) - 1)], -1) \
+            if len(water_pos) else np.full(len(cycles), -1)
+        water_at = np.where((water_at >= 0) & (water_at < cycles), water_at, -1)
+
+        measured = ~np.isnan(take(last[trace.CH_DHT_MEASURE]))
+        temp = np.where(measured, take(last[trace.CH_TEMP]), np.nan)
+        humi = np.where(measured, take(last[trace.CH_HUMI]), np.nan)
+        turbidity = 100.0 - take(last[trace.CH_TURBIDITY_ADC]) / 4095 * 100.0
+        # 與 TDSSensor.read_tds 相同的換算，溫度讀不到時以 25°C 補償
+        v = take(last[trace.CH_TDS_ADC]) * (3.3 / 4095.0) / (1.0 + 0.02 * (np.nan_to_num(temp, nan=25.0) - 25.0))
+        tds = (133.42 * v ** 3 - 255.86 * v ** 2 + 857.39 * v) * 0.5
+
+        offset = 946684800 if epoch == 2000 else 0
+        ts = start + offset + rec["ticks"][cycles] / 1000.0
+        values = {"temperature": temp, "humidity": humi, "turbidity_percent": turbidity,
+                  "tds_value": tds, "water_level_raw": take(water_at)}
+        return cls(ts, values, masks=rec["value"][cycles].astype(np.int64))
+
+    @classmethod
+    def from_store(cls, root: str, device: str, start: Optional[int] = None, end: Optional[int] = None) -> "Series":
+        '''從 TimeSeriesStore 讀上傳摘要（每筆是一個上傳視窗的平均，警示判斷會比逐回合平滑）'''
+        from server.tsstore import TimeSeriesStore
+        store = TimeSeriesStore(root)
+        columns = {key: "avg_" + key for _, _, key, _ in CHANNELS}
+        data = store.query(device, start, end, columns=list(columns.values()))
+        return cls(data["ts"], {key: data[col] for key, col in columns.items()})
+
+
+def _states(y: np.ndarray, thr: np.ndarray, hyst: float, debounce: Sequence[int]):
+    """逐一產生各去抖動值下的警示狀態矩陣
+
+    y 與 thr 已乘上方向，警示條件一律為 y > thr：
+        觸發：連續 k 回合 y > thr
+        解除：y <= thr - hyst 或讀不到（與裝置端讀取失敗不警示一致）
+    任一時刻的狀態 = 最後一次觸發是否晚於最後一次解除
+
+    Args:
+        y (np.ndarray): 讀值（N,）
+        thr (np.ndarray): 閾值（C,）
+        hyst (float): 遲滯寬度
+        debounce (Sequence[int]): 去抖動回合數
+
+    Yields:
+        (k 的索引, 狀態矩陣 (C, N) bool)
+    """
+    n = len(y)
+    idx = np.arange(n, dtype=np.int32)
+    above = y[None, :] > thr[:, None]
+    clear = ~(y[None, :] > (thr - hyst)[:, None])
+    last_clear = np.maximum.accumulate(np.where(clear, idx, -1), axis=1)
+    run = idx - np.maximum.accumulate(np.where(above, -1, idx), axis=1)  # 連續超標的回合數
+    for i, k in enumerate(debounce):
+        last_set = np.maximum.accumulate(np.where(run >= k, idx, -1), axis=1)
+        yield i, last_set > last_clear
+
+
+def _episodes(y: np.ndarray, limit: float, min_len: int):
+    '''超出參考界線且持續至少 min_len 回合的區段 (starts, ends)，end 不含'''
+    exceed = np.concatenate(([False], y > limit, [False]))
+    edges = np.flatnonzero(exceed[1:] != exceed[:-1])
+    starts, ends = edges[0::2], edges[1::2]
+    keep = ends - starts >= min_len
+    return starts[keep], ends[keep]
+
+
+def evaluate_channel(series: Series, key: str, direction: int, thresholds: np.ndarray, hysteresis: np.ndarray,
+                     debounce: Sequence[int], limit: float, event_min: int = 3,
+                     pump: Optional[tuple] = None) -> Dict[str, np.ndarray]:
+    """對單一通道的所有（去抖動 × 閾值 × 遲滯）組合做回測
+
+    Args:
+        series (Series): 歷史資料
+        key (str): 讀值欄位
+        direction (int): 1 高於閾值警示、-1 低於閾值警示
+        thresholds (np.ndarray): 候選閾值
+        hysteresis (np.ndarray): 候選遲滯寬度（與讀值同單位）
+        debounce (Sequence[int]): 候選去抖動回合數
+        limit (float): 定義「事件」的參考界線
+        event_min (int): 事件至少持續的回合數
+        pump (Optional[tuple]): (PUMP_HYSTERESIS, PUMP_MAX_RUNTIME)，只有水位通道需要
+
+    Returns:
+        Dict[str, np.ndarray]: alerts / alert_seconds / missed / false_alerts / pump_seconds，
+            形狀皆為 (len(debounce), len(thresholds), len(hysteresis))；另含 events（事件數）
+    """
+    y = direction * series.values[key]
+    n = len(y)
+    dt = series.dt().astype(np.float32)
+    ts = np.append(series.ts, np.inf)
+    ev_start, ev_end = _episodes(y, direction * limit, event_min)
+    truth = np.zeros(n, dtype=bool)
+    for s, e in zip(ev_start, ev_end):
+        truth[s:e] = True
+    truth_cs = np.concatenate(([0], np.cumsum(truth)))
+
+    shape = (len(debounce), len(thresholds), len(hysteresis))
+    out = {name: np.zeros(shape) for name in ("alerts", "alert_seconds", "missed", "false_alerts", "pump_seconds")}
+    out["events"] = np.array(len(ev_start))
+    if n == 0:
+        return out
+    thr_all = direction * np.asarray(thresholds, dtype=np.float64)
+    chunk = max(1, CHUNK_ELEMENTS // n)
+    for lo in range(0, len(thr_all), chunk):
+        thr = thr_all[lo:lo + chunk]
+        nxt = None
+        if pump is not None:
+            # 每個位置之後第一次水位回到停機點的位置（水位通道方向為 -1，停機點 = 閾值 + 遲滯）
+            stop_level = -thr + pump[0]
+            reached = series.values[key][None, :] >= stop_level[:, None]
+            nxt = np.minimum.accumulate(np.where(reached, np.arange(n), n)[:, ::-1], axis=1)[:, ::-1]
+        for h_i, hyst in enumerate(hysteresis):
+            for k_i, on in _states(y, thr, float(hyst), debounce):
+                padded = np.zeros((len(thr), n + 2), dtype=np.int8)
+                padded[:, 1:-1] = on
+                d = np.diff(padded, axis=1)
+                rows, starts = np.nonzero(d == 1)
+                ends = np.nonzero(d == -1)[1]
+                sel = (k_i, slice(lo, lo + len(thr)), h_i)
+                out["alerts"][sel] = np.bincount(rows, minlength=len(thr))
+                out["alert_seconds"][sel] = on.astype(np.float32) @ dt
+                overlap = truth_cs[ends] - truth_cs[starts]
+                out["false_alerts"][sel] = np.bincount(rows[overlap == 0], minlength=len(thr))
+                if len(ev_start):
+                    on_cs = np.zeros((len(thr), n + 1), dtype=np.int32)
+                    np.cumsum(on, axis=1, out=on_cs[:, 1:])
+                    out["missed"][sel] = ((on_cs[:, ev_end] - on_cs[:, ev_start]) == 0).sum(axis=1)
+                if nxt is not None and len(rows):
+                    stop_at = nxt[rows, np.minimum(starts + 1, n - 1)]
+                    runtime = np.minimum(ts[np.where(starts + 1 < n, stop_at, n)] - ts[starts], pump[1])
+                    out["pump_seconds"][sel] = np.bincount(rows, weights=runtime, minlength=len(thr))
+    return out
+
+
+def parse_values(text: str) -> np.ndarray:
+    '''"28:36:0.5"（含終點）或 "0,0.5,1" 轉成陣列'''
+    if ":" in text:
+        lo, hi, step = (float(x) for x in text.split(":"))
+        return np.round(np.arange(lo, hi + step / 2, step), 6)
+    return np.array([float(x) for x in text.split(",")])
+
+
+def backtest(series: Series, config, grid: Dict[str, np.ndarray], hyst: Dict[str, np.ndarray],
+             debounce: Sequence[int], limits: Dict[str, float], event_min: int = 3) -> dict:
+    """評估完整的候選網格
+
+    Args:
+        series (Series): 歷史資料
+        config: 設定模組（未指定網格的通道使用其中的目前值）
+        grid (Dict[str, np.ndarray]): 設定名稱 -> 候選閾值
+        hyst (Dict[str, np.ndarray]): 設定名稱 -> 候選遲滯
+        debounce (Sequence[int]): 候選去抖動回合數（所有通道共用）
+        limits (Dict[str, float]): 設定名稱 -> 事件參考界線
+        event_min (int): 事件至少持續的回合數
+
+    Returns:
+        dict: 'channels' 各通道結果、'shape' 網格形狀、以及各指標攤平的完整網格
+    """
+    channels = []
+    totals = None
+    for alert_key, name, key, direction in CHANNELS:
+        current = float(getattr(config, name))
+        thresholds = grid.get(name, np.array([current]))
+        widths = hyst.get(name, np.array([0.0]))
+        pump = (config.PUMP_HYSTERESIS, config.PUMP_MAX_RUNTIME) if alert_key == "water_low" else None
+        result = evaluate_channel(series, key, direction, thresholds, widths, debounce,
+                                  limits.get(name, current), event_min, pump)
+        channels.append({"name": name, "thresholds": thresholds, "hysteresis": widths, **result})
+        flat = {m: result[m].reshape(len(debounce), -1)
+                for m in ("alerts", "alert_seconds", "missed", "false_alerts", "pump_seconds")}
+        if totals is None:
+            totals = flat
+        else:
+            # 廣播相加：(K, 前面所有通道的組合, 1) + (K, 1, 本通道的組合)
+            totals = {m: (totals[m][:, :, None] + flat[m][:, None, :]).reshape(len(debounce), -1)
+                      for m in totals}
+        if totals["alerts"].size > MAX_CANDIDATES:
+            raise ValueError(f"候選組合超過 {MAX_CANDIDATES} 組，請縮小網格")
+    shape = (len(debounce),) + tuple(len(c["thresholds"]) * len(c["hysteresis"]) for c in channels)
+    return {"channels": channels, "shape": shape, "debounce": list(debounce),
+            **{m: v.ravel() for m, v in totals.items()}}
+
+
+def describe(result: dict, flat_index: int) -> dict:
+    '''把網格的攤平索引還原成各通道的閾值、遲滯與去抖動'''
+    parts = np.unravel_index(flat_index, result["shape"])
+    out = {"debounce": result["debounce"][parts[0]]}
+    for channel, i in zip(result["channels"], parts[1:]):
+        t_i, h_i = divmod(int(i), len(channel["hysteresis"]))
+        out[channel["name"]] = (float(channel["thresholds"][t_i]), float(channel["hysteresis"][h_i]))
+    return out
+
+
+def rank(result: dict, top: int = 10, miss_weight: float = 10.0) -> List[int]:
+    '''依「誤報 + 漏報 × 權重」由小到大、再依水泵運轉時間排序，回傳前 top 組的索引'''
+    score = result["false_alerts"] + miss_weight * result["missed"]
+    order = np.lexsort((result["pump_seconds"], result["alerts"], score))
+    return [int(i) for i in order[:top]]
+
+
+def verify_trace(series: Series, config) -> int:
+    '''以目前設定（無遲滯、無去抖動）重算警示，回傳與紀錄檔不一致的回合數'''
+    if series.masks is None:
+        return 0
+    expected = np.zeros(len(series), dtype=np.int64)
+    for bit, (_, name, key, direction) in enumerate(CHANNELS):
+        thr = np.array([direction * float(getattr(config, name))])
+        _, on = next(_states(direction * series.values[key], thr, 0.0, (1,)))
+        expected |= on[0].astype(np.int64) << bit
+    return int(np.count_nonzero(expected != series.masks))
+
+
+def _pairs(items: Optional[List[str]]) -> Dict[str, np.ndarray]:
+    result = {}
+    for item in items or ():
+        key, _, text = item.partition("=")
+        result[key.strip()] = parse_values(text)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以歷史資料回測大量候選警示閾值")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--trace", help="trace 紀錄檔（逐回合原始讀值）")
+    source.add_argument("--store", help="TimeSeriesStore 資料目錄（上傳摘要）")
+    parser.add_argument("--device", help="搭配 --store 的設備名稱")
+    parser.add_argument("--grid", action="append", metavar="NAME=LO:HI:STEP", help="候選閾值，例如 TEMP_HIGH=28:36:0.5")
+    parser.add_argument("--hyst", action="append", metavar="NAME=V1,V2", help="候選遲滯寬度，例如 TEMP_HIGH=0,0.5,1")
+    parser.add_argument("--debounce", default="1", help="候選去抖動回合數，例如 1,2,3")
+    parser.add_argument("--limit", action="append", metavar="NAME=V", help="事件參考界線，預設為目前設定值")
+    parser.add_argument("--event-min", type=int, default=3, help="事件至少持續的回合數")
+    parser.add_argument("--miss-weight", type=float, default=10.0, help="排序時一次漏報相當於幾次誤報")
+    parser.add_argument("--top", type=int, default=10, help="列出前幾組")
+    parser.add_argument("--set", action="append", metavar="KEY=VALUE", help="覆寫設定值（例如 PUMP_MAX_RUNTIME=60）")
+    args = parser.parse_args()
+
+    config = env.load_config(env.parse_overrides(args.set))
+    t0 = time.perf_counter()
+    if args.trace:
+        series = Series.from_trace(args.trace)
+    else:
+        if not args.device:
+            parser.error("--store 需要 --device")
+        series = Series.from_store(args.store, args.device)
+    load_s = time.perf_counter() - t0
+    if len(series) == 0:
+        print("沒有資料")
+        return
+    days = (series.ts[-1] - series.ts[0]) / 86400
+
+    t0 = time.perf_counter()
+    limits = {k: float(v[0]) for k, v in _pairs(args.limit).items()}
+    debounce = [int(x) for x in args.debounce.split(",")]
+    result = backtest(series, config, _pairs(args.grid), _pairs(args.hyst), debounce, limits, args.event_min)
+    baseline = backtest(series, config, {}, {}, [1], limits, args.event_min)
+    elapsed = time.perf_counter() - t0
+
+    print(f"{len(series)} 回合（{days:.1f} 天），讀取 {load_s:.2f} s；"
+          f"{len(result['alerts'])} 組候選，回測 {elapsed:.2f} s")
+    if series.masks is not None:
+        print(f"以目前設定重算的警示與紀錄檔不一致的回合: {verify_trace(series, config)}")
+    print("事件數: " + "、".join(f"{c['name']} {int(c['events'])}" for c in result["channels"]))
+
+    def show(label: str, r: dict, i: int):
+        params = describe(r, i)
+        debounce_k = params.pop("debounce")
+        text = "、".join(f"{name}={t:g}" + (f"（遲滯 {h:g}）" if h else "") for name, (t, h) in params.items())
+        print(f"{label} 去抖動 {debounce_k}，{text}")
+        print(f"    警示 {int(r['alerts'][i])} 次（誤報 {int(r['false_alerts'][i])}、漏報事件 {int(r['missed'][i])}），"
+              f"警示時間 {r['alert_seconds'][i] / 3600:.1f} h，水泵估計運轉 {r['pump_seconds'][i] / 60:.1f} min")
+
+    show("目前設定:", baseline, 0)
+    for n, i in enumerate(rank(result, args.top, args.miss_weight), 1):
+        show(f"#{n}", result, i)
+
+
+if __name__ == "__main__":
+    main()
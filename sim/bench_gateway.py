@@ -0,0 +1,148 @@
+'''
+閘道模式負載測試（在主機上以 loopback UDP 執行）
+
+啟動一個 GatewayServer 與多個模擬節點（GatewayClient），每個節點連續送出摘要並等待確認，
+部分封包會刻意重送以驗證去除重複；最後關掉閘道，確認節點改回直接上傳：
+
+    python -m sim.bench_gateway
+    python -m sim.bench_gateway --nodes 200 --messages 100 --dup 0.1
+'''
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+from sim import env
+env.install_hardware()
+
+from core.gateway import GatewayServer, GatewayClient  # noqa: E402
+
+
+class CountingUploader:
+    '''代替 FanoutUploader，只統計收到的批次'''
+
+    def __init__(self):
+        self.batches = 0
+        self.rows = 0
+        self.keys = set()
+
+    def submit_batch(self, data: dict):
+        self.batches += 1
+        for row in data["readings"]:
+            self.rows += 1
+            self.keys.add((row["node"], row["seq"]))
+
+
+class _BenchClient(GatewayClient):
+    '''會隨機多送一次同一個封包的節點，模擬確認遺失後的重送'''
+
+    def __init__(self, *args, dup: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dup = dup
+        self.injected = 0
+        self.rtts: List[int] = []
+
+    async def _send(self, packet: bytes) -> bool:
+        ok = await super()._send(packet)
+        if ok:
+            self.rtts.append(self.last_rtt_ms)
+            if random.random() < self.dup:
+                self._sock.sendto(packet, self._addr)
+                self.injected += 1
+        return ok
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def _bench(args) -> dict:
+    logger = env.NullLogger()
+    uploader = CountingUploader()
+    gateway = GatewayServer(uploader, logger, host="127.0.0.1", port=args.port,
+                            batch_size=args.batch, batch_interval=1.0, poll_ms=1)
+    gateway.start()
+
+    direct = []
+    clients = [
+        _BenchClient("127.0.0.1", args.port, node_id=i + 1, logger=logger, fallback=direct.append,
+                     ack_timeout=args.ack_timeout, retries=2, retry_interval=3600, down_after=1,
+                     queue_size=args.messages, poll_ms=1, dup=args.dup)
+        for i in range(args.nodes)
+    ]
+    summary = {"avg_temperature": 25.0, "avg_humidity": 60.0, "avg_turbidity_percent": 10.0,
+               "avg_tds_value": 300.0, "avg_water_level_raw": 1800.0, "water_level_low": False}
+    for client in clients:
+        client.start()
+        for _ in range(args.messages):
+            client.submit(summary)
+
+    start = time.perf_counter()
+    total = args.nodes * args.messages
+    while sum(c.acked for c in clients) + len(direct) < total:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(0.05)  # 讓閘道處理完最後幾個重複封包
+    gateway.flush()
+
+    resent = sum(c.resent for c in clients)
+
+    # 第二階段：閘道消失，節點應改為直接上傳
+    await gateway.stop()
+    before = len(direct)
+    for client in clients:
+        client.submit(summary)
+    deadline = time.perf_counter() + args.ack_timeout * 3 + 2
+    while len(direct) - before < args.nodes and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    fallback = len(direct) - before
+    for client in clients:
+        await client.stop()
+
+    rtts = [r for c in clients for r in c.rtts]
+    return {
+        "nodes": args.nodes,
+        "messages": total,
+        "seconds": elapsed,
+        "datagrams_per_s": gateway.received / elapsed,
+        "received": gateway.received,
+        "accepted": gateway.accepted,
+        "duplicates": gateway.duplicates,
+        "injected": sum(c.injected for c in clients),
+        "resent": resent,
+        "batches": uploader.batches,
+        "rows": uploader.rows,
+        "unique_rows": len(uploader.keys),
+        "direct_during_load": before,
+        "rtt_p50_ms": _percentile(rtts, 0.5),
+        "rtt_p99_ms": _percentile(rtts, 0.99),
+        "fallback": fallback,
+        "gateway_down_nodes": sum(1 for c in clients if not c.gateway_up),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以 loopback UDP 測試閘道吞吐量、去重與節點改回直接上傳")
+    parser.add_argument("--nodes", type=int, default=50, help="模擬節點數")
+    parser.add_argument("--messages", type=int, default=200, help="每個節點送出的摘要數")
+    parser.add_argument("--dup", type=float, default=0.05, help="刻意重送同一封包的比例")
+    parser.add_argument("--batch", type=int, default=50, help="閘道每批筆數")
+    parser.add_argument("--ack-timeout", type=float, default=0.5, help="節點等待確認的秒數")
+    parser.add_argument("--port", type=int, default=15684, help="閘道 UDP 連接埠")
+    args = parser.parse_args()
+
+    r = asyncio.run(_bench(args))
+    print(f"{r['nodes']} 個節點共 {r['messages']} 筆，{r['seconds']:.2f} s，閘道收 {r['datagrams_per_s']:.0f} 封包/秒")
+    print(f"收到 {r['received']}、接受 {r['accepted']}、判定重複 {r['duplicates']}"
+          f"（刻意重送 {r['injected']}、逾時重送 {r['resent']}）")
+    print(f"上游 {r['batches']} 批、{r['rows']} 筆（不重複 {r['unique_rows']}），負載期間直接上傳 {r['direct_during_load']} 筆")
+    print(f"確認往返 p50 {r['rtt_p50_ms']} ms、p99 {r['rtt_p99_ms']} ms")
+    print(f"閘道關閉後改為直接上傳 {r['fallback']}/{r['nodes']} 筆，判定閘道離線的節點 {r['gateway_down_nodes']}")
+
+
+if __name__ == "__main__":
+    main()
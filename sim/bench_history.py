@@ -0,0 +1,154 @@
+'''
+雙緩衝上傳視窗的基準測試（在主機上以實際時間執行）
+
+FarmHistoryData 以兩個視窗輪替：寫入只碰進行中的視窗，swap() 只交換參照，
+讀取者直接彙總凍結的視窗。這裡量測：
+    - swap() 的耗時與「讀取者自己複製一份陣列」的耗時（不同視窗大小）
+    - 凍結視窗的彙總吞吐量
+    - 寫入執行緒持續寫入與交換、多個讀取執行緒同時彙總時，寫入速度與讀取吞吐量，
+      並和「一把鎖 + 交換時複製快照」的做法比較；每個視窗寫入同一個值，彙總結果不是整數就代表讀到混雜的內容
+      （另跑一次不檢查 generation 的讀取，確認這個檢查確實必要）
+
+    python -m sim.bench_history
+    python -m sim.bench_history --seconds 3 --readers 4
+'''
+import argparse
+import threading
+import time
+from array import array
+from typing import List
+
+from sim import env
+env.install_hardware()
+env.load_config()
+
+from core.controller import FarmHistoryData, HistoryWindow  # noqa: E402
+from core.reading import Reading  # noqa: E402
+
+_FIELDS = ("temperature", "humidity", "turbidity_percent", "tds_value", "water_level_raw", "water_level_low")
+
+
+def _reading(value: float) -> Reading:
+    rec = Reading()
+    rec.temperature = rec.humidity = rec.turbidity_percent = rec.tds_value = rec.water_level_raw = value
+    rec.water_level_low = False
+    return rec
+
+
+def _timeit(fn, repeat: int) -> float:
+    '''每次呼叫的中位數耗時（微秒）'''
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    return samples[len(samples) // 2] / 1000
+
+
+class CopyOnSwapHistory:
+    '''比較用：單一緩衝，寫入與交換共用一把鎖，交換時複製一份快照給讀取者'''
+
+    def __init__(self, capacity: int):
+        self.history = FarmHistoryData(capacity)
+        self.lock = threading.Lock()
+        self.snapshot = self.history.frozen
+
+    def write_data(self, record: Reading):
+        with self.lock:
+            self.history.write_data(record)
+
+    def swap(self):
+        with self.lock:
+            w = self.history.active
+            snapshot = HistoryWindow(self.history.capacity)
+            for f in _FIELDS:
+                setattr(snapshot, f, array(getattr(w, f).typecode, getattr(w, f)))
+            snapshot.count, snapshot.closed_at = w.count, time.time()
+            w.reset()
+        self.snapshot = snapshot
+
+    def summarize_frozen(self) -> dict:
+        return self.snapshot.summarize()
+
+
+def _swap_costs(capacities: List[int], repeat: int):
+    rows = []
+    for capacity in capacities:
+        history = FarmHistoryData(capacity)
+        rec = _reading(1.0)
+        for _ in range(capacity):
+            history.write_data(rec)
+        w = history.active
+        swap_us = _timeit(history.swap, repeat)
+        copy_us = _timeit(lambda: [array(getattr(w, f).typecode, getattr(w, f)) for f in _FIELDS], repeat)
+        for _ in range(capacity):
+            history.write_data(rec)
+        history.swap()
+        summarize_us = _timeit(history.summarize_frozen, max(10, repeat // max(1, capacity // 12)))
+        rows.append((capacity, swap_us, copy_us, summarize_us))
+    return rows
+
+
+def _concurrent(mode: str, capacity: int, readers: int, seconds: float) -> dict:
+    history = CopyOnSwapHistory(capacity) if mode == "copy" else FarmHistoryData(capacity)
+    if mode == "unchecked":
+        summarize = lambda: history.frozen.summarize()  # noqa: E731  不檢查 generation，示範會讀到什麼
+    else:
+        summarize = history.summarize_frozen
+    stop = threading.Event()
+    writes = [0]
+    reads = [0] * readers
+    torn = [0] * readers
+
+    def writer():
+        window = 0
+        rec = _reading(0.0)
+        while not stop.is_set():
+            window += 1
+            rec.temperature = float(window % 1000)  # float32 可精確表示，同一視窗的平均必為整數
+            for _ in range(capacity):
+                history.write_data(rec)
+            history.swap()
+            writes[0] += capacity
+
+    def reader(k: int):
+        while not stop.is_set():
+            avg = summarize()["avg_temperature"] or 0.0
+            if avg != int(avg):
+                torn[k] += 1
+            reads[k] += 1
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(k,)) for k in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {"writes": writes[0] / seconds, "reads": sum(reads) / seconds, "torn": sum(torn)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量測雙緩衝視窗的交換成本與讀取吞吐量")
+    parser.add_argument("--capacities", default="12,120,1200,12000", help="視窗大小（逗號分隔）")
+    parser.add_argument("--repeat", type=int, default=2000, help="單項量測重複次數")
+    parser.add_argument("--readers", type=int, default=3, help="同時彙總的讀取執行緒數")
+    parser.add_argument("--window", type=int, default=12, help="並行測試的視窗大小（DATA_UPLOAD_INTERVALS）")
+    parser.add_argument("--seconds", type=float, default=2.0, help="並行測試每種做法的秒數")
+    args = parser.parse_args()
+
+    print("視窗大小 | swap() | 讀取者複製一份 | 彙總凍結視窗")
+    for capacity, swap_us, copy_us, summarize_us in _swap_costs([int(c) for c in args.capacities.split(",")],
+                                                                args.repeat):
+        print(f"{capacity:>8} | {swap_us:6.2f} µs | {copy_us:10.2f} µs | {summarize_us:10.1f} µs")
+
+    labels = {"copy": "鎖 + 交換時複製", "double": "雙緩衝", "unchecked": "雙緩衝（不檢查 generation）"}
+    for mode, label in labels.items():
+        alone = _concurrent(mode, args.window, 0, args.seconds)
+        r = _concurrent(mode, args.window, args.readers, args.seconds)
+        print(f"[{label}] 只有寫入: {alone['writes']:,.0f} 筆/s；{args.readers} 個讀取者同時彙總: 寫入 "
+              f"{r['writes']:,.0f} 筆/s、讀取 {r['reads']:,.0f} 次/s、讀到混雜內容 {r['torn']} 次")
+
+if __name__ == "__main__":
+    main()
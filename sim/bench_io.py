@@ -0,0 +1,154 @@
+'''
+I/O 工作執行緒基準測試（在主機上以實際時間執行）
+
+模擬控制迴圈以固定週期取樣並寫 trace 紀錄檔（flash 寫入有延遲），同時背景定期做 NTP 校時與 DNS 查詢，
+分別在「全部在事件迴圈上同步執行」與「交給 IOWorker」兩種模式下量測控制迴圈的抖動與 I/O 吞吐量：
+
+    python -m sim.bench_io
+    python -m sim.bench_io --seconds 10 --flash-ms 30 --ntp-ms 500
+'''
+import argparse
+import asyncio
+import time
+from typing import List
+
+from sim import env
+env.install_hardware()
+
+from core.io_worker import IOWorker  # noqa: E402
+from core.loop_monitor import LoopMonitor  # noqa: E402
+from core.trace import TraceRecorder, SENSOR  # noqa: E402
+from sim import hardware  # noqa: E402
+
+
+class SlowStream:
+    '''每次寫入都會卡住一段時間的檔案（模擬 flash 寫入）'''
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.bytes = 0
+        self.writes = 0
+
+    def write(self, data):
+        time.sleep(self.delay)
+        self.bytes += len(data)
+        self.writes += 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _resolve(delay: float):
+    '''模擬同步的 DNS 查詢'''
+    time.sleep(delay)
+    return [(2, 1, 0, "", ("127.0.0.1", 80))]
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def _bench(use_worker: bool, args) -> dict:
+    logger = env.NullLogger()
+    worker = None
+    if use_worker:
+        worker = IOWorker(logger, capacity=args.queue)
+        worker.start()
+    monitor = LoopMonitor()
+    monitor.start(logger, interval_ms=10, stall_ms=args.period_ms, top_n=3)
+
+    stream = SlowStream(args.flash_ms / 1000)
+    recorder = TraceRecorder(stream, buffers=4 if use_worker else 1)
+    recorder.worker = worker
+    hardware.ntp_delay = args.ntp_ms / 1000
+    net_ops = 0
+    net_errors = 0
+    stop = time.perf_counter() + args.seconds
+
+    async def network():
+        nonlocal net_ops, net_errors
+        i = 0
+        while time.perf_counter() < stop:
+            await asyncio.sleep(args.io_interval_ms / 1000)
+            fn, arg = (hardware.settime, ()) if i % 2 == 0 else (_resolve, (args.dns_ms / 1000,))
+            i += 1
+            try:
+                if worker is not None:
+                    await worker.call(fn, *arg)
+                else:
+                    fn(*arg)
+                net_ops += 1
+            except Exception:
+                net_errors += 1
+
+    net_task = asyncio.create_task(network())
+    period = args.period_ms / 1000
+    lateness = []
+    ticks = 0
+    start = time.perf_counter()
+    next_tick = start
+    while time.perf_counter() < stop:
+        next_tick += period
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lateness.append(max(0.0, time.perf_counter() - next_tick) * 1000)
+        for _ in range(args.records):
+            recorder.record(SENSOR, 0, 1.0)
+        ticks += 1
+    elapsed = time.perf_counter() - start
+
+    await net_task
+    await recorder.close()
+    await monitor.stop()
+    if worker is not None:
+        worker.stop()
+    hardware.ntp_delay = 0.0
+    return {
+        "mode": "worker" if use_worker else "inline",
+        "ticks": ticks,
+        "expected_ticks": int(args.seconds / period),
+        "jitter_p50_ms": _percentile(lateness, 0.5),
+        "jitter_p99_ms": _percentile(lateness, 0.99),
+        "jitter_max_ms": max(lateness) if lateness else 0.0,
+        "loop_max_lag_ms": monitor.max_lag_ms,
+        "flash_writes": stream.writes,
+        "trace_dropped": recorder.dropped,
+        "net_ops": net_ops,
+        "net_errors": net_errors,
+        "io_ops_per_s": (stream.writes + net_ops) / elapsed,
+        "worker": worker.report() if worker is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較有無 I/O 工作執行緒時的控制迴圈抖動與 I/O 吞吐量")
+    parser.add_argument("--seconds", type=float, default=5.0, help="每種模式執行的秒數")
+    parser.add_argument("--period-ms", type=int, default=50, help="控制迴圈週期")
+    parser.add_argument("--records", type=int, default=20, help="每回合寫入的 trace 筆數")
+    parser.add_argument("--flash-ms", type=float, default=20.0, help="每次 flash 寫入的阻塞時間")
+    parser.add_argument("--ntp-ms", type=float, default=300.0, help="NTP 校時的阻塞時間")
+    parser.add_argument("--dns-ms", type=float, default=80.0, help="DNS 查詢的阻塞時間")
+    parser.add_argument("--io-interval-ms", type=int, default=500, help="網路操作的間隔")
+    parser.add_argument("--queue", type=int, default=8, help="IOWorker 佇列上限")
+    args = parser.parse_args()
+
+    for use_worker in (False, True):
+        r = asyncio.run(_bench(use_worker, args))
+        print(f"[{r['mode']}] 控制回合 {r['ticks']}/{r['expected_ticks']}，"
+              f"抖動 p50 {r['jitter_p50_ms']:.1f} ms、p99 {r['jitter_p99_ms']:.1f} ms、最大 {r['jitter_max_ms']:.1f} ms，"
+              f"迴圈最大延遲 {r['loop_max_lag_ms']} ms")
+        print(f"[{r['mode']}] flash 寫入 {r['flash_writes']} 次（trace 丟棄 {r['trace_dropped']} 筆）、網路操作 {r['net_ops']} 次（失敗 {r['net_errors']}），"
+              f"I/O 吞吐 {r['io_ops_per_s']:.1f} 次/秒")
+        if r["worker"]:
+            print(f"[{r['mode']}] 工作執行緒: {r['worker']}")
+
+
+if __name__ == "__main__":
+    main()
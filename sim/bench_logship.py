@@ -0,0 +1,172 @@
+'''
+log 回傳基準測試（在主機上以虛擬時間執行）
+
+讓 FarmController 在模擬硬體上跑一段時間（感測值隨機跳動、偶爾讀取失敗，製造警告與錯誤），
+攔下每次上傳的請求內容，量測 log 附件的大小、壓縮比、每批壓縮耗時，以及有無附件的請求大小差異：
+
+    python -m sim.bench_logship
+    python -m sim.bench_logship --cycles 5000 --budget 512
+'''
+import argparse
+import random
+import time
+import zlib
+from typing import List
+
+from sim import env
+env.install_hardware()
+
+from sim import clock as vclock  # noqa: E402
+from core.uploader import HEALTHY  # noqa: E402
+from core.log_shipper import LEVELS  # noqa: E402
+
+
+class _Sink:
+    '''代替 WebhookDestination，只記下請求內容（每次都立即送達，上傳排程器看到的統計值一直良好）'''
+
+    def __init__(self, name: str, logs: bool):
+        self.name = name
+        self.logs = logs
+        self.batch = False
+        self.state = HEALTHY
+        self.backlog = 0
+        self.success_rate = 1.0
+        self.avg_latency_ms = None
+        self.bodies: List[bytes] = []
+
+    def submit(self, body: bytes, receipt=None):
+        self.bodies.append(body)
+        if receipt is not None:
+            receipt.done(True)
+
+    def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def report(self) -> dict:
+        return {"requests": len(self.bodies)}
+
+
+def _ratio_by_batch(lines: List[bytes], sizes) -> dict:
+    '''把全部 log 依原文大小切批，計算各批次大小下的壓縮比'''
+    result = {}
+    for size in sizes:
+        raw_total = packed_total = 0
+        batch, n = [], 0
+        for line in lines + [None]:
+            if line is None or (n + len(line) + 1 > size and batch):
+                raw = b"\n".join(batch)
+                raw_total += len(raw)
+                packed_total += len(zlib.compress(raw))
+                batch, n = [], 0
+            if line is not None:
+                batch.append(line)
+                n += len(line) + 1
+        result[size] = raw_total / packed_total if packed_total else 0.0
+    return result
+
+
+def _bench(args) -> dict:
+    config = env.load_config({
+        "LOG_SHIP_ENABLED": True, "LOG_SHIP_BUDGET": args.budget, "LOG_SHIP_LEVEL": args.level,
+        "LOG_SHIP_IDLE_INTERVAL": args.idle, "STATUS_SERVER_ENABLED": False, "IO_WORKER_ENABLED": False,
+        "HISTORY_ENABLED": False, "TRACE_ENABLED": False
+    })
+    from core.controller import FarmController
+    random.seed(args.seed)
+    plain, with_logs = _Sink("plain", False), _Sink("logs", True)
+    lines: List[bytes] = []
+    take_ms: List[float] = []
+
+    async def main():
+        controller = FarmController(pins=env.pins_from_config(config), logger=env.NullLogger())
+        controller.uploader.destinations = [plain, with_logs]
+        shipper = controller.log_shipper
+        add, take = shipper.add, shipper.take
+
+        def recording_add(level, message):
+            add(level, message)
+            if LEVELS.index(level) >= shipper.min_level:
+                lines.append(f"{int(time.time())} {level[0]} {message}".encode())
+
+        def timed_take():
+            start = time.perf_counter()
+            batch = take()
+            take_ms.append((time.perf_counter() - start) * 1000)
+            return batch
+        shipper.add, shipper.take = recording_add, timed_take
+
+        dht = controller.dht11.sensor
+        adcs = [s._adc for s in (controller.turbidity_sensor, controller.tds_sensor, controller.water_level_sensor)]
+        one_cycle = controller._one_cycle
+        count = 0
+
+        async def noisy_cycle():
+            nonlocal count
+            if count >= args.cycles:
+                raise KeyboardInterrupt
+            count += 1
+            dht.temp = random.choice([24, 26, 28, 36]) if random.random() < 0.2 else 25
+            dht.humi = random.randint(30, 70)
+            dht.measure_delay = 0.0
+            for adc in adcs:
+                adc.reading = random.randint(800, 3500)
+            fail = random.random() < args.fail
+            original = dht.measure
+            if fail:
+                def broken():
+                    raise OSError("DHT timeout")
+                dht.measure = broken
+            try:
+                return await one_cycle()
+            finally:
+                dht.measure = original
+        controller._one_cycle = noisy_cycle
+        await controller.run()
+        return shipper.report()
+
+    report = vclock.run(main())
+    standalone = [b for b in with_logs.bodies if b.startswith(b'{"logs"')]
+    uploads = [b for b in with_logs.bodies if not b.startswith(b'{"logs"')]
+    piggyback = [len(b) - len(p) for b, p in zip(uploads, plain.bodies)]
+    return {
+        "cycles": args.cycles,
+        "report": report,
+        "uploads": len(plain.bodies),
+        "summary_bytes": sum(len(b) for b in plain.bodies) / max(1, len(plain.bodies)),
+        "piggyback_avg": sum(piggyback) / max(1, len(piggyback)),
+        "piggyback_max": max(piggyback) if piggyback else 0,
+        "standalone": len(standalone),
+        "standalone_avg": sum(len(b) for b in standalone) / max(1, len(standalone)),
+        "take_avg_ms": sum(take_ms) / max(1, len(take_ms)),
+        "take_max_ms": max(take_ms) if take_ms else 0.0,
+        "ratios": _ratio_by_batch(lines, (256, 512, 1024, 2048, 4096)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量測 log 回傳的壓縮比與每次上傳的額外成本")
+    parser.add_argument("--cycles", type=int, default=2000, help="控制迴圈回合數")
+    parser.add_argument("--budget", type=int, default=768, help="每批 log 的編碼後位元組上限")
+    parser.add_argument("--level", default="INFO", help="最低保存等級")
+    parser.add_argument("--idle", type=int, default=60, help="空閒時單獨送 log 的間隔（秒），0 為關閉")
+    parser.add_argument("--fail", type=float, default=0.02, help="DHT 讀取失敗的比例")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    r = _bench(args)
+    rep = r["report"]
+    print(f"{r['cycles']} 回合，保存 {rep['captured']} 筆 log，送出 {rep['shipped']} 筆（{rep['batches']} 批），"
+          f"板上剩 {rep['pending']}，丟棄 {rep['dropped']}")
+    print(f"摘要請求平均 {r['summary_bytes']:.0f} bytes，附帶 log 後平均多 {r['piggyback_avg']:.0f} bytes"
+          f"（最多 {r['piggyback_max']}，預算 {args.budget}），共 {r['uploads']} 次上傳")
+    print(f"空閒時單獨送出 {r['standalone']} 批，平均 {r['standalone_avg']:.0f} bytes")
+    print(f"壓縮後含 base64 的整體壓縮比 {rep['ratio']}，每批打包耗時平均 {r['take_avg_ms']:.2f} ms、"
+          f"最多 {r['take_max_ms']:.2f} ms（主機）")
+    print("zlib 壓縮比 vs 批次原文大小: " + "、".join(f"{k} B: {v:.2f}" for k, v in r["ratios"].items()))
+
+
+if __name__ == "__main__":
+    main()
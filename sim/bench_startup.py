@@ -0,0 +1,155 @@
+'''
+開機延遲基準測試（在主機上以虛擬時間執行）
+
+模擬斷電重開：WiFi 要過一段時間才連得上、NTP 校時前系統時間停在 2000 年，
+比較「先等網路再開始監測」（舊流程）與「網路在背景連線、監測立即開始」兩種啟動方式的
+開機到第一次讀值、第一次控制執行器、WiFi 連線、校時、第一次上傳的時間，
+並檢查校時前產生的摘要與歷史紀錄是否補上了正確時間：
+
+    python -m sim.bench_startup
+    python -m sim.bench_startup --wifi-delay 40 --ntp-delay 2
+'''
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from sim import env
+env.install_hardware()
+
+from sim import clock as vclock  # noqa: E402
+from core import compat, http_client  # noqa: E402
+from core.metrics import startup  # noqa: E402
+
+MILESTONES = ("first_reading", "first_actuation", "wifi_connected", "time_synced", "first_upload")
+UNSYNCED_OFFSET = -(10 ** 9)  # 把 Unix 時間撥回 1990 年前後，模擬 RTC 尚未校時
+
+
+def _scenario(args, background: bool, root: str) -> dict:
+    os.makedirs(root)
+    config = env.load_config({
+        "STATUS_SERVER_ENABLED": False, "IO_WORKER_ENABLED": False, "TRACE_ENABLED": False,
+        "LOG_SHIP_ENABLED": False, "GATEWAY_MODE": "off", "HISTORY_ENABLED": True, "HISTORY_DIR": f"{root}/default",
+        "LOOP_INTERVAL": args.interval, "DATA_UPLOAD_INTERVALS": args.upload_every
+    })
+    from core.controller import FarmController
+    from core.history_store import HistoryStore
+    ntptime = sys.modules["ntptime"]
+    settime = ntptime.settime
+    posted = []
+
+    def unsynced_settime():
+        settime()
+        compat.EPOCH_OFFSET = saved_offset  # 校時成功，Unix 時間恢復正確
+
+    async def fake_post(url, body, timeout=10.0, content_type="application/json", worker=None):
+        await asyncio.sleep(args.post_latency)
+        if not wlan.connected:
+            raise OSError("network unreachable")
+        posted.append(body)
+        return 200
+
+    saved_offset = compat.EPOCH_OFFSET
+    compat.EPOCH_OFFSET = UNSYNCED_OFFSET
+    ntptime.settime = unsynced_settime
+    original_post = http_client.post
+    http_client.post = fake_post
+
+    async def main():
+        nonlocal wlan
+        startup.marks.clear()
+        startup.t0 = compat.ticks_ms()
+        controller = FarmController(pins=env.pins_from_config(config), logger=env.NullLogger())
+        controller.history_store.close()
+        controller.history_store = HistoryStore(root=root, capacity=config.HISTORY_CAPACITY)  # 每種啟動方式各用一個目錄
+        wlan = controller.wifi.wlan
+        wlan.connected = False
+
+        async def link_up():
+            await asyncio.sleep(args.wifi_delay)
+            wlan.connected = True
+        link = asyncio.create_task(link_up())
+
+        one_cycle = controller._one_cycle
+        count = 0
+
+        async def counted_cycle():
+            nonlocal count
+            if count >= args.cycles:
+                raise KeyboardInterrupt
+            count += 1
+            return await one_cycle()
+        controller._one_cycle = counted_cycle
+
+        if not background:
+            # 舊流程：先等第一次連線（與校時）完成，才開始監測
+            await controller.init_network()
+            controller._wifi_task = asyncio.create_task(controller.wifi.keep_connected())
+        await controller.run()
+        link.cancel()
+        report = controller.history_store.report()
+        store = HistoryStore(root=root, capacity=config.HISTORY_CAPACITY)  # 關閉後重新開啟，確認寫進檔案的內容
+        rows = store.read("cycle", 0, None, 10000)
+        store.close()
+        stamps = sorted({json.loads(body)["timestamp"] for body in posted})
+        seconds = [time.mktime(time.strptime(t, "%Y-%m-%d %H:%M:%S")) for t in stamps]
+        return {
+            "gaps": sorted({int(b - a) for a, b in zip(seconds, seconds[1:])}),
+            "marks": {name: startup.marks[name][0] / 1000 for name in MILESTONES if name in startup.marks},
+            "uploads": len(posted),
+            "history": len(rows),
+            "history_report": report,
+            "first_ts": rows[0]["ts"] if rows else None,
+            "last_ts": rows[-1]["ts"] if rows else None,
+        }
+
+    wlan = None
+    clock = vclock.VirtualClock()
+    base = time.time()
+    real_time = time.time
+    real_localtime = time.localtime
+    time.time = lambda: base + clock.now  # 系統時間也跟著虛擬時鐘走，才能檢查補上的時間
+    time.localtime = lambda secs=None: real_localtime(time.time() if secs is None else secs)
+    hardware_delay = sys.modules["sim.hardware"].ntp_delay
+    sys.modules["sim.hardware"].ntp_delay = args.ntp_delay
+    try:
+        return vclock.run(main(), clock)
+    finally:
+        time.time, time.localtime = real_time, real_localtime
+        compat.EPOCH_OFFSET = saved_offset
+        ntptime.settime = settime
+        http_client.post = original_post
+        sys.modules["sim.hardware"].ntp_delay = hardware_delay
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較先等網路與背景連線兩種啟動方式的開機延遲")
+    parser.add_argument("--wifi-delay", type=float, default=25.0, help="開機後幾秒 WiFi 才連得上")
+    parser.add_argument("--ntp-delay", type=float, default=1.0, help="NTP 校時耗時（秒）")
+    parser.add_argument("--post-latency", type=float, default=0.3, help="每次上傳耗時（秒）")
+    parser.add_argument("--interval", type=float, default=5, help="LOOP_INTERVAL（秒）")
+    parser.add_argument("--upload-every", type=int, default=3, help="DATA_UPLOAD_INTERVALS")
+    parser.add_argument("--cycles", type=int, default=30, help="每種啟動方式跑幾回合")
+    args = parser.parse_args()
+
+    print(f"WiFi 開機 {args.wifi_delay:.0f} 秒後才連得上，NTP 校時 {args.ntp_delay:.1f} 秒")
+    tmp = tempfile.TemporaryDirectory()
+    for background in (False, True):
+        label = "背景連線" if background else "先等網路"
+        r = _scenario(args, background, f"{tmp.name}/{'background' if background else 'wait'}")
+        marks = "、".join(f"{name} {r['marks'][name]:.1f}s" if name in r["marks"] else f"{name} -"
+                         for name in MILESTONES)
+        print(f"[{label}] {marks}")
+        rep = r["history_report"]
+        span = None if r["first_ts"] is None else r["last_ts"] - r["first_ts"]
+        print(f"[{label}] 上傳 {r['uploads']} 次；歷史紀錄 {r['history']} 筆（略過 {rep['skipped']}），"
+              f"第一筆到最後一筆相隔 {span} 秒（{args.cycles} 回合 × {args.interval:g} 秒）")
+        print(f"[{label}] 上傳的摘要時間間隔 {r['gaps']} 秒（應為 {args.interval * args.upload_every:g} 秒）")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
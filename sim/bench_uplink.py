@@ -0,0 +1,192 @@
+'''
+上傳排程基準測試（在主機上以虛擬時間執行）
+
+以同一條 WiFi 訊號軌跡（良好 / 邊緣 / 很差三種狀態輪替，RSSI 隨機跳動）驅動 FarmController，
+比較「固定每 DATA_UPLOAD_INTERVALS 回合上傳」與「依連線品質排程、合併上傳」兩種方式的
+請求成功率、每送達一份摘要花掉的空中時間、資料送達時的年齡與遺失筆數：
+
+    python -m sim.bench_uplink
+    python -m sim.bench_uplink --hours 24 --seed 3 --set UPLOAD_MAX_AGE=300
+
+連線模型：請求失敗率隨 RSSI 以 logistic 曲線上升（約 -80 dBm 時一半失敗），
+建立連線的時間與每 byte 的傳輸時間也隨訊號變差而增加；失敗時一半是逾時、一半是連線被中斷
+'''
+import argparse
+import asyncio
+import json
+import math
+import random
+from typing import List
+
+from sim import env
+env.install_hardware()
+
+from sim import clock as vclock  # noqa: E402
+from core import http_client  # noqa: E402
+
+# 狀態: (平均 RSSI, 標準差, 平均持續秒數)
+LINK_STATES = {
+    "good": (-58, 4, 900),
+    "marginal": (-77, 3, 300),
+    "bad": (-86, 3, 120),
+}
+TRANSITIONS = {"good": ("marginal", "bad"), "marginal": ("good", "bad"), "bad": ("marginal", "good")}
+
+
+class LinkModel:
+    '''以虛擬時間為準的 WiFi 訊號與請求結果模型'''
+
+    def __init__(self, seed: int, hours: float):
+        rng = random.Random(seed)
+        self.segments = []  # (開始秒數, 狀態)
+        t, state = 0.0, "good"
+        while t < hours * 3600 + 3600:
+            self.segments.append((t, state))
+            t += rng.expovariate(1 / LINK_STATES[state][2])
+            state = rng.choice(TRANSITIONS[state])
+        self.seed = seed
+
+    def reset(self):
+        self.rng = random.Random(self.seed + 1)
+
+    def state(self, t: float) -> str:
+        lo, hi = 0, len(self.segments)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.segments[mid][0] <= t:
+                lo = mid
+            else:
+                hi = mid
+        return self.segments[lo][1]
+
+    def rssi(self, t: float) -> int:
+        mean, std, _ = LINK_STATES[self.state(t)]
+        return int(self.rng.gauss(mean, std))
+
+    def request(self, rssi: int, size: int, timeout: float) -> tuple:
+        '''返回 (是否成功, 耗時秒數)'''
+        p_fail = 1 / (1 + math.exp((rssi + 80) / 2.5))
+        seconds = 0.25 + 3.0 * p_fail + size * 0.00004 * (1 + 8 * p_fail)
+        if self.rng.random() < p_fail:
+            return False, timeout if self.rng.random() < 0.5 else seconds
+        return True, min(seconds, timeout)
+
+
+def _scenario(args, link: LinkModel, scheduled: bool) -> dict:
+    overrides = {
+        "STATUS_SERVER_ENABLED": False, "IO_WORKER_ENABLED": False, "TRACE_ENABLED": False,
+        "HISTORY_ENABLED": False, "LOG_SHIP_ENABLED": False, "GATEWAY_MODE": "off",
+        "LOOP_INTERVAL": args.interval, "DATA_UPLOAD_INTERVALS": args.upload_every,
+        "UPLOAD_SCHEDULER_ENABLED": True,
+        "WEBHOOK_DESTINATIONS": [{"name": "server", "url": "http://127.0.0.1/ingest", "timeout": args.timeout,
+                                  "queue": 20, "retries": 5, "backoff": 2, "backoff_max": 60,
+                                  "batch": True}],
+    }
+    overrides.update(env.parse_overrides(args.set))
+    config = env.load_config(overrides)
+    from core.controller import FarmController
+    link.reset()
+    clock = vclock.VirtualClock()
+    attempts: List[tuple] = []  # (成功, 耗時, bytes)
+    ages: List[float] = []
+
+    async def fake_post(url, body, timeout=10.0, content_type="application/json", worker=None):
+        ok, seconds = link.request(link.rssi(clock.now), len(body), timeout)
+        await asyncio.sleep(seconds)
+        attempts.append((ok, seconds, len(body)))
+        if not ok:
+            raise asyncio.TimeoutError if seconds >= timeout else OSError("connection reset")
+        payload = json.loads(body)
+        for summary in payload.get("readings", (payload,)):
+            ages.append(clock.now - summary["bench_t"])
+        return 200
+
+    original_post = http_client.post
+    http_client.post = fake_post
+
+    async def main():
+        controller = FarmController(pins=env.pins_from_config(config), logger=env.NullLogger())
+        if not scheduled:
+            controller.link_scheduler = None
+        wlan = controller.wifi.wlan
+        wlan.status = lambda param=None: link.rssi(clock.now) if param == "rssi" else 1010
+        summarize = controller.history.summarize_and_clear
+        created = 0
+
+        def stamped():
+            nonlocal created
+            created += 1
+            summary = summarize()
+            summary["bench_t"] = clock.now  # 產生時間，用來計算送達時的資料年齡
+            return summary
+        controller.history.summarize_and_clear = stamped
+
+        one_cycle = controller._one_cycle
+        end = args.hours * 3600
+
+        async def timed_cycle():
+            if clock.now >= end:
+                raise KeyboardInterrupt
+            return await one_cycle()
+        controller._one_cycle = timed_cycle
+        await controller.run()
+        dest = controller.uploader.destinations[0]
+        return {
+            "created": created,
+            "dest_dropped": dest.dropped,
+            "scheduler": controller.link_scheduler.report() if controller.link_scheduler is not None else None,
+        }
+
+    try:
+        result = vclock.run(main(), clock)
+    finally:
+        http_client.post = original_post
+    ok = [a for a in attempts if a[0]]
+    airtime = sum(a[1] for a in attempts)
+    ages.sort()
+    result.update({
+        "attempts": len(attempts),
+        "success_rate": len(ok) / len(attempts) if attempts else 0.0,
+        "airtime": airtime,
+        "delivered": len(ages),
+        "airtime_per_summary": airtime / len(ages) if ages else float("inf"),
+        "bytes": sum(a[2] for a in attempts),
+        "age_p50": ages[len(ages) // 2] if ages else None,
+        "age_max": ages[-1] if ages else None,
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較固定排程與依連線品質排程的上傳成功率與空中時間")
+    parser.add_argument("--hours", type=float, default=6, help="模擬時數")
+    parser.add_argument("--interval", type=float, default=10, help="LOOP_INTERVAL（秒）")
+    parser.add_argument("--upload-every", type=int, default=6, help="DATA_UPLOAD_INTERVALS")
+    parser.add_argument("--timeout", type=float, default=5, help="單次請求逾時（秒）")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--set", nargs="*", metavar="KEY=VALUE", help="覆寫設定，例如 UPLOAD_RSSI_MIN=-72")
+    args = parser.parse_args()
+
+    link = LinkModel(args.seed, args.hours)
+    share = {}
+    for start, state in link.segments:
+        if start < args.hours * 3600:
+            share[state] = share.get(state, 0) + 1
+    print(f"模擬 {args.hours:g} 小時，訊號狀態切換 {sum(share.values())} 次（" +
+          "、".join(f"{k} {v} 段" for k, v in share.items()) + "）")
+    for scheduled in (False, True):
+        r = _scenario(args, link, scheduled)
+        label = "依連線品質" if scheduled else "固定排程"
+        lost = r["created"] - r["delivered"]
+        print(f"[{label}] 產生 {r['created']} 份摘要，送達 {r['delivered']}（遺失/未送 {lost}），"
+              f"請求 {r['attempts']} 次、成功率 {r['success_rate']:.1%}")
+        print(f"[{label}] 空中時間共 {r['airtime']:.0f} 秒，每送達一份 {r['airtime_per_summary']:.2f} 秒，"
+              f"傳送 {r['bytes'] / 1024:.0f} KB；送達時資料年齡中位數 {r['age_p50']:.0f} 秒、最多 {r['age_max']:.0f} 秒")
+        if r["scheduler"] is not None:
+            s = r["scheduler"]
+            print(f"[{label}] 送出 {s['flushes']} 次（合併 {s['coalesced']} 份、強制送出 {s['forced']} 次、"
+                  f"探測 {s['probes']} 次）")
+
+
+if __name__ == "__main__":
+    main()
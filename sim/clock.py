@@ -0,0 +1,78 @@
+'''
+虛擬時間事件迴圈
+asyncio.sleep 不會真的等待：沒有事情可做時直接把虛擬時鐘撥到下一個排程時間，
+讓控制迴圈以 CPU 能跑的最快速度前進；core.compat 的 ticks_ms 也改跟著虛擬時鐘走，
+sim.hardware 模擬的阻塞操作則直接把時鐘撥快
+'''
+import asyncio
+import selectors
+
+from core import compat
+from sim import hardware
+
+
+class VirtualClock:
+    '''只會往前走的虛擬時鐘（秒）'''
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def advance_to(self, t: float):
+        '''撥到時間 t（比現在早則忽略）'''
+        if t > self.now:
+            self.now = t
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    '''沒有 I/O 事件時以推進虛擬時鐘代替等待'''
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self._clock = clock
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            raise RuntimeError("模擬中沒有任何排程或 I/O，程式會永久等待")
+        self._clock.now += timeout
+        return events
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    '''以 VirtualClock 為時間來源的事件迴圈'''
+
+    def __init__(self, clock: VirtualClock = None):
+        self.clock = clock or VirtualClock()
+        super().__init__(selector=_VirtualSelector(self.clock))
+
+    def time(self) -> float:
+        return self.clock.now
+
+
+def run(coro, clock: VirtualClock = None):
+    """以虛擬時間執行 coroutine
+
+    Args:
+        coro: 要執行的 coroutine
+        clock (VirtualClock): 要使用的虛擬時鐘，None 則建立新的
+
+    Returns:
+        coroutine 的回傳值
+    """
+    loop = VirtualTimeLoop(clock)
+    compat.set_clock(loop.clock.time)
+    # 模擬的阻塞操作改成直接撥快時鐘，事件迴圈監測仍看得到卡頓
+    hardware.set_blocking_sleep(lambda seconds: loop.clock.advance_to(loop.clock.now + seconds))
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        compat.set_clock(None)
+        hardware.set_blocking_sleep(None)
+        asyncio.set_event_loop(None)
+        loop.close()
@@ -0,0 +1,131 @@
+'''
+主機端模擬環境
+讓 core/ 的裝置端程式可以直接在 CPython 上跑：掛上假的硬體模組、載入設定並套用覆寫值
+'''
+import importlib
+import importlib.util
+import os
+import sys
+import types
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PIN_NAMES = {
+    'dht11': "DHT11_PIN",
+    'turbidity': "TURBIDITY_PIN",
+    'tds': "TDS_PIN",
+    'water_level': "WATER_LEVEL_PIN",
+    'rgb_r': "RGB_R_PIN",
+    'rgb_g': "RGB_G_PIN",
+    'rgb_b': "RGB_B_PIN",
+    'buzzer': "BUZZER_PIN",
+    'relay_pump': "RELAY_PUMP_PIN"
+}
+
+
+def install_hardware():
+    '''主機上沒有的 MicroPython 模組以 sim.hardware 代替；沒有 lib/esplog 時也掛上替代的 Logger'''
+    from sim import hardware
+    for name, module in hardware.modules().items():
+        if name in sys.modules:
+            continue
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            sys.modules[name] = module
+    try:
+        importlib.import_module("lib.esplog.core")
+    except ImportError:
+        # lib/esplog 來自其他 repo，不在這個專案裡；模擬只需要它的介面
+        for name in ("lib", "lib.esplog", "lib.esplog.core"):
+            sys.modules[name] = types.ModuleType(name)
+        sys.modules["lib.esplog.core"].Logger = StubLogger
+        sys.modules["lib"].esplog = sys.modules["lib.esplog"]
+        sys.modules["lib.esplog"].core = sys.modules["lib.esplog.core"]
+
+
+_MISSING = object()
+_overridden = {}  # 目前覆寫中的設定 -> 原本的值（原本沒有設定為 _MISSING）
+
+
+def load_config(overrides: Optional[dict] = None):
+    """載入 config（沒有 config.py 時改用 config.example.py）並套用覆寫值
+
+    控制器經由 core.settings 在使用時才讀設定，之後建立的 FarmController 就會用到這次的覆寫值；
+    上一次呼叫的覆寫值會先還原，同一個行程裡連續重播不同設定時互不影響
+
+    Args:
+        overrides (Optional[dict]): 要覆寫的設定，例如 {'TEMP_HIGH': 30}
+
+    Returns:
+        module: config 模組
+    """
+    try:
+        import config
+    except ImportError:
+        spec = importlib.util.spec_from_file_location("config", os.path.join(ROOT, "config.example.py"))
+        config = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(config)
+        sys.modules["config"] = config
+    for key, value in _overridden.items():
+        if value is _MISSING:
+            delattr(config, key)
+        else:
+            setattr(config, key, value)
+    _overridden.clear()
+    for key, value in (overrides or {}).items():
+        _overridden.setdefault(key, getattr(config, key, _MISSING))
+        setattr(config, key, value)
+    return config
+
+
+def pins_from_config(config) -> dict:
+    '''依 config 組出 FarmController 需要的 pins'''
+    return {key: getattr(config, name) for key, name in PIN_NAMES.items()}
+
+
+def parse_overrides(items) -> dict:
+    '''把命令列的 KEY=VALUE 轉成 dict（數值、布林、None 會自動轉型）'''
+    import ast
+    result = {}
+    for item in items or ():
+        key, _, text = item.partition("=")
+        try:
+            result[key.strip()] = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            result[key.strip()] = text
+    return result
+
+
+class NullLogger:
+    '''模擬時使用的 logger，介面與 lib.esplog 的 Logger 相同；verbose 時印到終端機'''
+
+    def __init__(self, verbose: bool = False):
+        self.verbose = verbose
+
+    def _log(self, level: str, message: str):
+        if self.verbose:
+            print(f"[{level}] {message}")
+
+    def debug(self, message: str):
+        pass
+
+    def info(self, message: str):
+        self._log("INFO", message)
+
+    def warning(self, message: str):
+        self._log("WARNING", message)
+
+    def error(self, message: str):
+        self._log("ERROR", message)
+
+    def critical(self, message: str):
+        self._log("CRITICAL", message)
+
+
+class StubLogger(NullLogger):
+    '''沒有 lib/esplog 時代替 lib.esplog.core.Logger：建構參數照收，不寫檔，log_to_console 時印到終端機'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(verbose=bool(kwargs.get("log_to_console", False)))
@@ -0,0 +1,160 @@
+'''
+主機模擬用的 MicroPython 硬體模組（machine、dht、network、ntptime）
+只在主機端沒有真正模組時由 sim.env.install_hardware() 掛進 sys.modules，
+讀值預設固定，模擬程式可以直接改屬性或換成重播用的物件。
+會阻塞的操作（DHT 量測、NTP 校時）可設定耗時，用來在模擬中重現事件迴圈卡頓
+'''
+import time
+import types
+
+from core.compat import ticks_ms, ticks_diff
+
+_blocking_sleep = time.sleep
+ntp_delay = 0.0  # settime() 的阻塞時間（秒）
+
+
+def set_blocking_sleep(sleep):
+    '''替換阻塞操作的等待方式（虛擬時間下改成撥快時鐘），None 恢復 time.sleep'''
+    global _blocking_sleep
+    _blocking_sleep = sleep if sleep is not None else time.sleep
+
+
+def block(seconds: float):
+    '''模擬一段會卡住整個程式的同步操作'''
+    if seconds > 0:
+        _blocking_sleep(seconds)
+
+
+class Pin:
+    OUT = 1
+    IN = 0
+
+    def __init__(self, pin_number: int, mode: int = IN):
+        self.pin_number = pin_number
+        self.mode = mode
+        self._value = 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = v
+
+
+class ADC:
+    ATTN_11DB = 3
+    WIDTH_12BIT = 3
+
+    def __init__(self, pin: Pin):
+        self.pin = pin
+        self.reading = 2048
+
+    def atten(self, atten: int):
+        pass
+
+    def width(self, width: int):
+        pass
+
+    def read(self) -> int:
+        return self.reading
+
+
+class PWM:
+    def __init__(self, pin: Pin, freq: int = 1000):
+        self.pin = pin
+        self._freq = freq
+        self._duty = 0
+
+    def freq(self, f=None):
+        if f is None:
+            return self._freq
+        self._freq = f
+
+    def duty(self, d=None):
+        if d is None:
+            return self._duty
+        self._duty = d
+
+    def deinit(self):
+        pass
+
+
+class DHT11:
+    def __init__(self, pin: Pin):
+        self.pin = pin
+        self.temp = 25
+        self.humi = 60
+        self.measure_delay = 0.0
+
+    def measure(self):
+        block(self.measure_delay)
+
+    def temperature(self):
+        return self.temp
+
+    def humidity(self):
+        return self.humi
+
+
+class WLAN:
+    def __init__(self, interface: int):
+        self.interface = interface
+        self.connected = True
+        self.rssi = -55
+        self._active = False
+
+    def active(self, state=None):
+        if state is None:
+            return self._active
+        self._active = state
+
+    def connect(self, ssid: str, password: str):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def isconnected(self) -> bool:
+        return self.connected
+
+    def ifconfig(self):
+        return ("127.0.0.1", "255.0.0.0", "127.0.0.1", "127.0.0.1")
+
+    def status(self, param=None):
+        if param == "rssi":
+            return self.rssi
+        return 1010 if self.connected else 1000
+
+
+class WDT:
+    def __init__(self, id: int = 0, timeout: int = 5000):
+        self.timeout = timeout
+        self.feeds = 0
+        self.last_feed = ticks_ms()
+
+    def feed(self):
+        self.feeds += 1
+        self.last_feed = ticks_ms()
+
+    def expired(self) -> bool:
+        '''真的板子此時已經重開機'''
+        return ticks_diff(ticks_ms(), self.last_feed) > self.timeout
+
+
+def settime():
+    block(ntp_delay)
+
+
+def _module(name: str, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    return module
+
+
+def modules() -> dict:
+    '''建立假的 MicroPython 模組：{模組名稱: 模組物件}'''
+    return {
+        "machine": _module("machine", Pin=Pin, ADC=ADC, PWM=PWM, WDT=WDT),
+        "dht": _module("dht", DHT11=DHT11),
+        "network": _module("network", WLAN=WLAN, STA_IF=0, AP_IF=1),
+        "ntptime": _module("ntptime", settime=settime),
+    }
@@ -0,0 +1,145 @@
+'''
+合成 trace 產生器（在主機上以虛擬時間執行）
+
+沒有板子錄下的 trace 時，用亂數感測值驅動 FarmController 並以 TraceRecorder 記錄，
+產生的檔案可以直接給 sim.replay 重播，用來確認重播結果與「現場」完全一致：
+
+    python -m sim.make_trace trace.bin
+    python -m sim.make_trace trace.bin --cycles 2000 --seed 7
+    python -m sim.replay trace.bin
+
+感測模型：濁度與 TDS 的 ADC 在 1000–3500 之間亂跳（1% 讀取失敗），DHT11 偶爾量測失敗、
+溫溼度在正常與超標之間切換，水位每回合緩慢下降、水泵運轉時上升，會反覆觸發低水位補水
+'''
+import argparse
+import asyncio
+import random
+
+from sim import env
+env.install_hardware()
+
+from core import trace  # noqa: E402
+from sim import clock as vclock  # noqa: E402
+from sim.replay import REPLAY_SETTINGS  # noqa: E402
+
+
+class _NoisyADC:
+    def __init__(self, rng: random.Random, low: int, high: int, fail: float):
+        self._rng = rng
+        self._low = low
+        self._high = high
+        self._fail = fail
+
+    def read(self) -> int:
+        if self._rng.random() < self._fail:
+            raise OSError("ADC 讀取失敗")
+        return self._rng.randint(self._low, self._high)
+
+
+class _TankADC:
+    '''水位：平時緩慢下降，水泵運轉時上升'''
+
+    def __init__(self, rng: random.Random, relay, level: int = 1500):
+        self._rng = rng
+        self._relay = relay
+        self.level = level
+
+    def read(self) -> int:
+        if self._relay.is_on():
+            self.level += 30
+        else:
+            self.level -= self._rng.randint(0, 40)
+        self.level = max(0, min(4095, self.level))
+        return self.level
+
+
+class _NoisyDHT:
+    def __init__(self, rng: random.Random):
+        self._rng = rng
+
+    def measure(self):
+        if self._rng.random() < 0.02:
+            raise OSError("DHT11 量測失敗")
+
+    def temperature(self):
+        return self._rng.choice((24, 25, 36))
+
+    def humidity(self):
+        return self._rng.choice((35, 60, 70))
+
+
+def record(path: str, cycles: int = 500, seed: int = 3) -> int:
+    """產生合成 trace
+
+    設定與 sim.replay 相同（關閉工作執行緒、狀態端點、歷史紀錄與上傳排程），
+    因此同一個程序裡可以接著重播
+
+    Args:
+        path (str): 輸出的紀錄檔
+        cycles (int): 回合數
+        seed (int): 亂數種子
+
+    Returns:
+        int: 寫入的紀錄筆數
+    """
+    config = env.load_config(REPLAY_SETTINGS)
+    from core.controller import FarmController
+    rng = random.Random(seed)
+    recorder = None
+
+    async def main():
+        nonlocal recorder
+        recorder = trace.TraceRecorder.open(path)  # 在虛擬時鐘下建立，ticks 從 0 起算
+        controller = FarmController(pins=env.pins_from_config(config), logger=env.NullLogger())
+        if controller.dht11 is not None:
+            controller.dht11.sensor = _NoisyDHT(rng)
+        if controller.turbidity_sensor is not None:
+            controller.turbidity_sensor._adc = _NoisyADC(rng, 1000, 3500, 0.01)
+        if controller.tds_sensor is not None:
+            controller.tds_sensor._adc = _NoisyADC(rng, 1000, 3500, 0.01)
+        if controller.water_level_sensor is not None:
+            controller.water_level_sensor._adc = _TankADC(rng, controller.relay_pump)
+        recorder.attach(controller)
+        controller.recorder = recorder  # 結束時由 shutdown() 關閉紀錄檔
+
+        async def upload_data(data: dict, *args, **kwargs):
+            pass
+        controller.upload_data = upload_data
+
+        done = asyncio.Event()
+        one_cycle = controller._one_cycle
+        count = 0
+
+        async def counted_cycle():
+            nonlocal count
+            if count >= cycles:
+                done.set()
+                await asyncio.Event().wait()  # 已達回合數，停在這裡等待取消
+            count += 1
+            return await one_cycle()
+        controller._one_cycle = counted_cycle
+
+        task = asyncio.create_task(controller.run())
+        await done.wait()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    vclock.run(main(), vclock.VirtualClock())
+    return recorder.records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以亂數感測值產生可重播的合成 trace")
+    parser.add_argument("output", help="輸出的紀錄檔")
+    parser.add_argument("--cycles", type=int, default=500, help="回合數")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+    records = record(args.output, args.cycles, args.seed)
+    print(f"{args.cycles} 回合、{records} 筆紀錄已寫入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
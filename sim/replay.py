@@ -0,0 +1,256 @@
+'''
+trace 重播工具（在主機上執行）
+
+把板子錄下的 trace（見 core/trace.py）餵給真正的 FarmController，以虛擬時間快轉執行，
+再把重播產生的警示判斷、執行器指令與上傳摘要和紀錄檔逐一比對。
+改閾值或濾波參數時，用 --set 覆寫設定就能在幾秒內看到數週現場資料的結果：
+
+    python -m sim.replay trace.bin
+    python -m sim.replay trace.bin --set TEMP_HIGH=30 --set FAULT_Z_MAX=4.0
+'''
+import argparse
+import asyncio
+import io
+import json
+import math
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from sim import env
+env.install_hardware()
+
+from core import trace  # noqa: E402
+from sim import clock as vclock  # noqa: E402
+
+
+# 工作執行緒以實際時間運作，重播時關閉以維持虛擬時間下的結果可重現；
+# 重播時沒有真的網路，上傳排程器會一直判定連線不佳而合併上傳，也一併關閉
+REPLAY_SETTINGS = {"TRACE_ENABLED": False, "STATUS_SERVER_ENABLED": False, "IO_WORKER_ENABLED": False,
+                   "HISTORY_ENABLED": False, "UPLOAD_SCHEDULER_ENABLED": False}
+
+
+class TraceData:
+    '''解析後的紀錄檔內容'''
+
+    def __init__(self, stream):
+        """從二進位串流解析紀錄檔
+
+        Args:
+            stream: 已開啟的紀錄檔或 io.BytesIO
+        """
+        self.sensors: Dict[int, deque] = {}
+        self.actuators: List[tuple] = []
+        self.cycles: List[int] = []
+        self.summaries: List[tuple] = []
+        self.duration_ms = 0
+        _, self.epoch, self.start_time = trace.read_header(stream)
+        fields = []
+        for kind, channel, ticks, value in trace.iter_records(stream):
+            self.duration_ms = max(self.duration_ms, ticks)
+            if kind == trace.SENSOR:
+                self.sensors.setdefault(channel, deque()).append((ticks, value))
+            elif kind == trace.ACTUATOR:
+                self.actuators.append((channel, value))
+            elif kind == trace.CYCLE:
+                self.cycles.append(int(value))
+            elif kind == trace.SUMMARY:
+                fields.append(value)
+                if channel == len(trace.SUMMARY_FIELDS) - 1:
+                    self.summaries.append(tuple(fields))
+                    fields = []
+
+    @classmethod
+    def open(cls, path: str) -> "TraceData":
+        with open(path, "rb") as f:
+            return cls(f)
+
+
+class _ReplaySource:
+    '''依紀錄順序取出某個感測通道的讀值，並把虛擬時鐘撥到當時的時間'''
+
+    def __init__(self, data: TraceData, channel: int, clock: vclock.VirtualClock, stats: dict):
+        self._queue = data.sensors.get(channel, deque())
+        self._clock = clock
+        self._stats = stats
+
+    def next(self) -> float:
+        if not self._queue:
+            self._stats["underruns"] += 1
+            raise OSError("trace 讀值已用完")
+        ticks, value = self._queue.popleft()
+        self._clock.advance_to(ticks / 1000)
+        if value != value:  # 當時讀取失敗
+            raise OSError("trace 紀錄為讀取失敗")
+        return value
+
+
+class _ReplayADC:
+    def __init__(self, source: _ReplaySource):
+        self._source = source
+
+    def read(self) -> int:
+        return int(self._source.next())
+
+
+class _ReplayDHT:
+    def __init__(self, measure: _ReplaySource, temp: _ReplaySource, humi: _ReplaySource):
+        self._measure = measure
+        self._temp = temp
+        self._humi = humi
+
+    def measure(self):
+        self._measure.next()
+
+    def temperature(self):
+        return self._temp.next()
+
+    def humidity(self):
+        return self._humi.next()
+
+
+def _same(a: float, b: float) -> bool:
+    if a != a or b != b:
+        return a != a and b != b
+    return math.isclose(a, b, rel_tol=1e-4, abs_tol=1e-3)
+
+
+class TraceReplayer:
+    '''
+    以紀錄檔驅動 FarmController 並比對結果
+    '''
+
+    def __init__(self, path: str, overrides: Optional[dict] = None, verbose: bool = False):
+        """重播器的初始化
+
+        Args:
+            path (str): trace 紀錄檔路徑
+            overrides (Optional[dict]): 要覆寫的設定值（例如新的閾值）
+            verbose (bool): 是否印出控制器的 log
+        """
+        self.data = TraceData.open(path)
+        self.overrides = dict(overrides or {})
+        self.verbose = verbose
+
+    def run(self) -> dict:
+        """執行重播
+
+        Returns:
+            dict: 重播結果，包含比對與速度統計
+        """
+        env.install_hardware()
+        settings = dict(self.overrides)
+        settings.update(REPLAY_SETTINGS)
+        config = env.load_config(settings)
+        from core.controller import FarmController
+
+        clock = vclock.VirtualClock()
+        stats = {"underruns": 0}
+        summaries = []
+        total_cycles = len(self.data.cycles)
+
+        async def replay():
+            controller = FarmController(pins=env.pins_from_config(config), logger=env.NullLogger(self.verbose))
+
+            def source(channel):
+                return _ReplaySource(self.data, channel, clock, stats)
+            if controller.dht11 is not None:
+                controller.dht11.sensor = _ReplayDHT(source(trace.CH_DHT_MEASURE), source(trace.CH_TEMP), source(trace.CH_HUMI))
+            if controller.turbidity_sensor is not None:
+                controller.turbidity_sensor._adc = _ReplayADC(source(trace.CH_TURBIDITY_ADC))
+            if controller.tds_sensor is not None:
+                controller.tds_sensor._adc = _ReplayADC(source(trace.CH_TDS_ADC))
+            if controller.water_level_sensor is not None:
+                controller.water_level_sensor._adc = _ReplayADC(source(trace.CH_WATER_ADC))
+
+            # 重播端也用 TraceRecorder 收集結果，與現場紀錄同一套編碼
+            output = io.BytesIO()
+            recorder = trace.TraceRecorder(output)
+            recorder.attach(controller)
+            controller.recorder = recorder
+
+            async def upload_data(data: dict, *args, **kwargs):
+                summaries.append(data)
+            controller.upload_data = upload_data
+
+            done = asyncio.Event()
+            one_cycle = controller._one_cycle
+            count = 0
+
+            async def counted_cycle():
+                nonlocal count
+                if count >= total_cycles:
+                    done.set()
+                    await asyncio.Event().wait()  # 紀錄已播完，停在這裡等待取消
+                count += 1
+                return await one_cycle()
+            controller._one_cycle = counted_cycle
+
+            task = asyncio.create_task(controller.run())
+            await done.wait()
+            recorder.flush()
+            result = output.getvalue()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            return result
+
+        wall_start = time.perf_counter()
+        replayed = vclock.run(replay(), clock)
+        wall = time.perf_counter() - wall_start
+
+        produced = TraceData(io.BytesIO(replayed))
+
+        alert_mismatches = sum(1 for a, b in zip(self.data.cycles, produced.cycles) if a != b)
+        alert_mismatches += abs(len(self.data.cycles) - len(produced.cycles))
+        summary_mismatches = sum(1 for a, b in zip(self.data.summaries, produced.summaries)
+                                 if not all(_same(x, y) for x, y in zip(a, b)))
+        summary_mismatches += abs(len(self.data.summaries) - len(produced.summaries))
+        first_actuator_diff = None
+        for i, (a, b) in enumerate(zip(self.data.actuators, produced.actuators)):
+            if a[0] != b[0] or not _same(a[1], b[1]):
+                first_actuator_diff = i
+                break
+        if first_actuator_diff is None and len(self.data.actuators) != len(produced.actuators):
+            first_actuator_diff = min(len(self.data.actuators), len(produced.actuators))
+
+        trace_seconds = self.data.duration_ms / 1000
+        return {
+            "cycles": len(produced.cycles),
+            "summaries": summaries,
+            "alert_masks": produced.cycles,
+            "alert_mismatches": alert_mismatches,
+            "summary_mismatches": summary_mismatches,
+            "first_actuator_mismatch": first_actuator_diff,
+            "sensor_underruns": stats["underruns"],
+            "trace_seconds": trace_seconds,
+            "wall_seconds": wall,
+            "speedup": trace_seconds / wall if wall > 0 else float("inf"),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以虛擬時間重播 trace 紀錄檔")
+    parser.add_argument("trace", help="trace 紀錄檔（板子上的 TRACE_FILE）")
+    parser.add_argument("--set", action="append", metavar="KEY=VALUE", help="覆寫 config 設定，可重複")
+    parser.add_argument("--verbose", action="store_true", help="印出控制器 log")
+    parser.add_argument("--json", help="把上傳摘要與每回合警示寫成 JSON 檔")
+    args = parser.parse_args()
+
+    overrides = env.parse_overrides(args.set)
+    result = TraceReplayer(args.trace, overrides, verbose=args.verbose).run()
+    print(f"重播 {result['cycles']} 回合、{len(result['summaries'])} 次上傳")
+    print(f"紀錄時間 {result['trace_seconds']:.1f} s，重播耗時 {result['wall_seconds']:.3f} s，"
+          f"加速 {result['speedup']:.0f} 倍")
+    if not overrides:
+        print(f"與現場比對：警示不符 {result['alert_mismatches']} 回合、摘要不符 {result['summary_mismatches']} 筆、"
+              f"執行器指令第一個不符位置 {result['first_actuator_mismatch']}、讀值不足 {result['sensor_underruns']} 次")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"summaries": result["summaries"], "alert_masks": result["alert_masks"]}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
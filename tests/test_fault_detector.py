@@ -0,0 +1,70 @@
+'''
+FaultDetector 的測試（在主機上執行）
+'''
+import random
+
+from sim import env
+env.install_hardware()
+
+from core.fault_detector import OK, OUTLIER, STUCK, ChannelMonitor, FaultDetector  # noqa: E402
+from core.reading import Reading  # noqa: E402
+
+
+def test_level_step_is_absorbed_after_rebaseline():
+    rng = random.Random(1)
+    ch = ChannelMonitor("water_level_raw", 0, 4095, rebaseline=5)
+    for _ in range(100):
+        assert ch.check(1000 + rng.randint(-20, 20)) == OK
+    # 補水：水位跳到 3000，前幾筆離群，之後以新水準為基準
+    flags = [ch.check(3000 + rng.randint(-20, 20)) for _ in range(100)]
+    assert flags[:4] == [OUTLIER] * 4
+    assert flags[4:] == [OK] * 96
+    assert ch.rebaselines == 1
+
+
+def test_single_spike_is_still_an_outlier():
+    rng = random.Random(2)
+    ch = ChannelMonitor("tds_value", 0, 2000, rebaseline=5)
+    for _ in range(100):
+        ch.check(300 + rng.uniform(-5, 5))
+    assert ch.check(1500) == OUTLIER
+    assert ch.check(300) == OK
+    assert ch.rebaselines == 0
+
+
+def test_dry_water_sensor_is_not_stuck():
+    detector = FaultDetector(env.NullLogger(), stuck_samples=30)
+    rec = Reading()
+    for _ in range(100):
+        rec.clear()
+        rec.water_level_raw = 0  # 乾的水位感測器一直讀到 0
+        rec.water_level_low = True
+        detector.screen(rec)
+        assert rec.water_level_raw == 0
+        assert rec.water_level_low is True
+
+
+def test_constant_mid_scale_reading_is_stuck():
+    ch = ChannelMonitor("turbidity_percent", 0, 100, stuck_samples=30, rails=(0.0, 100.0))
+    flags = [ch.check(42.0) for _ in range(40)]
+    assert flags[28] == OK
+    assert flags[29:] == [STUCK] * 11
+
+
+def test_one_step_on_flat_quantized_series_is_not_an_outlier():
+    detector = FaultDetector(env.NullLogger())
+    rec = Reading()
+    temps = [25] * 200 + [26] + [25] * 200 + [26] * 10
+    for t in temps:
+        rec.clear()
+        rec.temperature = t
+        detector.screen(rec)
+        assert rec.temperature == t  # DHT11 跳一階（1°C）是正常變化，不應被丟掉
+    assert detector.report()["temperature"]["outlier"] == 0
+
+
+def test_large_jump_on_flat_series_is_still_an_outlier():
+    ch = ChannelMonitor("temperature", 0, 50, resolution=1.0)
+    for _ in range(200):
+        ch.check(25)
+    assert ch.check(40) == OUTLIER
@@ -0,0 +1,66 @@
+'''
+GatewayServer 去除重複與批次上傳的測試（在主機上執行，不開 socket）
+'''
+import json
+
+from sim import env
+env.install_hardware()
+
+from core.gateway import WINDOW, GatewayServer  # noqa: E402
+from core.uploader import FanoutUploader  # noqa: E402
+
+
+def _server(uploader=None) -> GatewayServer:
+    return GatewayServer(uploader, env.NullLogger(), node_id=0, batch_size=100)
+
+
+def test_duplicate_is_rejected():
+    gw = _server()
+    assert gw._accept(1, 7, 10)
+    assert not gw._accept(1, 7, 10)
+
+
+def test_reordered_packet_within_window_is_accepted_once():
+    gw = _server()
+    for seq in (1, 2, 5):
+        assert gw._accept(1, 7, seq)
+    assert gw._accept(1, 7, 4)  # 晚到的封包
+    assert gw._accept(1, 7, 3)
+    assert not gw._accept(1, 7, 4)
+    assert not gw._accept(1, 7, 3)
+
+
+def test_packet_older_than_window_is_treated_as_resend():
+    gw = _server()
+    assert gw._accept(1, 7, 100)
+    assert gw._accept(1, 7, 100 - WINDOW + 1)
+    assert not gw._accept(1, 7, 100 - WINDOW)
+    # 大幅跳號時視窗整個重設，之前的序號都算太舊
+    assert gw._accept(1, 7, 100 + WINDOW + 5)
+    assert not gw._accept(1, 7, 100)
+
+
+def test_boot_id_change_resets_window_per_node():
+    gw = _server()
+    assert gw._accept(1, 7, 50)
+    assert gw._accept(2, 9, 50)  # 不同節點各自計算
+    assert gw._accept(1, 8, 1)   # 節點 1 重新開機，序號從頭開始
+    assert gw._accept(1, 8, 2)
+    assert not gw._accept(1, 8, 1)
+    assert not gw._accept(2, 9, 50)
+
+
+def test_flush_sends_batch_only_to_opted_in_destinations():
+    uploader = FanoutUploader([
+        {"name": "server", "url": "http://127.0.0.1/ingest", "batch": True},
+        {"name": "make", "url": "https://example.com/make-webhook"},
+    ], logger=env.NullLogger())
+    gw = _server(uploader)
+    gw.add_local({"avg_temperature": 25.0})
+    gw.add_local({"avg_temperature": 26.0})
+    gw.flush()
+    server, make = uploader.destinations
+    merged = [json.loads(body) for body, _ in server._queue]
+    assert len(merged) == 1 and merged[0]["gateway"] == 0 and len(merged[0]["readings"]) == 2
+    flat = [json.loads(body) for body, _ in make._queue]
+    assert [row["avg_temperature"] for row in flat] == [25.0, 26.0]
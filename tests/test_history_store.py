@@ -0,0 +1,76 @@
+'''
+HistoryStore 彙總層級的測試（在主機上執行）
+'''
+import pytest
+
+from core.history_store import FIELDS, HistoryStore
+from core.reading import Reading
+
+T0 = 1735689600  # 2025-01-01 00:00:00 UTC，桶的起點
+SMALL = {"cycle": 400, "1m": 200, "1h": 8, "1d": 2}
+
+
+def _reading(value: float) -> Reading:
+    rec = Reading()
+    rec.temperature = rec.humidity = rec.turbidity_percent = rec.tds_value = rec.water_level_raw = value
+    rec.water_level_low = False
+    return rec
+
+
+def test_rollup_means_of_steady_input(tmp_path):
+    store = HistoryStore(str(tmp_path), capacity=SMALL)
+    rec = _reading(40.0)
+    for k in range(60):  # 10 分鐘，每 10 秒一回合
+        assert store.append(rec, ts=T0 + k * 10)
+    rows = store.read("1m", limit=20)
+    assert [row["ts"] for row in rows] == [T0 + 60 * m for m in range(9)]  # 最後一分鐘的桶還沒結束
+    for row in rows:
+        assert row["samples"] == 6
+        assert [row[key] for key in FIELDS] == [40.0] * len(FIELDS)
+    store.close()
+
+
+def test_rollup_means_per_bucket(tmp_path):
+    store = HistoryStore(str(tmp_path), capacity=SMALL)
+    rec = _reading(0.0)
+    for k in range(121 * 6):  # 2 小時又 1 分鐘，每 10 秒一回合
+        minute = k // 6
+        rec.temperature = float(minute)
+        rec.water_level_raw = float(minute // 60 * 1000 + k % 6)  # 每分鐘內 0..5，平均 x.5
+        assert store.append(rec, ts=T0 + k * 10)
+
+    minutes = store.read("1m", limit=200)
+    assert len(minutes) == 120
+    for m, row in enumerate(minutes):
+        assert row["avg_temperature"] == float(m)
+        assert row["avg_water_level_raw"] == m // 60 * 1000 + 2.5
+
+    hours = store.read("1h", limit=8)
+    assert [row["ts"] for row in hours] == [T0, T0 + 3600]
+    for h, row in enumerate(hours):
+        assert row["samples"] == 360
+        assert row["avg_temperature"] == 60 * h + 29.5
+        assert row["avg_water_level_raw"] == h * 1000 + 2.5
+    store.close()
+
+
+def test_iter_rows_is_not_shifted_by_writes_while_streaming(tmp_path):
+    store = HistoryStore(str(tmp_path), capacity={"cycle": 64})
+    rec = _reading(1.0)
+    for k in range(40):
+        store.append(rec, ts=T0 + k * 10)
+    rows = store.iter_rows("cycle", start=T0, limit=40)
+    seen = []
+    for row in rows:
+        seen.append(row["ts"])
+        store.append(rec, ts=T0 + (40 + len(seen)) * 10)  # 串流回應時控制迴圈照常寫入
+    assert seen == [T0 + k * 10 for k in range(40)]
+    assert store.read("cycle", limit=100)[-1]["ts"] == T0 + 80 * 10
+    store.close()
+
+
+def test_iter_rows_rejects_unknown_level_before_iterating(tmp_path):
+    store = HistoryStore(str(tmp_path), capacity=SMALL)
+    with pytest.raises(ValueError):
+        store.iter_rows("1w")
+    store.close()
@@ -0,0 +1,108 @@
+'''
+IOWorker 與 FileLog 的測試（在主機上執行）
+'''
+import asyncio
+import threading
+
+import pytest
+
+from sim import env
+env.install_hardware()
+
+from core.io_worker import IOWorker, IOWorkerStopped  # noqa: E402
+from core.log_file import FileLog  # noqa: E402
+
+
+def test_stop_fails_queued_calls():
+    async def main():
+        worker = IOWorker(logger=env.NullLogger(), capacity=4)
+        worker.start()
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking():
+            started.set()
+            release.wait(2)
+            return "done"
+
+        first = asyncio.ensure_future(worker.call(blocking))
+        second = asyncio.ensure_future(worker.call(lambda: "never"))
+        await asyncio.sleep(0)
+        assert started.wait(2)
+        threading.Timer(0.1, release.set).start()
+        assert worker.stop()  # 等手上的工作做完才返回
+        with pytest.raises(IOWorkerStopped):
+            await asyncio.wait_for(second, 2)
+        assert await asyncio.wait_for(first, 2) == "done"
+        assert worker.failed == 1
+
+    asyncio.run(main())
+
+
+def test_stop_runs_queued_writes_after_worker_exits():
+    worker = IOWorker(logger=env.NullLogger(), capacity=4)
+    worker.start()
+    started = threading.Event()
+    events = []
+
+    def slow_write():
+        started.set()
+        events.append("slow start")
+        threading.Event().wait(0.1)
+        events.append(("slow end", threading.current_thread().name))
+
+    def queued_write():
+        events.append(("queued", threading.current_thread().name))
+
+    assert worker.post(slow_write)
+    assert started.wait(2)
+    assert worker.post(queued_write)
+    assert worker.stop()
+    main = threading.current_thread().name
+    assert events == ["slow start", ("slow end", "io-worker"), ("queued", main)]
+
+
+def test_concurrent_posts_from_two_threads():
+    worker = IOWorker(logger=env.NullLogger(), capacity=8)
+    worker.start()
+    done = []
+    errors = []
+
+    def producer():
+        try:
+            for _ in range(2000):
+                worker.post(done.append, 1)
+        except Exception as e:  # 重複 release() 會在這裡拋出 RuntimeError
+            errors.append(e)
+
+    threads = [threading.Thread(target=producer) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert worker.stop()
+    assert errors == []
+    assert len(done) == worker.submitted
+
+
+def test_file_log_writes_through_worker_and_rotates(tmp_path):
+    async def main():
+        worker = IOWorker(logger=env.NullLogger(), capacity=16)
+        worker.start()
+        path = str(tmp_path / "farm.txt")
+        log = FileLog(path, max_bytes=200, buffer_size=64)
+        log.worker = worker
+        logger = log.wrap(env.NullLogger())
+        for k in range(20):
+            logger.info(f"第 {k} 回合")
+        log.flush()
+        await worker.call(lambda: None)  # 佇列依序執行，這件完成代表前面的寫檔都完成了
+        worker.stop()
+        return log
+
+    log = asyncio.run(main())
+    assert log.lines == 20 and log.errors == 0
+    assert log.rotations >= 1
+    with open(str(tmp_path / "farm.txt"), "rb") as f:
+        last = f.read().splitlines()[-1]
+    assert last.endswith("第 19 回合".encode())
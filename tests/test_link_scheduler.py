@@ -0,0 +1,54 @@
+'''
+LinkScheduler 連線品質判斷的測試（在主機上執行）
+'''
+from sim import env
+env.install_hardware()
+
+from core.link_scheduler import GOOD, POOR, LinkScheduler  # noqa: E402
+from core.uploader import DEGRADED, DOWN, HEALTHY  # noqa: E402
+
+
+class _WLAN:
+    def __init__(self, rssi: int):
+        self.rssi = rssi
+
+    def isconnected(self) -> bool:
+        return True
+
+    def status(self, param=None):
+        return self.rssi
+
+
+class _Dest:
+    def __init__(self, name: str, state: str, success_rate: float, avg_latency_ms=None):
+        self.name = name
+        self.state = state
+        self.success_rate = success_rate
+        self.avg_latency_ms = avg_latency_ms
+
+
+class _Uploader:
+    def __init__(self, *destinations):
+        self.destinations = list(destinations)
+
+
+def test_dead_destination_does_not_throttle_healthy_ones():
+    uploader = _Uploader(_Dest("server", HEALTHY, 0.98, 400), _Dest("typo", DOWN, 0.0))
+    scheduler = LinkScheduler(_WLAN(-60), uploader)
+    assert scheduler.assess() == GOOD
+
+
+def test_best_destination_decides():
+    uploader = _Uploader(_Dest("server", HEALTHY, 0.95, 400), _Dest("slow", DEGRADED, 0.4, 8000))
+    assert LinkScheduler(_WLAN(-60), uploader).assess() == GOOD
+    uploader = _Uploader(_Dest("server", DEGRADED, 0.5, 400), _Dest("make", DEGRADED, 0.6, 900))
+    scheduler = LinkScheduler(_WLAN(-60), uploader)
+    assert scheduler.assess() == POOR and scheduler.reason.startswith("[make]")
+
+
+def test_weak_signal_is_poor_and_all_down_is_poor():
+    uploader = _Uploader(_Dest("server", HEALTHY, 1.0))
+    assert LinkScheduler(_WLAN(-85), uploader).assess() == POOR
+    uploader = _Uploader(_Dest("server", DOWN, 0.0), _Dest("make", DOWN, 0.1))
+    scheduler = LinkScheduler(_WLAN(-60), uploader)
+    assert scheduler.assess() == POOR and scheduler.reason == "所有目的地離線"
@@ -0,0 +1,66 @@
+'''
+LogShipper 與上傳結果回報的測試（在主機上執行）
+'''
+import json
+
+from sim import env
+env.install_hardware()
+
+from core.log_shipper import LogShipper  # noqa: E402
+from core.uploader import _Receipt  # noqa: E402
+
+
+def _shipper(budget: int = 768) -> LogShipper:
+    shipper = LogShipper(queue_size=24, budget=budget)
+    for k in range(10):
+        shipper.add("INFO", f"第 {k} 回合讀值正常")
+    shipper.add("WARNING", "水位偏低")
+    shipper.add("ERROR", "DHT timeout")
+    return shipper
+
+
+def test_failed_batch_is_requeued_in_order():
+    shipper = _shipper()
+    before = [list(q) for q in shipper._queues]
+    batch = shipper.take()
+    assert batch["n"] == 12 and shipper.pending == 0
+    shipper.settle(batch, False)
+    assert [list(q) for q in shipper._queues] == before
+    assert shipper.shipped == 0 and shipper.requeued == 12
+
+
+def test_acknowledged_batch_is_dropped():
+    shipper = _shipper()
+    batch = shipper.take()
+    shipper.settle(batch, True)
+    assert shipper.pending == 0 and shipper.shipped == 12
+    assert shipper.report()["inflight"] == 0
+    shipper.settle(batch, False)  # 重複回報不影響
+    assert shipper.pending == 0
+
+
+def test_budget_includes_envelope():
+    for budget in (128, 192, 256, 384):
+        shipper = LogShipper(queue_size=24, budget=budget)
+        shipper._compress = False  # 原文不壓縮，內容大小容易超過預算
+        for k in range(24):
+            shipper.add("INFO", f"第 {k} 回合 濁度 {k * 3.7:.1f}% TDS {k * 11} ppm")
+        while shipper.pending:
+            batch = shipper.take()
+            assert len(',"logs":' + json.dumps(batch)) <= budget or batch["n"] == 1
+            shipper.settle(batch, True)
+
+
+def test_receipt_reports_once_after_all_destinations_fail():
+    results = []
+    receipt = _Receipt({"n": 1}, lambda batch, ok: results.append(ok), 2)
+    receipt.done(False)
+    assert results == []
+    receipt.done(False)
+    assert results == [False]
+
+    results.clear()
+    receipt = _Receipt({"n": 1}, lambda batch, ok: results.append(ok), 2)
+    receipt.done(True)
+    receipt.done(False)
+    assert results == [True]
@@ -0,0 +1,117 @@
+'''
+PumpController 保護機制的測試（在主機上以虛擬時間執行，秒級的等待瞬間完成）
+'''
+import asyncio
+
+from sim import env
+env.install_hardware()
+
+from core.pump_controller import PumpController  # noqa: E402
+from sim import clock as vclock  # noqa: E402
+
+
+class Tank:
+    '''水泵運轉時水位以固定速率上升的水塔，同時充當繼電器與水位感測器'''
+
+    def __init__(self, clock: vclock.VirtualClock, level: float, rate: float):
+        self.clock = clock
+        self.level = level
+        self.rate = rate  # 每秒上升的原始值
+        self.on_since = None
+        self.switches = []  # (時間, 開/關)
+
+    def on(self):
+        if self.on_since is None:
+            self.on_since = self.clock.now
+            self.switches.append((self.clock.now, True))
+
+    def off(self):
+        if self.on_since is not None:
+            self.level += self.rate * (self.clock.now - self.on_since)
+            self.on_since = None
+            self.switches.append((self.clock.now, False))
+
+    def read_raw(self) -> int:
+        level = self.level
+        if self.on_since is not None:
+            level += self.rate * (self.clock.now - self.on_since)
+        return int(level)
+
+
+def _run(tank: Tank, scenario, **kwargs) -> PumpController:
+    pump = PumpController(tank, tank, env.NullLogger(), level_on=1000, hysteresis=200, poll_ms=100,
+                          max_runtime=30, min_off_time=60, **kwargs)
+
+    async def main():
+        task = asyncio.create_task(pump.run())
+        await scenario(pump)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    vclock.run(main(), tank.clock)
+    return pump
+
+
+def test_hysteresis_stops_at_upper_band():
+    tank = Tank(vclock.VirtualClock(), level=900, rate=100)
+
+    async def scenario(pump):
+        pump.request()
+        await asyncio.sleep(10)
+
+    pump = _run(tank, scenario)
+    assert pump.last_stop_reason == "level" and pump.runs == 1
+    # 越過 level_on（1000）不停，到 level_off（1200）才停：900 -> 1200 需要 3 秒
+    (t_on, _), (t_off, _) = tank.switches
+    assert 3.0 <= t_off - t_on <= 3.1
+    assert 1200 <= tank.read_raw() < 1220 and not pump.is_running
+
+
+def test_max_runtime_cuts_off_dry_run():
+    tank = Tank(vclock.VirtualClock(), level=500, rate=0)  # 水源斷了，水位不會上升
+
+    async def scenario(pump):
+        pump.request()
+        await asyncio.sleep(40)
+
+    pump = _run(tank, scenario)
+    assert pump.last_stop_reason == "max_runtime"
+    assert 30000 <= pump.last_runtime_ms <= 30100
+    assert tank.switches[-1][1] is False and not pump.is_running
+
+
+def test_min_off_time_delays_next_start():
+    tank = Tank(vclock.VirtualClock(), level=900, rate=100)
+
+    async def scenario(pump):
+        pump.request()
+        await asyncio.sleep(5)
+        tank.level = 900  # 停機後馬上又被用掉
+        pump.request()
+        await asyncio.sleep(30)
+        assert not pump.is_running and pump.busy  # 還在停機保護中
+        await asyncio.sleep(40)
+
+    pump = _run(tank, scenario)
+    on_times = [t for t, state in tank.switches if state]
+    off_times = [t for t, state in tank.switches if not state]
+    assert len(on_times) == 2 and pump.runs == 2
+    assert on_times[1] - off_times[0] >= 60.0
+    assert pump.last_latency_ms >= 55000  # 反應延遲從第二次 request() 算起，包含停機保護的等待
+
+
+def test_repeated_request_while_running_counts_once():
+    tank = Tank(vclock.VirtualClock(), level=900, rate=100)
+
+    async def scenario(pump):
+        pump.request()
+        await asyncio.sleep(1)
+        assert pump.is_running
+        for _ in range(3):
+            pump.request()
+            await asyncio.sleep(0.5)
+        await asyncio.sleep(120)  # 停機保護結束後的那次需求會因水位已回升而取消
+
+    pump = _run(tank, scenario)
+    assert [state for _, state in tank.switches] == [True, False]
+    assert pump.runs == 1 and not pump.busy
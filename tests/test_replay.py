@@ -0,0 +1,27 @@
+'''
+trace 記錄 → 重播的端對端測試（在主機上以虛擬時間執行）
+'''
+from sim import make_trace
+from sim.replay import TraceReplayer
+
+
+def test_replay_of_synthetic_trace_matches(tmp_path):
+    path = str(tmp_path / "trace.bin")
+    assert make_trace.record(path, cycles=300, seed=3) > 0
+    result = TraceReplayer(path).run()
+    assert result["cycles"] == 300
+    assert result["summaries"]
+    assert result["alert_mismatches"] == 0
+    assert result["summary_mismatches"] == 0
+    assert result["first_actuator_mismatch"] is None
+    assert result["sensor_underruns"] == 0
+
+
+def test_overrides_apply_to_each_in_process_replay(tmp_path):
+    path = str(tmp_path / "trace.bin")
+    make_trace.record(path, cycles=200, seed=3)
+    default = TraceReplayer(path).run()["alert_masks"]
+    relaxed = TraceReplayer(path, {"TEMP_HIGH": 100, "HUMID_LOW": 0}).run()["alert_masks"]
+    again = TraceReplayer(path).run()["alert_masks"]
+    assert relaxed != default
+    assert again == default  # 上一次的覆寫值不會留到下一次
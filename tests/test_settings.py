@@ -0,0 +1,48 @@
+'''
+設定預設值的測試（在主機上執行）
+'''
+import os
+import sys
+import types
+
+import pytest
+
+from core.settings import DEFAULTS, settings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 第一版 config.example.py 就有的設定，舊的 config.py 一定有
+BASELINE = {"TEMP_HIGH": 35.0, "HUMID_LOW": 40.0, "TURBIDITY_MAX": 2500, "TDS_MAX": 700, "WATER_LEVEL_MIN": 1000,
+            "LOOP_INTERVAL": 5, "DATA_UPLOAD_INTERVALS": 12, "WIFI_SSID": "ssid", "WIFI_PASSWORD": "pw",
+            "MAKE_WEBHOOK_URL": "https://example.com/make", "WEBHOOK_URL": "http://127.0.0.1/ingest"}
+
+
+@pytest.fixture
+def old_config():
+    module = types.ModuleType("config")
+    for key, value in BASELINE.items():
+        setattr(module, key, value)
+    saved = sys.modules.get("config")
+    sys.modules["config"] = module
+    yield module
+    if saved is None:
+        del sys.modules["config"]
+    else:
+        sys.modules["config"] = saved
+
+
+def test_defaults_match_example_config():
+    example = {}
+    with open(os.path.join(ROOT, "config.example.py"), encoding="utf-8") as f:
+        exec(f.read(), example)
+    for key, value in DEFAULTS.items():
+        assert example[key] == value, key
+
+
+def test_old_config_falls_back_to_defaults(old_config):
+    assert settings.TEMP_HIGH == 35.0
+    assert settings.IO_WORKER_ENABLED is True
+    assert [d["url"] for d in settings.WEBHOOK_DESTINATIONS] == [BASELINE["WEBHOOK_URL"], BASELINE["MAKE_WEBHOOK_URL"]]
+    old_config.TEMP_HIGH = 30.0  # 每次讀取都查 config，覆寫立即生效
+    assert settings.TEMP_HIGH == 30.0
+    with pytest.raises(AttributeError):
+        settings.RELAY_PUMP_PIN
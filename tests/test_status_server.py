@@ -0,0 +1,29 @@
+'''
+板上狀態端點的測試（在主機上執行，不開 socket，直接產生回應）
+'''
+import asyncio
+import json
+
+from sim import env
+env.install_hardware()
+
+
+def _body(response: bytes) -> tuple:
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), body
+
+
+def test_status_leaves_metrics_to_its_own_route(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = env.load_config({})
+    from core.controller import FarmController
+
+    async def main():
+        controller = FarmController(pins=env.pins_from_config(config), logger=env.NullLogger())
+        server = controller.status_server
+        return server, _body(server._response("/status")), _body(server._response("/metrics"))
+
+    server, (status, body), (metrics_status, metrics) = asyncio.run(main())
+    assert status == 200 and len(body) < server.max_response_bytes
+    assert set(json.loads(body)) == {"version", "reading", "alerts", "window"}
+    assert metrics_status == 200 and "uploads" in json.loads(metrics)
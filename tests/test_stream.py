@@ -0,0 +1,108 @@
+'''
+上傳接收與即時推播伺服器的測試（在主機上執行，開本機 socket）
+'''
+import asyncio
+import json
+
+import pytest
+
+from server.stream import Broker, StreamServer, Subscriber, split_payload
+
+
+def _summary(timestamp: str, **values) -> dict:
+    return dict({"timestamp": timestamp, "avg_temperature": 25.0}, **values)
+
+
+def test_split_payload_shapes():
+    single = _summary("2025-01-01 00:00:00", logs={"v": 1})
+    assert split_payload(single, "farm-1") == [("farm-1", _summary("2025-01-01 00:00:00"))]
+    merged = {"readings": [_summary("2025-01-01 00:00:00"), _summary("2025-01-01 00:01:00")]}
+    assert [d for d, _ in split_payload(merged, "farm-1")] == ["farm-1", "farm-1"]
+    batch = {"gateway": 0, "readings": [_summary("2025-01-01 00:00:00", node=3), _summary("2025-01-01 00:00:00", node=4)]}
+    assert [d for d, _ in split_payload(batch, "farm-1")] == ["node-3", "node-4"]
+    assert split_payload({"logs": {"v": 1, "n": 0}}, "farm-1") == []  # 只有 log 的請求
+
+
+def test_split_payload_rejects_bad_timestamp():
+    for timestamp in ("2025-01-01T00:00:00", "yesterday", 1735689600):
+        with pytest.raises(ValueError):
+            split_payload(_summary(timestamp), "farm-1")
+    with pytest.raises(ValueError):
+        split_payload({"readings": [_summary("2025-01-01 00:00:00"), _summary("2025-13-01 00:00:00")]}, "farm-1")
+
+
+def test_subscriber_drops_oldest_and_counts():
+    sub = Subscriber(None, 2)
+    for k in range(5):
+        sub.push(b"%d" % k)
+    assert list(sub.queue) == [b"3", b"4"]
+    assert sub.dropped == 3 and sub.unreported == 3
+
+
+async def _request(port: int, method: str, path: str, body: bytes = b"") -> tuple:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: x\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), payload
+
+
+def _events(data: bytes) -> list:
+    events = []
+    for block in data.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_slow_subscriber_gets_dropped_event():
+    async def main():
+        broker = Broker(queue_size=2)
+        server = StreamServer(broker, host="127.0.0.1", port=0)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /stream?device=farm-1 HTTP/1.1\r\nHost: x\r\n\r\n")
+        await reader.readuntil(b"retry: 3000\n\n")  # 回應標頭送出時已經訂閱
+        for k in range(5):  # 中間不讓出事件迴圈，串流連線來不及送
+            broker.publish_reading("farm-1", _summary(f"2025-01-01 00:0{k}:00"))
+        data = b""
+        while data.count(b"event: reading") < 2:
+            data += await asyncio.wait_for(reader.read(4096), 2)
+        writer.close()
+        await server.stop()
+        return broker, _events(data)
+
+    broker, events = asyncio.run(main())
+    assert events[0] == ("dropped", {"count": 3})
+    assert [e[1]["timestamp"] for e in events[1:]] == ["2025-01-01 00:03:00", "2025-01-01 00:04:00"]
+    assert broker.published == 5
+
+
+def test_receive_validates_before_publishing(tmp_path):
+    pytest.importorskip("numpy")
+    from server.tsstore import TimeSeriesStore
+
+    async def main():
+        broker = Broker()
+        store = TimeSeriesStore(str(tmp_path))
+        server = StreamServer(broker, host="127.0.0.1", port=0, store=store)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        path = "/data/webhook?device=farm-1"
+        replies = [
+            await _request(port, "POST", path, json.dumps(_summary("2025-01-01 00:05:00")).encode()),
+            await _request(port, "POST", path, json.dumps(_summary("not a time")).encode()),
+            await _request(port, "POST", path, json.dumps(_summary("2025-01-01 00:00:00")).encode()),  # 早於上一筆
+            await _request(port, "POST", "/data/webhook?device=.hidden",
+                           json.dumps(_summary("2025-01-01 00:00:00")).encode()),
+        ]
+        await server.stop()
+        return broker, store, server, replies
+
+    broker, store, server, replies = asyncio.run(main())
+    assert [status for status, _ in replies] == [200, 400, 409, 400]
+    assert broker.published == 1 and server.received == 1  # 被拒絕的讀值沒有推播，板子重試也不會重複推播
+    assert len(store.query("farm-1")["ts"]) == 1
@@ -0,0 +1,59 @@
+'''
+主機端時間序列儲存的測試（在主機上執行，需要 numpy）
+'''
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from server.tsstore import OutOfOrderError, TimeSeriesStore  # noqa: E402
+
+T0 = 1735689600  # 2025-01-01 00:00:00 UTC
+
+
+def _append(store: TimeSeriesStore, ts, temperature) -> int:
+    return store.append_arrays("farm-1", np.array(ts), {"avg_temperature": np.array(temperature, dtype=np.float32)})
+
+
+def test_rollup_bucket_merges_across_batches(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    _append(store, [T0, T0 + 15], [20.0, 22.0])
+    _append(store, [T0 + 30, T0 + 45, T0 + 60], [24.0, 26.0, 30.0])  # 前三筆延續同一個 1 分鐘桶
+    minute = store.query("farm-1", step=60, columns=["avg_temperature"])
+    assert minute["ts"].tolist() == [T0, T0 + 60]
+    assert minute["avg_temperature"].tolist() == [23.0, 30.0]
+    counts = store.query("farm-1", step=60, agg="count", columns=["avg_temperature"])
+    assert counts["avg_temperature"].tolist() == [4, 1]
+    hour = store.query("farm-1", step=3600, agg="max", columns=["avg_temperature"])
+    assert hour["ts"].tolist() == [T0] and hour["avg_temperature"].tolist() == [30.0]
+
+    reopened = TimeSeriesStore(str(tmp_path))  # 重新開啟後 meta.json 記錄的筆數與彙總都還在
+    assert reopened.query("farm-1", step=60, columns=["avg_temperature"])["avg_temperature"].tolist() == [23.0, 30.0]
+
+
+def test_out_of_order_batch_is_rejected(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    _append(store, [T0 + 60, T0], [21.0, 20.0])  # 同一批內會先排序
+    with pytest.raises(OutOfOrderError):
+        _append(store, [T0 + 30], [25.0])
+    with pytest.raises(ValueError):
+        store.append("farm-1", [{"timestamp": "2024-12-31 23:59:00", "avg_temperature": 19.0}])
+    assert store.query("farm-1")["ts"].tolist() == [T0, T0 + 60]
+    assert store.last_timestamp("farm-1") == T0 + 60
+
+
+def test_query_picks_coarsest_level_that_divides_step(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    _append(store, [T0 + k * 30 for k in range(240)], [float(k) for k in range(240)])  # 2 小時，每 30 秒一筆
+    levels = store._device("farm-1")
+    pick = TimeSeriesStore._pick_level
+    assert pick(levels, None) is levels["raw"]
+    assert pick(levels, 45) is levels["raw"]
+    assert pick(levels, 120) is levels["1m"]
+    assert pick(levels, 7200) is levels["1h"]
+    assert pick(levels, 86400 * 7) is levels["1d"]
+    # 以彙總層級回答與直接從原始資料降採樣的結果一致
+    from_rollup = store.query("farm-1", step=1800, columns=["avg_temperature"])
+    raw = store.query("farm-1", columns=["avg_temperature"])
+    expected = raw["avg_temperature"].reshape(4, 60).mean(axis=1)
+    assert from_rollup["ts"].tolist() == [T0 + k * 1800 for k in range(4)]
+    assert np.allclose(from_rollup["avg_temperature"], expected)
@@ -0,0 +1,63 @@
+'''
+FanoutUploader 的測試（在主機上執行；合併格式只看各目的地佇列，逾時隔離以虛擬時間模擬請求）
+'''
+import asyncio
+import json
+
+from sim import env
+env.install_hardware()
+
+from core import http_client  # noqa: E402
+from core.uploader import DOWN, HEALTHY, FanoutUploader  # noqa: E402
+from sim import clock as vclock  # noqa: E402
+
+DESTINATIONS = [
+    {"name": "server", "url": "http://127.0.0.1/ingest", "logs": True, "batch": True},
+    {"name": "make", "url": "https://example.com/make-webhook"},
+]
+
+
+def _bodies(dest) -> list:
+    return [json.loads(body) for body, _ in dest._queue]
+
+
+def test_batch_goes_only_to_opted_in_destinations():
+    uploader = FanoutUploader(DESTINATIONS, logger=env.NullLogger())
+    readings = [{"timestamp": f"2025-01-01 00:0{k}:00", "avg_temperature": 25.0 + k} for k in range(3)]
+    uploader.submit_batch({"timestamp": "2025-01-01 00:03:00", "readings": readings},
+                          logs={"v": 1, "n": 0}, on_logs=lambda batch, ok: None)
+    server, make = uploader.destinations
+    merged = _bodies(server)
+    assert len(merged) == 1 and merged[0]["readings"] == readings and merged[0]["logs"]["v"] == 1
+    assert _bodies(make) == readings  # 逐份送出，格式與沒有合併時相同，也不附 log
+
+
+def test_hanging_destination_does_not_delay_healthy_one(monkeypatch):
+    clock = vclock.VirtualClock()
+    delivered = []  # (虛擬時間, 回合)
+
+    async def fake_post(url, body, timeout=10.0, content_type="application/json", worker=None):
+        if "hang" in url:
+            await asyncio.wait_for(asyncio.Event().wait(), timeout)  # 對方永遠不回應，只能等到逾時
+        await asyncio.sleep(0.2)
+        delivered.append((clock.now, json.loads(body)["round"]))
+        return 200
+
+    monkeypatch.setattr(http_client, "post", fake_post)
+    uploader = FanoutUploader([
+        {"name": "hang", "url": "http://10.0.0.99/hang", "timeout": 10, "queue": 5, "retries": 3},
+        {"name": "server", "url": "http://127.0.0.1/ingest", "timeout": 5},
+    ], logger=env.NullLogger())
+
+    async def main():
+        uploader.start()
+        for k in range(12):  # 每 5 秒一筆，共 1 分鐘
+            uploader.submit({"round": k})
+            await asyncio.sleep(5)
+        await uploader.stop()
+
+    vclock.run(main(), clock)
+    hang, server = uploader.destinations
+    assert [k for _, k in delivered] == list(range(12))
+    assert all(abs(t - (5 * k + 0.2)) < 1e-6 for t, k in delivered)  # 每筆都在送出後 0.2 秒到達
+    assert hang.sent == 0 and hang.state == DOWN and server.state == HEALTHY
@@ -0,0 +1,205 @@
+'''
+裝置端預編譯打包工具（在主機上執行）
+
+把 core/、sensors/、actuators/、lib/ 與 config.py 轉成 .mpy 位元組碼，板子開機時就不用再編譯 .py：
+    1. 移除執行時用不到的東西：`if __name__ == "__main__"` 測試區塊、typing 匯入與型別註記
+    2. 以 mpy-cross 編譯成 .mpy（`pip install mpy-cross`，版本需與韌體相符）
+    3. 輸出 build/device/（可直接 `mpremote cp -r build/device/. :` 上傳）
+       以及 build/manifest.py（想把模組凍結進韌體時使用）
+
+用法：
+    python -m tools.build_mpy [--out build] [--arch xtensawin] [--no-compile]
+'''
+import argparse
+import ast
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGES = ("core", "sensors", "actuators", "lib")
+MODULES = ("config.py",)
+# 板子只會自動執行 .py 形式的 boot.py / main.py，這兩個直接複製
+ENTRY_POINTS = ("boot.py", "main.py")
+
+
+class _DeviceStripper(ast.NodeTransformer):
+    '''移除裝置執行時用不到的語法節點'''
+
+    def visit_Module(self, node):
+        node.body = [n for n in node.body if not _is_main_guard(n)]
+        self.generic_visit(node)
+        return node
+
+    def visit_ImportFrom(self, node):
+        if node.module == "typing":
+            return None
+        return node
+
+    def visit_Try(self, node):
+        # try: from typing import ... except ImportError: pass
+        if all(isinstance(n, ast.ImportFrom) and n.module == "typing" for n in node.body):
+            return None
+        self.generic_visit(node)
+        return node
+
+    def visit_AnnAssign(self, node):
+        if node.value is None:
+            return None
+        return ast.copy_location(ast.Assign(targets=[node.target], value=node.value), node)
+
+    def visit_arg(self, node):
+        node.annotation = None
+        return node
+
+    def _strip_function(self, node):
+        node.returns = None
+        self.generic_visit(node)
+        if not node.body:
+            node.body = [ast.Pass()]
+        return node
+
+    visit_FunctionDef = _strip_function
+    visit_AsyncFunctionDef = _strip_function
+
+
+def _is_main_guard(node) -> bool:
+    '''是否為 if __name__ == "__main__": 區塊'''
+    if not isinstance(node, ast.If) or not isinstance(node.test, ast.Compare):
+        return False
+    left = node.test.left
+    comparators = node.test.comparators
+    return (isinstance(left, ast.Name) and left.id == "__name__"
+            and len(comparators) == 1
+            and isinstance(comparators[0], ast.Constant)
+            and comparators[0].value == "__main__")
+
+
+def strip_source(source: str, filename: str = "<device>") -> str:
+    """轉換成裝置端精簡版原始碼
+
+    Args:
+        source (str): 原始 Python 原始碼
+        filename (str): 錯誤訊息用的檔名
+
+    Returns:
+        str: 移除測試區塊、typing 匯入與型別註記後的原始碼
+    """
+    tree = _DeviceStripper().visit(ast.parse(source, filename))
+    ast.fix_missing_locations(tree)
+    return ast.unparse(tree) + "\n"
+
+
+def collect_sources() -> list:
+    '''列出要打包的裝置端原始檔（相對於專案根目錄）'''
+    sources = []
+    for package in PACKAGES:
+        base = os.path.join(ROOT, package)
+        if not os.path.isdir(base):
+            continue
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+            for name in sorted(filenames):
+                if name.endswith(".py"):
+                    sources.append(os.path.relpath(os.path.join(dirpath, name), ROOT))
+    for name in MODULES:
+        if os.path.exists(os.path.join(ROOT, name)):
+            sources.append(name)
+    return sources
+
+
+def _mpy_cross_command() -> list:
+    '''找出可用的 mpy-cross 執行方式'''
+    exe = shutil.which("mpy-cross")
+    if exe:
+        return [exe]
+    try:
+        import mpy_cross  # type: ignore  # noqa: F401
+        return [sys.executable, "-m", "mpy_cross"]
+    except ImportError:
+        return []
+
+
+def build(out_dir: str, arch: str, compile_mpy: bool = True) -> dict:
+    """打包裝置端程式
+
+    Args:
+        out_dir (str): 輸出目錄
+        arch (str): mpy-cross 的 -march 參數（ESP32 為 xtensawin）
+        compile_mpy (bool): False 時只輸出精簡版 .py，不呼叫 mpy-cross
+
+    Returns:
+        dict: {'files': 檔案數, 'source_bytes': 原始大小, 'output_bytes': 輸出大小}
+    """
+    src_dir = os.path.join(out_dir, "src")
+    device_dir = os.path.join(out_dir, "device")
+    for path in (src_dir, device_dir):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+
+    command = _mpy_cross_command() if compile_mpy else []
+    if compile_mpy and not command:
+        raise RuntimeError("找不到 mpy-cross，請先 `pip install mpy-cross` 或改用 --no-compile")
+
+    stats = {"files": 0, "source_bytes": 0, "output_bytes": 0}
+    for rel in collect_sources():
+        with open(os.path.join(ROOT, rel), encoding="utf-8") as f:
+            source = f.read()
+        stripped = strip_source(source, rel)
+        stripped_path = os.path.join(src_dir, rel)
+        os.makedirs(os.path.dirname(stripped_path), exist_ok=True)
+        with open(stripped_path, "w", encoding="utf-8") as f:
+            f.write(stripped)
+
+        if command:
+            target = os.path.join(device_dir, rel[:-3] + ".mpy")
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            subprocess.run(command + ["-march=" + arch, "-s", rel, "-o", target, stripped_path], check=True)
+        else:
+            target = os.path.join(device_dir, rel)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(stripped_path, target)
+
+        stats["files"] += 1
+        stats["source_bytes"] += len(source.encode("utf-8"))
+        stats["output_bytes"] += os.path.getsize(target)
+
+    for name in ENTRY_POINTS:
+        path = os.path.join(ROOT, name)
+        if os.path.exists(path):
+            shutil.copyfile(path, os.path.join(device_dir, name))
+
+    _write_manifest(out_dir, src_dir)
+    return stats
+
+
+def _write_manifest(out_dir: str, src_dir: str):
+    '''輸出凍結用 manifest.py（以精簡版原始碼為來源）'''
+    lines = ["# 由 tools/build_mpy.py 產生，凍結進韌體：make BOARD=ESP32_GENERIC FROZEN_MANIFEST=<此檔>",
+             'include("$(PORT_DIR)/boards/manifest.py")']
+    for package in PACKAGES:
+        if os.path.isdir(os.path.join(src_dir, package)):
+            lines.append(f'package("{package}", base_path="{src_dir}")')
+    for name in MODULES:
+        if os.path.exists(os.path.join(src_dir, name)):
+            lines.append(f'module("{name}", base_path="{src_dir}")')
+    with open(os.path.join(out_dir, "manifest.py"), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把裝置端程式預編譯成 .mpy")
+    parser.add_argument("--out", default=os.path.join(ROOT, "build"), help="輸出目錄（預設 build/）")
+    parser.add_argument("--arch", default="xtensawin", help="mpy-cross -march（ESP32 為 xtensawin）")
+    parser.add_argument("--no-compile", action="store_true", help="只輸出精簡版 .py，不編譯")
+    args = parser.parse_args()
+
+    stats = build(args.out, args.arch, compile_mpy=not args.no_compile)
+    print(f"打包完成：{stats['files']} 個模組，原始碼 {stats['source_bytes']} bytes -> 輸出 {stats['output_bytes']} bytes")
+    print(f"上傳：mpremote cp -r {os.path.join(args.out, 'device')}/. :")
+
+
+if __name__ == "__main__":
+    main()